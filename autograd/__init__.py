@@ -1,2 +1,3 @@
 from autograd.tensor import Tensor
-from autograd.device import Device
\ No newline at end of file
+from autograd.device import Device
+from autograd.engine.jit import Jit
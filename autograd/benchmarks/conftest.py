@@ -0,0 +1,7 @@
+import importlib.util
+import pytest
+from autograd.benchmarks.suite import Benchmark
+
+if importlib.util.find_spec("pytest_benchmark") is None:
+  @pytest.fixture
+  def benchmark() -> Benchmark: return Benchmark()
@@ -0,0 +1,78 @@
+"""
+Graph building overhead: time and memory per UOp when building graphs of tens of thousands of nodes, the Python work a training
+step does before any kernel runs. Run with `python -m autograd.benchmarks.graph [--nodes 50000]`.
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable
+import numpy as np
+from autograd import Tensor
+from autograd.dtypes import dtypes
+from autograd.ops import Ops
+from autograd.ops.uop import UOp
+
+def elementwise(nodes: int) -> Callable[[], object]:
+  a, b = Tensor(np.ones(16, np.float32)), Tensor(np.ones(16, np.float32))
+  def build():
+    t = a
+    for _ in range(nodes // 2): t = (t + b) * b
+    return t
+  return build
+
+def dense(nodes: int) -> Callable[[], object]:
+  # matmul, bias broadcast and add per layer
+  x, w, b = Tensor(np.ones((8, 16), np.float32)), Tensor(np.ones((16, 16), np.float32)), Tensor(np.ones(16, np.float32))
+  def build():
+    h = x
+    for _ in range(nodes // 3): h = h @ w + b
+    return h
+  return build
+
+def movement(nodes: int) -> Callable[[], object]:
+  # reshape, transpose and slice per step, every node is a view
+  x = Tensor(np.ones((16, 16), np.float32))
+  def build():
+    t = x
+    for _ in range(nodes // 3): t = t.reshape(256).reshape(16, 16).transpose()[:, :]
+    return t
+  return build
+
+def raw(nodes: int) -> Callable[[], object]:
+  # UOps built directly, without the Tensor layer. distinct constants defeat interning
+  a = Tensor(np.ones(16, np.float32)).uop
+  def build():
+    t = a
+    for i in range(nodes // 2):
+      t = UOp(Ops.ADD, dtypes.float32, (t, UOp(Ops.CONST, dtypes.float32, arg=(float(i),))))
+    return t
+  return build
+
+cases = {"elementwise": elementwise, "dense": dense, "movement": movement, "raw_uops": raw}
+
+def per_node(build: Callable[[], object], nodes: int, repeat: int=3) -> tuple[float, float]:
+  # best time and traced memory of one build divided by its nodes, the graph of the previous round is released before timing
+  times = []
+  for _ in range(repeat):
+    st = time.perf_counter()
+    graph = build()
+    times.append(time.perf_counter() - st)
+    del graph
+  tracemalloc.start()
+  graph = build()
+  memory = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  del graph
+  return min(times) / nodes, memory / nodes
+
+def main(argv: list[str]|None=None):
+  parser = argparse.ArgumentParser(description="graph building overhead per node")
+  parser.add_argument("--nodes", type=int, nargs="+", default=[10_000, 50_000])
+  args = parser.parse_args(argv)
+  print(f"{'graph':<12} {'nodes':>8} {'us/node':>8} {'bytes/node':>11}")
+  for nodes in args.nodes:
+    for name, case in cases.items():
+      seconds, memory = per_node(case(nodes), nodes)
+      print(f"{name:<12} {nodes:>8} {seconds * 1e6:>8.2f} {memory:>11.0f}")
+
+if __name__ == "__main__": main()
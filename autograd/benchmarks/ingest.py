@@ -0,0 +1,45 @@
+"""
+Building tensors from nested Python lists: the single pass native ingestion against the previous
+pure Python path (fully_flatten + get_shape + struct.pack), kept here as a frozen copy. Run with `python -m autograd.benchmarks.ingest`.
+"""
+import random
+import struct
+import time
+from autograd_core import Buffer, buffer_from_list
+from autograd.helpers import all_values_same, fully_flatten, calc_strides
+
+def get_shape(x) -> tuple[int, ...]:
+  # the shape of nested lists, inferred element by element. a str indexes to a str, it is a scalar like 0-d arrays
+  if not hasattr(x, "__len__") or not hasattr(x, "__getitem__") or isinstance(x, str) or (hasattr(x, "shape") and x.shape == ()): return ()
+  if not all_values_same(element_shape:=[get_shape(element) for element in x]): raise ValueError(f"inhomogeneous shape from {x}")
+  return (len(element_shape),) + (element_shape[0] if element_shape else ())
+
+def legacy_from_list(data: list) -> Buffer:
+  flat = fully_flatten(data)
+  fmt = "d" if any(isinstance(x, float) for x in flat) else "q"
+  shape = get_shape(data)
+  raw = struct.pack(f"{len(flat)}{fmt}", *flat)
+  return Buffer(raw, list(shape), list(calc_strides(shape, 8)), fmt, 0)
+
+def make_rows(numel: int, row: int=256, floats: bool=True) -> list[list]:
+  rng = random.Random(0)
+  value = rng.random if floats else lambda: rng.randrange(-1000, 1000)
+  return [[value() for _ in range(row)] for _ in range(numel // row)]
+
+def best_of(fn, *args, repeat: int=3) -> float:
+  times = []
+  for _ in range(repeat):
+    st = time.perf_counter()
+    fn(*args)
+    times.append(time.perf_counter() - st)
+  return min(times)
+
+def main(sizes: tuple[int,...]=(1_000_000, 10_000_000)):
+  print(f"{'numel':>10} {'dtype':>7} {'legacy (s)':>11} {'native (s)':>11} {'speedup':>8}")
+  for numel in sizes:
+    for floats in (True, False):
+      data = make_rows(numel, floats=floats)
+      legacy, native = best_of(legacy_from_list, data), best_of(buffer_from_list, data)
+      print(f"{numel:>10} {'float64' if floats else 'int64':>7} {legacy:>11.3f} {native:>11.3f} {legacy / native:>7.1f}x")
+
+if __name__ == "__main__": main()
@@ -0,0 +1,165 @@
+"""
+Benchmarks of autograd against NumPy on synthetic data: elementwise kernel throughput per dtype and memory layout,
+graph build and schedule overhead per node, list/ndarray ingestion and a training step of the MNIST MLP.
+Run with `python -m autograd.benchmarks.suite [--quick] [-k substring] [--json results.json]`, the JSON follows the layout of
+pytest-benchmark so both modes feed the same regression tracking. `pytest autograd/benchmarks` runs every case as a test
+on the pytest-benchmark `benchmark` fixture (or a minimal stand-in when the plugin is not installed).
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterator
+import numpy as np
+from autograd import Tensor
+from autograd.dtypes import DType, dtypes
+from autograd.scheduler import Scheduler
+
+Fn = Callable[[], object]
+
+@dataclass
+class Case:
+  group: str
+  name: str
+  setup: Callable[[], tuple[Fn, Fn|None]] # builds the inputs, returns the autograd callable and its NumPy baseline
+  items: int # elements or nodes handled per call
+  unit: str
+
+def measure(fn: Fn, min_time: float=0.2, max_rounds: int=1000) -> dict[str, float]:
+  fn() # warmup, first calls pay for page faults and arena growth
+  times: list[float] = []
+  while len(times) < max_rounds and (len(times) < 3 or sum(times) < min_time):
+    st = time.perf_counter()
+    fn()
+    times.append(time.perf_counter() - st)
+  return {"min": min(times), "max": max(times), "mean": statistics.fmean(times), "median": statistics.median(times),
+          "stddev": statistics.stdev(times), "rounds": len(times)}
+
+def _layouts(n: int, dtype: DType) -> Iterator[tuple[str, Tensor, Tensor, np.ndarray, np.ndarray]]:
+  rng = np.random.default_rng(0)
+  x = (rng.random(2 * n) * 100).astype(dtype.fmt)
+  y = (rng.random(2 * n) * 100).astype(dtype.fmt)
+  yield "contiguous", Tensor(x[:n]), Tensor(y[:n]), x[:n], y[:n]
+  yield "strided", Tensor(x)[::2], Tensor(y)[::2], x[::2], y[::2]
+  rows = x[:n].reshape(-1, 1024)
+  yield "broadcast", Tensor(rows), Tensor(y[:1024]).expand(rows.shape), rows, np.broadcast_to(y[:1024], rows.shape)
+
+def _binary_case(op: str, dtype: DType, layout: str, n: int) -> Case:
+  def setup():
+    _, a, b, x, y = next(c for c in _layouts(n, dtype) if c[0] == layout)
+    fn = {"add": np.add, "mul": np.multiply}[op]
+    return (lambda: (a + b if op == "add" else a * b).realize()), (lambda: fn(x, y))
+  return Case("kernels", f"{op}[{dtype.name},{layout}]", setup, n, "elem")
+
+def _cast_case(src: DType, dst: DType, layout: str, n: int) -> Case:
+  def setup():
+    _, a, _, x, _ = next(c for c in _layouts(n, src) if c[0] == layout)
+    return (lambda: a.cast(dst).realize()), (lambda: x.astype(dst.fmt))
+  return Case("kernels", f"cast[{src.name}->{dst.name},{layout}]", setup, n, "elem")
+
+def _graph_cases(nodes: int) -> Iterator[Case]:
+  a, b = Tensor(np.ones(16, np.float32)), Tensor(np.ones(16, np.float32))
+  def chain() -> Tensor:
+    t = a
+    for _ in range(nodes): t = (t + b) * b
+    return t
+  yield Case("graph", f"build[{2 * nodes} nodes]", lambda: (chain, None), 2 * nodes, "node")
+  def schedule():
+    t = chain()
+    return (lambda: Scheduler(t.uop)), None
+  yield Case("graph", f"schedule[{2 * nodes} nodes]", schedule, 2 * nodes, "node")
+
+def _ingest_cases(n: int) -> Iterator[Case]:
+  def from_list(floats: bool):
+    rng = np.random.default_rng(0)
+    data = (rng.random((n // 256, 256)) if floats else rng.integers(-1000, 1000, (n // 256, 256))).tolist()
+    return (lambda: Tensor(data)), (lambda: np.array(data))
+  yield Case("ingest", "list[float64]", lambda: from_list(True), n, "elem")
+  yield Case("ingest", "list[int64]", lambda: from_list(False), n, "elem")
+  def from_ndarray():
+    arr = np.random.default_rng(0).random((n // 256, 256)).astype(np.float32)
+    return (lambda: Tensor(arr).realize()), (lambda: np.array(arr))
+  yield Case("ingest", "ndarray[float32]", from_ndarray, n, "elem")
+
+def _mlp_case(batch: int) -> Case:
+  # one training step of the three dense layers of examples/mnist_np.py on a random batch: forward, backward and an SGD update.
+  # autograd has no relu, exp or log yet, so its layers are linear and the loss is the squared error against one-hot targets,
+  # the NumPy baseline is mnist_np.Model with its relu and softmax cross entropy. both do the same six matmuls per layer pass
+  def setup():
+    from autograd.examples.mnist_np import Model
+    from autograd.optim import SGD
+    rng = np.random.default_rng(0)
+    x = rng.random((batch, 784)).astype(np.float32)
+    targets = rng.integers(0, 10, batch)
+    model = Model()
+    layers = [model.layer1, model.layer2, model.layer3]
+    tws = [Tensor(layer.weights.copy(), requires_grad=True) for layer in layers]
+    tbs = [Tensor(layer.biases.copy(), requires_grad=True) for layer in layers]
+    tx, ty = Tensor(x), Tensor(np.eye(10, dtype=np.float32)[targets])
+    opt = SGD([*tws, *tbs], lr=0.01) # plain SGD on the linear layers diverges at the 0.1 of mnist_np
+    def step_autograd():
+      opt.zero_grad()
+      h = tx
+      for w, b in zip(tws, tbs): h = h @ w + b
+      d = h + ty * -1.0
+      loss = (d * d).mean().backward()
+      opt.step()
+      return loss
+    def step_numpy():
+      model.forward(x)
+      model.backprop(targets)
+      model.update_weights(0.01)
+    return step_autograd, step_numpy
+  return Case("e2e", f"mnist_mlp_train_step[batch={batch}]", setup, batch, "sample")
+
+def cases(quick: bool=False) -> list[Case]:
+  n = 1 << 16 if quick else 1 << 22
+  ret = [_binary_case(op, dtype, layout, n) for op in ("add", "mul")
+         for dtype in (dtypes.float32, dtypes.float64, dtypes.int32, dtypes.float16) for layout in ("contiguous", "strided", "broadcast")]
+  ret += [_cast_case(src, dst, layout, n) for src, dst in ((dtypes.float32, dtypes.float16), (dtypes.float16, dtypes.float32),
+          (dtypes.float64, dtypes.float32), (dtypes.int32, dtypes.float32)) for layout in ("contiguous", "strided", "broadcast")]
+  ret += [*_graph_cases(50 if quick else 500), *_ingest_cases(n), _mlp_case(64)]
+  return ret
+
+def run(selected: list[Case], min_time: float=0.2) -> list[dict]:
+  results = []
+  print(f"{'benchmark':<44} {'median':>10} {'throughput':>19} {'numpy':>10} {'vs numpy':>9}")
+  for case in selected:
+    fn, baseline = case.setup()
+    stats = measure(fn, min_time)
+    extra: dict[str, object] = {"items": case.items, "unit": case.unit, "throughput": case.items / stats["median"]}
+    if baseline is not None:
+      extra["numpy_median"] = measure(baseline, min_time)["median"]
+      extra["speedup_vs_numpy"] = extra["numpy_median"] / stats["median"] # type: ignore[operator]
+    results.append({"group": case.group, "name": case.name, "fullname": f"{case.group}/{case.name}", "stats": stats, "extra_info": extra})
+    numpy_cols = f"{extra['numpy_median'] * 1e3:>8.3f}ms {extra['speedup_vs_numpy']:>8.2f}x" if baseline is not None else ""
+    print(f"{case.group + '/' + case.name:<44} {stats['median'] * 1e3:>8.3f}ms {extra['throughput']:>10.3g} {case.unit + '/s':<8} {numpy_cols}")
+  return results
+
+class Benchmark:
+  """minimal stand-in for the pytest-benchmark fixture: `benchmark(fn)` times fn and keeps the stats"""
+  def __init__(self, min_time: float=0.05):
+    self.min_time, self.extra_info, self.stats = min_time, {}, None
+  def __call__(self, fn: Fn, *args, **kwargs):
+    ret = fn(*args, **kwargs)
+    self.stats = measure(lambda: fn(*args, **kwargs), self.min_time)
+    return ret
+
+def main(argv: list[str]|None=None):
+  parser = argparse.ArgumentParser(description="autograd benchmarks against NumPy")
+  parser.add_argument("--quick", action="store_true", help="small inputs, for smoke runs")
+  parser.add_argument("-k", default="", help="only run benchmarks whose full name contains this")
+  parser.add_argument("--json", help="write the results to this file")
+  parser.add_argument("--min-time", type=float, default=0.2, help="seconds spent timing each benchmark")
+  args = parser.parse_args(argv)
+  results = run([c for c in cases(args.quick) if args.k in f"{c.group}/{c.name}"], args.min_time)
+  if args.json:
+    machine = {"python": sys.version.split()[0], "platform": platform.platform(), "machine": platform.machine(), "numpy": np.__version__}
+    with open(args.json, "w") as f:
+      json.dump({"machine_info": machine, "datetime": datetime.datetime.now(datetime.timezone.utc).isoformat(), "benchmarks": results}, f, indent=2)
+
+if __name__ == "__main__": main()
@@ -0,0 +1,8 @@
+import pytest
+from autograd.benchmarks.suite import Case, cases
+
+@pytest.mark.parametrize("case", cases(quick=True), ids=lambda c: f"{c.group}/{c.name}")
+def test_benchmark(benchmark, case: Case):
+  fn, _ = case.setup()
+  benchmark.extra_info.update(group=case.group, items=case.items, unit=case.unit)
+  benchmark(fn)
@@ -1,7 +1,11 @@
-from autograd.dtypes import dtypes
 from autograd.tensor import Tensor
+from autograd.helpers import fetch_many
+from autograd.datasets.loaders import load_idx, load_npy
+from autograd.datasets.dataloader import DataLoader
 
 def mnist():
     base_url = "https://raw.githubusercontent.com/fgnt/mnist/master/"
-    def _mnist(file) -> Tensor: return Tensor.from_url(base_url+file, dtype=dtypes.uint8)
-    return _mnist("train-images-idx3-ubyte.gz")[0x10:].reshape((-1,1,28,28)), _mnist("train-labels-idx1-ubyte.gz")[8:], _mnist("t10k-images-idx3-ubyte.gz")[0x10:].reshape((-1,1,28,28)), _mnist("t10k-labels-idx1-ubyte.gz")[8:]
+    files = ("train-images-idx3-ubyte.gz", "train-labels-idx1-ubyte.gz", "t10k-images-idx3-ubyte.gz", "t10k-labels-idx1-ubyte.gz")
+    # the four files download in parallel and are cached decompressed, the tensors map them instead of reading them into memory
+    train_images, train_labels, test_images, test_labels = (load_idx(f.path) for f in fetch_many([base_url+file for file in files]))
+    return train_images.reshape((-1,1,28,28)), train_labels, test_images.reshape((-1,1,28,28)), test_labels
@@ -0,0 +1,76 @@
+import queue
+import threading
+import numpy as np
+from typing import Iterator, Sequence
+from autograd.tensor import Tensor
+
+class DataLoader:
+  """
+  yields shuffled mini-batches of one or more aligned sources (images, labels, ...) gathered by a background thread.
+  the rows of every batch are copied straight into a ring of `prefetch + 1` preallocated batch buffers, so nothing is allocated
+  per batch and the source (a mapped file from load_idx/load_npy included) is only read row by row.
+  sources flagged in `normalize` are converted to float32 on the fly, uint8 pixels are scaled to [0, 1] on the way.
+
+  a batch wraps its ring slot in place: it stays valid until the next batch is requested, realize or copy what has to live longer
+  """
+  def __init__(self, *sources: Tensor|np.ndarray, batch_size: int=64, shuffle: bool=True, drop_last: bool=False, prefetch: int=2,
+               normalize: bool|Sequence[bool]=False, seed: int|None=None):
+    if not sources: raise ValueError("DataLoader needs at least one source")
+    self.sources = tuple(s.numpy() if isinstance(s, Tensor) else np.asarray(s) for s in sources)
+    if any(s.ndim == 0 for s in self.sources) or len({len(s) for s in self.sources}) != 1:
+      raise ValueError(f"sources must have the same number of rows, got shapes {[s.shape for s in self.sources]}")
+    if batch_size < 1 or prefetch < 1: raise ValueError(f"batch_size and prefetch must be positive, got {batch_size} and {prefetch}")
+    self.normalize = (normalize,) * len(sources) if isinstance(normalize, bool) else tuple(normalize)
+    if len(self.normalize) != len(sources): raise ValueError(f"normalize has {len(self.normalize)} flags for {len(sources)} sources")
+    self.batch_size, self.shuffle, self.drop_last = batch_size, shuffle, drop_last
+    self.rng = np.random.default_rng(seed)
+    self.dtypes = tuple(np.dtype(np.float32) if norm else s.dtype for s, norm in zip(self.sources, self.normalize))
+    self.slots = [tuple(np.empty((batch_size, *s.shape[1:]), dtype) for s, dtype in zip(self.sources, self.dtypes)) for _ in range(prefetch + 1)]
+    # rows that are converted are gathered into a staging buffer of the source dtype first, it is reused for every batch
+    self.staging = tuple(np.empty((batch_size, *s.shape[1:]), s.dtype) if s.dtype != dtype else None for s, dtype in zip(self.sources, self.dtypes))
+
+  def __len__(self) -> int:
+    rows = len(self.sources[0])
+    return rows // self.batch_size if self.drop_last else -(-rows // self.batch_size)
+
+  def _fill(self, slot: tuple[np.ndarray, ...], rows: np.ndarray):
+    # numpy releases the GIL while it copies, the gather overlaps with kernels running on the main thread
+    for src, dst, staging in zip(self.sources, slot, self.staging):
+      n = len(rows)
+      if staging is None:
+        np.take(src, rows, axis=0, out=dst[:n])
+        continue
+      np.take(src, rows, axis=0, out=staging[:n])
+      if src.dtype == np.uint8: np.multiply(staging[:n], np.float32(1 / 255), out=dst[:n])
+      else: dst[:n] = staging[:n]
+
+  def _worker(self, order: np.ndarray, free: queue.Queue, ready: queue.Queue, stop: threading.Event):
+    try:
+      for start in range(0, len(self) * self.batch_size, self.batch_size):
+        if (slot := free.get()) is None or stop.is_set(): return
+        rows = order[start:start + self.batch_size]
+        self._fill(self.slots[slot], rows)
+        ready.put((slot, len(rows)))
+    except BaseException as e:
+      ready.put(e)
+
+  def __iter__(self) -> Iterator[tuple[Tensor, ...]]:
+    rows = len(self.sources[0])
+    order = self.rng.permutation(rows) if self.shuffle else np.arange(rows)
+    free: queue.Queue = queue.Queue()
+    ready: queue.Queue = queue.Queue()
+    for i in range(len(self.slots)): free.put(i)
+    stop = threading.Event()
+    worker = threading.Thread(target=self._worker, args=(order, free, ready, stop), daemon=True)
+    worker.start()
+    held = None
+    try:
+      for _ in range(len(self)):
+        if held is not None: free.put(held) # the previous batch is released once the next one is requested
+        if isinstance(item := ready.get(), BaseException): raise item
+        held, n = item
+        yield tuple(Tensor(buf[:n]) for buf in self.slots[held])
+    finally:
+      stop.set()
+      free.put(None)
+      worker.join()
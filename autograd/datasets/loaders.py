@@ -0,0 +1,50 @@
+import ast
+import pathlib
+import struct
+import numpy as np
+from typing import Literal
+from autograd.dtypes import _from_np_dtypes
+from autograd.helpers import calc_strides
+from autograd.tensor import Tensor, _uop_from_file
+
+MmapMode = Literal["r", "c"] # read-only or copy-on-write, like numpy's mmap_mode
+
+def _mapped(path: pathlib.Path, np_dtype: np.dtype, shape: tuple[int,...], offset: int, fortran_order: bool, mmap_mode: MmapMode) -> Tensor:
+  if mmap_mode not in ("r", "c"): raise ValueError(f"mmap_mode must be 'r' or 'c', got {mmap_mode!r}")
+  dtype = _from_np_dtypes(np_dtype)
+  strides = calc_strides(shape, np_dtype.itemsize) if not fortran_order else tuple(reversed(calc_strides(tuple(reversed(shape)), np_dtype.itemsize)))
+  return Tensor(_uop_from_file(path, dtype, shape, strides, offset, copy_on_write=mmap_mode == "c"))
+
+def load_npy(path: str|pathlib.Path, mmap_mode: MmapMode="r") -> Tensor:
+  """
+  maps the array of a .npy file without reading it, fortran ordered arrays keep their strides.
+  arrays in a non-native byte order are byte swapped into memory instead
+  """
+  path = pathlib.Path(path)
+  with open(path, "rb") as f:
+    if f.read(6) != b"\x93NUMPY": raise ValueError(f"{path} is not a .npy file")
+    major, _ = f.read(2)
+    header_len = struct.unpack("<H" if major == 1 else "<I", f.read(2 if major == 1 else 4))[0]
+    header = ast.literal_eval(f.read(header_len).decode("latin1" if major < 3 else "utf8"))
+    offset = f.tell()
+  np_dtype, shape = np.dtype(header["descr"]), tuple(header["shape"])
+  if not np_dtype.isnative: return Tensor(np.load(path).astype(np_dtype.newbyteorder("=")))
+  return _mapped(path, np_dtype, shape, offset, header["fortran_order"], mmap_mode)
+
+# http://yann.lecun.com/exdb/mnist/, IDX data is stored big-endian
+_idx_dtypes = {0x08: ">u1", 0x09: ">i1", 0x0B: ">i2", 0x0C: ">i4", 0x0D: ">f4", 0x0E: ">f8"}
+
+def load_idx(path: str|pathlib.Path, mmap_mode: MmapMode="r") -> Tensor:
+  """
+  maps an (uncompressed) IDX file such as the MNIST images and labels, the shape is read from its header.
+  single byte types are mapped, wider types are byte swapped into memory on little-endian machines
+  """
+  path = pathlib.Path(path)
+  with open(path, "rb") as f:
+    zero, code, ndim = struct.unpack(">HBB", f.read(4))
+    if zero != 0 or code not in _idx_dtypes: raise ValueError(f"{path} is not an IDX file")
+    shape = struct.unpack(f">{ndim}I", f.read(4 * ndim))
+  offset, np_dtype = 4 + 4 * ndim, np.dtype(_idx_dtypes[code])
+  if np_dtype.itemsize > 1 and not np_dtype.isnative:
+    return Tensor(np.fromfile(path, dtype=np_dtype, offset=offset).reshape(shape).astype(np_dtype.newbyteorder("=")))
+  return _mapped(path, np_dtype.newbyteorder("="), shape, offset, False, mmap_mode)
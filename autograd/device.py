@@ -1,4 +1,5 @@
 from functools import cached_property
+from typing import Optional
 
 available_devices = ["CPU"]
 
@@ -7,10 +8,22 @@ class _Device:
     Device is where Tensors are stored and compute is run.
     We will autodetect the best device on your system and make it the default.
     For now tho we will use CPU
+    A device can carry the number of worker threads its kernels may use: "CPU:8"
+    without it the core uses AUTOGRAD_THREADS or all available cores
     """
 
     @cached_property
     def DEFAULT(self) -> str:
         return "CPU"
 
-Device = _Device()
\ No newline at end of file
+    def canonicalize(self, device: Optional[str]) -> str:
+        name, _, count = (device or self.DEFAULT).upper().partition(":")
+        if name not in available_devices: raise ValueError(f"unknown device {device}, available devices are {available_devices}")
+        if count and (not count.isdigit() or int(count) < 1): raise ValueError(f"invalid thread count in device {device}")
+        return f"{name}:{count}" if count else name
+
+    def num_threads(self, device: Optional[str]) -> Optional[int]:
+        _, _, count = self.canonicalize(device).partition(":")
+        return int(count) if count else None
+
+Device = _Device()
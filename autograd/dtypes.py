@@ -1,3 +1,6 @@
+import math
+import struct
+import sys
 from dataclasses import dataclass
 from typing import Literal, Final
 
@@ -44,6 +47,7 @@ class dtypes:
 
 dtype_default_float = dtypes.float64
 dtype_default_int = dtypes.int64
+float_dtypes = (dtypes.float16, dtypes.bfloat16, dtypes.float32, dtypes.float64)
 
 DTypeLike=str|DType
 def to_dtype(dtype:DTypeLike) -> DType: return dtype if isinstance(dtype, DType) else getattr(dtypes,dtype)
@@ -64,7 +68,51 @@ def least_common_dtype(x,y) -> DType:
     y_dtype = as_dtype(y)
     return x_dtype if x_dtype.priority > y_dtype.priority else y_dtype
 
+def _narrow(value: float, exp: int, man: int) -> int:
+    """
+    the bits of `value` rounded once, to nearest even, to a binary float with `exp` exponent and `man` mantissa bits.
+    the algorithm of `narrow` in half.rs, folded constants round like the kernels
+    """
+    bits = struct.unpack("=Q", struct.pack("=d", value))[0]
+    sign, e64, m64 = (bits >> 63) << (exp + man), (bits >> 52) & 0x7FF, bits & ((1 << 52) - 1)
+    inf = ((1 << exp) - 1) << man
+    if e64 == 0x7FF: return sign | inf | ((1 << (man - 1)) if m64 else 0)
+    if e64 == 0: return sign # double subnormals are far below the smallest 16-bit subnormal
+    # biased exponent of the result, results with e <= 0 are subnormal and drop more bits
+    e = e64 - 1023 + (1 << (exp - 1)) - 1
+    shift = 52 - man + (1 - e if e <= 0 else 0)
+    if shift > 53: return sign
+    full = m64 | (1 << 52)
+    m, rem, half = full >> shift, full & ((1 << shift) - 1), 1 << (shift - 1)
+    if rem > half or (rem == half and m & 1): m += 1
+    # a rounding carry into the next binade runs into the exponent field
+    out = m if e <= 0 else ((e - 1) << man) + m
+    return sign | min(out, inf)
+
+def cast_scalar(value: bool|int|float, dtype: DType) -> bool|int|float:
+    """
+    the value a buffer of `dtype` stores for a python scalar, with the semantics of the cast kernels (Rust `as`):
+    floats saturate to the range of an int dtype with nan as 0, ints wrap around, floats round to nearest and overflow to inf
+    """
+    if dtype == dtypes.boolean: return bool(value)
+    if dtype.fmt in "bBhiq":
+        bits, signed = dtype.bitsize, dtype.fmt != "B"
+        if isinstance(value, float):
+            lo, hi = (-(1 << (bits - 1)), (1 << (bits - 1)) - 1) if signed else (0, (1 << bits) - 1)
+            return 0 if math.isnan(value) else max(lo, min(int(value) if math.isfinite(value) else (hi if value > 0 else lo), hi))
+        value = int(value) & ((1 << bits) - 1)
+        return value - (1 << bits) if signed and value >= 1 << (bits - 1) else value
+    if dtype == dtypes.bfloat16: return struct.unpack("=f", struct.pack("=I", _narrow(float(value), 8, 7) << 16))[0]
+    try: return struct.unpack(dtype.fmt, struct.pack(dtype.fmt, float(value)))[0]
+    except OverflowError: return math.copysign(math.inf, value)
+
+def scalar_bytes(value: bool|int|float, dtype: DType) -> bytes:
+    if dtype != dtypes.bfloat16: return struct.pack(dtype.fmt, cast_scalar(value, dtype))
+    f32 = struct.pack("=f", cast_scalar(value, dtype))
+    return f32[2:] if sys.byteorder == "little" else f32[:2]
+
 DTYPES_DICT = {k:v for k,v in dtypes.__dict__.items()}
+FMT_TO_DTYPE = {v.fmt:v for v in DTYPES_DICT.values() if isinstance(v, DType)}
 
 def _from_np_dtypes(npdtype: 'np.dtype') -> DType: # type: ignore [name-defined] # noqa: F821
     import numpy as np
@@ -0,0 +1,114 @@
+"""
+gradient checkpointing: the activations inside a checkpointed segment are freed after their last forward use and recomputed from
+the segment inputs when the backward pass reaches the segment, trading one extra forward pass for memory.
+segments are marked by hand with `checkpoint`, or picked by backward to fit a memory budget inside `memory_budget`
+"""
+from __future__ import annotations
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass
+from math import prod
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from autograd_core import Buffer, arena_stats, reset_arena_stats
+from autograd.engine.realize import peak_bytes
+from autograd.ops import Ops, compute_ops
+from autograd.ops.gradient import Segments, needed_nodes
+from autograd.ops.uop import UOp
+from autograd.scheduler import Scheduler
+if TYPE_CHECKING: from autograd.tensor import Tensor
+
+T = TypeVar("T")
+Roots = List[Tuple[UOp, Optional[Buffer]]] # the outputs of a backward pass, paired with the buffer they are accumulated into
+
+_segments: weakref.WeakKeyDictionary[UOp, Tuple[UOp,...]] = weakref.WeakKeyDictionary()
+
+def checkpoint(fn: Callable[..., T], *inputs: Tensor) -> T:
+  """
+  returns fn(*inputs) and marks the graph between `inputs` and the result (a tensor or a tuple of tensors) as a checkpointed segment.
+  backward keeps the inputs alive instead of the activations of the segment, tensors `fn` closes over (weights) are read directly
+  """
+  out = fn(*inputs)
+  for t in (out if isinstance(out, tuple) else (out,)): _segments[t.uop] = tuple(x.uop for x in inputs) # type: ignore
+  return out
+
+def segments(root: UOp) -> Dict[UOp, Tuple[UOp,...]]:
+  # the segments marked with `checkpoint` in the graph of `root`
+  return {u: _segments[u] for u in root.toposort() if u in _segments}
+
+def _nbytes(u: UOp) -> int: return prod(u.shape) * (u.dtype.bitsize // 8)
+
+def split(root: UOp, targets: Sequence[UOp], count: int) -> Dict[UOp, Tuple[UOp,...]]:
+  """
+  cuts the forward graph of `root` into `count` segments holding about the same activation bytes, the first `count - 1` are checkpointed.
+  the last one is not, its activations are the first the backward pass reads. the first segment is recomputed from its BUFFER leaves
+  """
+  spine = [u for u in needed_nodes(root, targets) if u.op in compute_ops and u is not root]
+  total = sum(_nbytes(u) for u in spine)
+  ends: List[UOp] = []
+  seen = 0
+  for u in spine:
+    seen += _nbytes(u)
+    if len(ends) < count - 1 and seen * count >= total * (len(ends) + 1): ends.append(u)
+  ret: Dict[UOp, Tuple[UOp,...]] = {}
+  for i, end in enumerate(ends):
+    ret[end] = (ends[i - 1],) if i else tuple(u for u in end.toposort() if u.op == Ops.BUFFER)
+  return ret
+
+def predict(roots: Roots) -> int:
+  # peak bytes the schedule of a backward pass allocates, see `peak_bytes`
+  scheduler = Scheduler(tuple(uop for uop, _ in roots))
+  return peak_bytes(scheduler.nodes, {i: out for i, (_, out) in zip(scheduler.output_ids, roots)})
+
+@dataclass
+class MemoryReport:
+  budget: int
+  baseline_peak: int # predicted without automatic checkpoints
+  predicted_peak: int
+  actual_peak: int # measured by the storage arena
+  segments: int # checkpointed segments picked to meet the budget
+
+class MemoryBudget:
+  """
+  plans the checkpoints of backward passes run inside `memory_budget`, one MemoryReport is recorded per backward pass.
+  the number of segments grows until the predicted peak fits the budget, the plan with the lowest peak is used when none does
+  """
+  def __init__(self, budget: int):
+    self.budget = budget
+    self.reports: List[MemoryReport] = []
+
+  def plan(self, root: UOp, targets: Sequence[UOp], marked: Segments, build: Callable[[Segments], Roots]) -> Segments:
+    # `build` returns the outputs of the backward pass of `root` with the given segments checkpointed
+    best = baseline = (predict(build(marked)), 0, marked)
+    spine = sum(1 for u in needed_nodes(root, targets) if u.op in compute_ops)
+    count = 2
+    while best[0] > self.budget and count <= spine:
+      plan = {**(auto := split(root, targets, count)), **marked}
+      if (peak := predict(build(plan))) < best[0]: best = (peak, len(auto), plan)
+      count = max(count + 1, count * 3 // 2)
+    self.reports.append(MemoryReport(self.budget, baseline[0], best[0], 0, best[1]))
+    return best[2]
+
+  @contextmanager
+  def measure(self) -> Iterator[None]:
+    # the actual peak of the last planned backward pass, the arena peak is reset to the bytes live now
+    reset_arena_stats()
+    live = arena_stats()["live_bytes"]
+    yield
+    self.reports[-1].actual_peak = arena_stats()["peak_bytes"] - live
+
+_active: Optional[MemoryBudget] = None
+
+def current() -> Optional[MemoryBudget]: return _active
+
+@contextmanager
+def memory_budget(nbytes: int) -> Iterator[MemoryBudget]:
+  """
+  backward passes inside the block checkpoint segments of the forward graph until their predicted peak fits in `nbytes`:
+    with memory_budget(256 << 20) as budget: loss.backward()
+    report = budget.reports[-1]; report.predicted_peak, report.actual_peak
+  """
+  global _active
+  prev, _active = _active, MemoryBudget(nbytes)
+  try: yield _active
+  finally: _active = prev
@@ -0,0 +1,105 @@
+from __future__ import annotations
+import functools
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from autograd_core import Buffer
+from autograd.device import Device
+from autograd.dtypes import DType
+from autograd.engine.realize import Kernel, const_buffer, dead_after, donors, input_buffer, lower, threads
+from autograd.ops import Ops
+from autograd.ops.uop import UOp
+from autograd.scheduler import Scheduler, capturing
+from autograd.tensor import Tensor
+
+@dataclass(frozen=True)
+class CapturedGraph:
+  """
+  the kernels of a schedule with all their arguments bound. buffers live in numbered slots (the node ids),
+  `template` holds the buffers that are the same on every call: tensors the function closes over and constants it creates
+  """
+  template: Tuple[Optional[Buffer],...]
+  inputs: Tuple[Tuple[int,int],...] # (argument position, slot)
+  # kernel, source slots, output slot, slots dead after it, donor slot
+  steps: Tuple[Tuple[Kernel, Tuple[int,...], int, Tuple[int,...], Optional[int]],...]
+  outputs: Tuple[Tuple[int, DType, Tuple[int,...], Tuple[int,...]],...] # slot, dtype, shape, strides
+  device: str
+
+  def __call__(self, buffers: List[Buffer]) -> List[Tensor]:
+    slots = list(self.template)
+    for pos, slot in self.inputs: slots[slot] = buffers[pos]
+    with threads(Device.num_threads(self.device)):
+      for kernel, srcs, out, dead, donor in self.steps:
+        if donor is not None and slots[donor].unique: slots[out] = kernel(*[slots[s] for s in srcs], out=slots[donor]) # type: ignore
+        else: slots[out] = kernel(*[slots[s] for s in srcs])
+        for s in dead: slots[s] = None # intermediates go back to the arena, the next call allocates the same sizes
+    return [_realized(slots[slot], dtype, shape, strides, self.device) for slot, dtype, shape, strides in self.outputs] # type: ignore
+
+def _realized(buffer: Buffer, dtype: DType, shape: Tuple[int,...], strides: Tuple[int,...], device: str) -> Tensor:
+  t = Tensor(UOp(Ops.BUFFER, dtype, src=(), arg=(buffer, shape, strides, buffer.offset)), device=device)
+  t._buffer = buffer
+  return t
+
+def _placeholder(t: Tensor, buffer: Buffer) -> Tensor:
+  return Tensor(UOp(Ops.BUFFER, t.dtype, src=(), arg=(buffer, tuple(buffer.shape), tuple(buffer.strides), buffer.offset)), device=t.device)
+
+def capture(outputs: Tuple[Tensor,...], buffers: List[Buffer]) -> CapturedGraph:
+  """
+  schedules `outputs` once and binds every node to its kernel, BUFFER nodes wrapping one of `buffers` become input slots.
+  realized nodes are scheduled from their graph, their buffers hold the values of this call only
+  """
+  scheduler = Scheduler(tuple(t.uop for t in outputs), use_realized=False)
+  nodes, keep = scheduler.nodes, set(scheduler.output_ids)
+  by_id = {n.id: n for n in nodes}
+  position = {id(b): i for i, b in reversed(list(enumerate(buffers)))} # aliased arguments map to the first one
+  template: List[Optional[Buffer]] = [None] * (max(by_id) + 1)
+  inputs, steps = [], []
+  dead = dead_after(nodes)
+  donor = donors(nodes, dead, keep)
+  for i, n in enumerate(nodes):
+    if n.op == Ops.BUFFER:
+      if id(n.args[0]) in position: inputs.append((position[id(n.args[0])], n.id)) # type: ignore
+      else: template[n.id] = input_buffer(n)
+    elif n.op == Ops.CONST:
+      template[n.id] = const_buffer(n)
+    else:
+      steps.append((lower(n), n.src_ids, n.id, tuple(s for s in dead.get(i, ()) if s not in keep), donor.get(i)))
+  return CapturedGraph(
+    template=tuple(template),
+    inputs=tuple(inputs),
+    steps=tuple(steps),
+    outputs=tuple((oid, by_id[oid].dtype, by_id[oid].shape, by_id[oid].strides) for oid in scheduler.output_ids),
+    device=outputs[0].device,
+  )
+
+class Jit:
+  """
+  runs `fn` once per signature and replays the captured kernels on later calls, skipping graph building and scheduling.
+  the signature is the dtype, shape, strides and offset of every positional Tensor argument plus all other arguments,
+  which have to be hashable. on replay `fn` is not called: its python side effects only happen while capturing and
+  tensors it closes over are bound by their buffer, tensors it realizes are recomputed. `fn` returns a Tensor or a tuple of Tensors
+  """
+  def __init__(self, fn: Callable[..., Tensor|Tuple[Tensor,...]]):
+    self.fn = fn
+    self.captured: Dict[tuple, Tuple[CapturedGraph, bool]] = {}
+    functools.update_wrapper(self, fn)
+
+  def __call__(self, *args: Any, **kwargs: Any) -> Tensor|Tuple[Tensor,...]:
+    tensors = [a for a in args if isinstance(a, Tensor)]
+    buffers: List[Buffer] = [t.realize()._buffer for t in tensors] # type: ignore
+    first: Dict[int, int] = {}
+    key = (
+      tuple((t.dtype, tuple(b.shape), tuple(b.strides), b.offset, first.setdefault(id(b), i)) for i, (t, b) in enumerate(zip(tensors, buffers))),
+      tuple(None if isinstance(a, Tensor) else a for a in args),
+      tuple(sorted(kwargs.items())),
+    )
+    if (entry := self.captured.get(key)) is None:
+      placeholders = iter([_placeholder(t, b) for t, b in zip(tensors, buffers)])
+      with capturing(): ret = self.fn(*[next(placeholders) if isinstance(a, Tensor) else a for a in args], **kwargs)
+      outputs = ret if isinstance(ret, tuple) else (ret,)
+      if not outputs or not all(isinstance(o, Tensor) for o in outputs):
+        raise TypeError(f"jit functions return a Tensor or a tuple of Tensors, got {type(ret)}")
+      self.captured[key] = entry = (capture(outputs, buffers), isinstance(ret, tuple))
+    graph, returns_tuple = entry
+    out = graph(buffers)
+    return tuple(out) if returns_tuple else out[0]
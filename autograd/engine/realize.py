@@ -1,50 +1,169 @@
-from typing import List, Dict
+from collections import defaultdict
+from contextlib import contextmanager
+from math import prod
+from typing import Callable, Collection, Iterator, List, Dict, Optional
 
 from autograd_core import View
-from autograd.scheduler import Node
-from autograd.ops import Ops
-from autograd_core import Buffer, add_tensors
+from autograd.scheduler import Node, overwritten
+from autograd.engine import trace
+from autograd.dtypes import scalar_bytes
+from autograd.ops import Ops, alias_ops, inplace_ops, input_ops, reduce_ops, view_ops
+from autograd_core import Buffer, add_tensors, contiguous, mul_tensors, fused_elementwise, matmul, reduce
+from autograd_core import set_local_num_threads
 
-def run_schedule(exec_items: List[Node]) -> Buffer:
+def dead_after(exec_items: List[Node]) -> Dict[int, List[int]]:
+  """
+  liveness of the schedule: maps the position of a node to the ids of the nodes whose buffers are not read after it ran
+  """
+  last_use: Dict[int, int] = {}
+  for i, item in enumerate(exec_items):
+    for src_id in item.src_ids: last_use[src_id] = i
+  dead: Dict[int, List[int]] = defaultdict(list)
+  for src_id, i in last_use.items(): dead[i].append(src_id)
+  return dead
+
+Kernel = Callable[..., Buffer]
+
+def donors(exec_items: List[Node], dead: Dict[int, List[int]], keep: Collection[int]=()) -> Dict[int, int]:
+  """
+  buffer donation: maps the position of an elementwise node to a source whose buffer the node may write its result into.
+  the source has to be an intermediate with the dtype and shape of the result that is dead after the node and not an output,
+  BUFFER and CONST nodes belong to tensors and views (and CHECKPOINTs) share the storage of their source. a view taken of the source earlier
+  can still be alive, so the buffer is only reused when it is `unique` when the node runs
+  """
+  by_id = {n.id: n for n in exec_items}
+  ret: Dict[int, int] = {}
+  for i, item in enumerate(exec_items):
+    if item.op not in inplace_ops: continue
+    for s in item.src_ids:
+      src = by_id[s]
+      if s not in dead.get(i, ()) or s in keep or src.op in input_ops or src.op in alias_ops: continue
+      if (src.dtype, src.shape) == (item.dtype, item.shape):
+        ret[i] = s
+        break
+  return ret
+
+def input_buffer(item: Node) -> Buffer:
+  # BUFFER nodes hold their buffer, it is created when the tensor is (lists, bytes, arrays, files)
+  return item.args[0] # type: ignore
+
+def const_buffer(item: Node) -> Buffer:
+  # a 0-d buffer, consumers that do not take immediates read it through stride 0 views
+  return Buffer(scalar_bytes(item.args[0], item.dtype), [], [], item.dtype.fmt, 0) # type: ignore
+
+def lower(item: Node) -> Kernel:
+  """
+  binds a compute or view node to its kernel and static arguments, the result is called with the buffers of the node's sources
+  """
+  if item.op == Ops.ADD: return add_tensors
+  if item.op == Ops.MUL: return mul_tensors
+  if item.op == Ops.MATMUL: return matmul
+  if item.op == Ops.FUSED:
+    program, shape = item.args, item.shape
+    return lambda *buffers, out=None: fused_elementwise(list(buffers), program, shape, out)
+  if item.op in reduce_ops:
+    axes, keepdim = item.args # type: ignore
+    name = item.op.name.lower()
+    return lambda buffer: reduce(buffer, name, axes, keepdim)
+  if item.op == Ops.CAST:
+    fmt, shape = item.dtype.fmt, item.shape
+    def cast(buffer: Buffer, out: Optional[Buffer]=None) -> Buffer:
+      if out is None: return Buffer.cast_buffer(buffer, fmt)
+      # written in place a cast runs as a fused program
+      return fused_elementwise([buffer], (("load", 0, buffer.format), ("cast", 0, fmt)), shape, out)
+    return cast
+  if item.op == Ops.PAD:
+    (shape, placement), fmt = item.args, item.dtype.fmt # type: ignore
+    def pad(buffer: Buffer) -> Buffer:
+      out = Buffer.zeros(list(shape), fmt)
+      copy_into(out.view(placement), buffer)
+      return out
+    return pad
+  if item.op == Ops.CONTIGUOUS: return contiguous
+  if item.op == Ops.CHECKPOINT: return lambda buffer, after: buffer.view(View(buffer.shape, buffer.strides, buffer.offset))
+  if item.op in view_ops:
+    if not isinstance(item.args, View): raise ValueError(f"View op received arg that is not a view object {type(item.args)}")
+    view = item.args
+    return lambda buffer: buffer.view(view)
+  raise NotImplementedError(f"no kernel for {item.op}")
+
+def copy_into(out: Buffer, buffer: Buffer) -> Buffer:
+  return fused_elementwise([buffer], (("load", 0, buffer.format),), list(out.shape), out)
+
+def _execute(item: Node, node_mem_cache: Dict[int, Buffer], out: Optional[Buffer]=None) -> Buffer:
+  if out is not None and item.op in inplace_ops: return lower(item)(*[node_mem_cache[s] for s in item.src_ids], out=out)
+  if item.op == Ops.BUFFER: ret = input_buffer(item)
+  elif item.op == Ops.CONST: ret = const_buffer(item)
+  else: ret = lower(item)(*[node_mem_cache[s] for s in item.src_ids])
+  return ret if out is None else copy_into(out, ret)
+
+@contextmanager
+def threads(num_threads: Optional[int]) -> Iterator[None]:
+  # the count of a "CPU:n" device holds for the kernels this thread calls while its schedule runs, schedules running on other
+  # threads (a DataLoader, kernels release the GIL) keep their own count
+  if num_threads is None:
+    yield
+    return
+  prev = set_local_num_threads(num_threads)
+  try: yield
+  finally: set_local_num_threads(prev)
+
+def execute_schedule(exec_items: List[Node], outputs: Dict[int, Optional[Buffer]], num_threads: Optional[int]=None) -> Dict[int, Buffer]:
+  """
+  executes the schedule and returns the buffers of the `outputs` nodes, an output mapped to a buffer is written into it (see Tensor.assign).
+  elementwise kernels write into the buffer of a source that dies with them instead of allocating, see `donors`
+  """
   node_mem_cache: Dict[int, Buffer]= {}
-  for item in exec_items:
-    print(item)
-    if item.op == Ops.BUFFER:
-      buffer = Buffer(
-        item.args[0], # type: ignore
-        item.args[1], # type: ignore
-        item.args[2], # type: ignore
-        item.dtype.fmt,
-        0
-      )
-      node_mem_cache[item.id] = buffer
-
-    if item.op == Ops.ADD:
-      buffers = [node_mem_cache[i] for i in item.src_ids]
-      node_mem_cache[item.id] = add_tensors(*buffers)
-    if item.op == Ops.CONST:
-      pass
-    if item.op == Ops.RESHAPE:
-      buffer = node_mem_cache[item.src_ids[0]]
-      if isinstance(item.args, View):
-        node_mem_cache[item.id] =  buffer.view(item.args)
-      else:
-        raise ValueError(f"View op received arg that is not a view object {type(item.args)}")
-    if item.op == Ops.CAST:
-      b = node_mem_cache[item.src_ids[0]]
-      node_mem_cache[item.id] = Buffer.cast_buffer(b, item.dtype.fmt)
-    if item.op == Ops.SLICE:
-      buffer = node_mem_cache[item.src_ids[0]]
-      if isinstance(item.args, View):
-        node_mem_cache[item.id] = buffer.view(item.args)
-      else:
-        raise ValueError(f"View op received arg that is not a view object {type(item.args)}")
-    if item.op == Ops.EXPAND:
-      print("Expanding")
-      buffer = node_mem_cache[item.src_ids[0]]
-      if isinstance(item.args, View):
-        node_mem_cache[item.id] = buffer.view(item.args)
-      else:
-        raise ValueError(f"View op received arg that is not a view object {type(item.args)}")
-
-  return node_mem_cache[exec_items[-1].id]
\ No newline at end of file
+  dead = dead_after(exec_items)
+  donor = donors(exec_items, dead, outputs)
+  # the tracer is looked up once, untraced runs call the kernels directly
+  execute = _execute if (tracer := trace.current()) is None else tracer.timed(_execute)
+  # kernels release the GIL and split large loops over the worker threads of the core
+  with threads(num_threads):
+    for i, item in enumerate(exec_items):
+      target = outputs.get(item.id)
+      if target is None and (s := donor.get(i)) is not None and node_mem_cache[s].unique: target = node_mem_cache[s]
+      node_mem_cache[item.id] = execute(item, node_mem_cache, target)
+      # drop intermediates as soon as their last consumer ran, their storage goes back to the arena
+      # (views share the storage of their source, so it is only recycled once the last view is gone)
+      for src_id in dead.get(i, ()):
+        if src_id not in outputs: node_mem_cache.pop(src_id, None)
+  # realized graphs that read the buffers written in place are stale now
+  if written := [b for b in outputs.values() if b is not None]: overwritten(*written)
+  return {i: node_mem_cache[i] for i in outputs}
+
+def peak_bytes(exec_items: List[Node], outputs: Dict[int, Optional[Buffer]]) -> int:
+  """
+  the peak of the bytes `execute_schedule` allocates while it runs the schedule, predicted by replaying it without the kernels.
+  a node allocates its result unless it shares the storage of its source (views, CHECKPOINT), it is written into a donated buffer or an
+  output buffer, or it wraps external memory. a storage is released once no live node refers to it, outputs are never released
+  """
+  dead = dead_after(exec_items)
+  donor = donors(exec_items, dead, outputs)
+  storage: Dict[int, int] = {} # node id -> id of the node that allocated its storage
+  refs: Dict[int, int] = defaultdict(int)
+  size: Dict[int, int] = defaultdict(int)
+  live = peak = 0
+  for i, item in enumerate(exec_items):
+    nbytes = prod(item.shape) * (item.dtype.bitsize // 8)
+    owner = item.id
+    if item.op in alias_ops: owner = storage[item.src_ids[0]]
+    elif outputs.get(item.id) is not None:
+      if item.op not in inplace_ops: peak = max(peak, live + nbytes) # computed into a temporary and copied
+    elif (s := donor.get(i)) is not None and refs[storage[s]] == 1: owner = storage[s]
+    elif item.op != Ops.BUFFER:
+      size[owner] = nbytes
+      live += nbytes
+      peak = max(peak, live)
+    storage[item.id] = owner
+    refs[owner] += 1
+    for src_id in dead.get(i, ()):
+      if src_id in outputs: continue
+      refs[storage[src_id]] -= 1
+      if refs[storage[src_id]] == 0: live -= size[storage[src_id]]
+  return peak
+
+def run_schedule(exec_items: List[Node], num_threads: Optional[int]=None, out: Optional[Buffer]=None) -> Buffer:
+  """executes a schedule of a single output, the last node, see `execute_schedule`"""
+  root = exec_items[-1].id
+  return execute_schedule(exec_items, {root: out}, num_threads)[root]
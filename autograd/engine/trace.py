@@ -0,0 +1,117 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from math import prod
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from autograd_core import Buffer
+from autograd.dtypes import FMT_TO_DTYPE
+from autograd.ops import Ops, alias_ops, inplace_ops
+from autograd.scheduler import Node
+
+Execute = Callable[[Node, Dict[int, Buffer], Optional[Buffer]], Buffer]
+
+@dataclass(frozen=True)
+class TraceEvent:
+  kernel: str # op name, fused kernels list their instructions: "fused[mul,add]"
+  op: str
+  node_id: int
+  group: Optional[int] # id of the FUSED node that executed it, the node itself for the group root
+  fused_ids: Tuple[int,...]
+  run: int # index of the run_schedule call within the trace
+  start: float # seconds since the trace started
+  duration: float
+  bytes_read: int
+  bytes_written: int
+  bytes_allocated: int
+  shape: Tuple[int,...]
+  dtype: str
+  thread: int
+
+def _footprint(buffer: Buffer) -> int:
+  # bytes a kernel touches to read `buffer`, stride 0 dims of broadcasts are read once
+  itemsize = FMT_TO_DTYPE[buffer.format].bitsize // 8
+  return prod(d for d, s in zip(buffer.shape, buffer.strides) if s != 0) * itemsize
+
+def _kernel_name(item: Node) -> str:
+  if item.op == Ops.FUSED: return f"fused[{','.join(ins[0] for ins in item.args if ins[0] not in ('load', 'const'))}]" # type: ignore
+  return item.op.name.lower()
+
+class Tracer:
+  """
+  collects one TraceEvent per executed node while it is active, see `trace`.
+  events can be aggregated with `summary` or exported for chrome://tracing and ui.perfetto.dev with `save_chrome_trace`
+  """
+  def __init__(self):
+    self.events: List[TraceEvent] = []
+    self.origin = time.perf_counter()
+    self.runs = 0
+
+  def timed(self, execute: Execute) -> Execute:
+    run = self.runs
+    self.runs += 1
+    def traced(item: Node, cache: Dict[int, Buffer], target: Optional[Buffer]=None) -> Buffer:
+      st = time.perf_counter()
+      out = execute(item, cache, target)
+      duration = time.perf_counter() - st
+      if item.op in alias_ops: read = written = allocated = 0 # views share the storage of their source
+      elif item.op == Ops.BUFFER: read = written = allocated = 0 # the buffer exists before the schedule runs
+      elif item.op == Ops.CONST: read, written, allocated = 0, 0, _footprint(out)
+      else:
+        read, written = sum(_footprint(cache[s]) for s in item.src_ids), _footprint(out)
+        allocated = 0 if target is not None and item.op in inplace_ops else written # written into a donated or assigned buffer
+      group = item.id if item.op == Ops.FUSED else None
+      self.events.append(TraceEvent(_kernel_name(item), item.op.name, item.id, group, item.fused_ids, run, st - self.origin, duration,
+                                    read, written, allocated, tuple(item.shape), item.dtype.name, threading.get_ident()))
+      return out
+    return traced
+
+  def summary(self) -> str:
+    """per kernel table of calls, time and bytes moved, the most expensive kernels first"""
+    rows: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0, 0, 0])
+    for e in self.events:
+      row = rows[e.kernel]
+      row[0] += 1
+      row[1] += e.duration
+      row[2] += e.bytes_read
+      row[3] += e.bytes_written
+      row[4] += e.bytes_allocated
+    total = sum(r[1] for r in rows.values()) or 1.0
+    lines = [f"{'kernel':<28} {'calls':>6} {'total ms':>9} {'mean us':>9} {'time %':>7} "
+             f"{'read MB':>9} {'written MB':>10} {'alloc MB':>9} {'GB/s':>7}"]
+    for name, (calls, t, read, written, allocated) in sorted(rows.items(), key=lambda kv: -kv[1][1]):
+      gbs = (read + written) / t / 1e9 if t > 0 else 0.0
+      lines.append(f"{name:<28} {calls:>6} {t * 1e3:>9.3f} {t / calls * 1e6:>9.1f} {t / total * 100:>6.1f}% "
+                   f"{read / 1e6:>9.2f} {written / 1e6:>10.2f} {allocated / 1e6:>9.2f} {gbs:>7.2f}")
+    return "\n".join(lines)
+
+  def chrome_trace(self) -> dict:
+    pid = os.getpid()
+    events = [{"name": e.kernel, "cat": e.op, "ph": "X", "ts": e.start * 1e6, "dur": e.duration * 1e6, "pid": pid, "tid": e.thread,
+               "args": {k: v for k, v in asdict(e).items() if k not in ("kernel", "op", "start", "duration", "thread")}} for e in self.events]
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+  def save_chrome_trace(self, path: str|os.PathLike):
+    with open(path, "w") as f: json.dump(self.chrome_trace(), f)
+
+_active: Optional[Tracer] = None
+
+def current() -> Optional[Tracer]: return _active
+
+@contextmanager
+def trace() -> Iterator[Tracer]:
+  """
+  records every node run_schedule executes inside the block:
+    with trace() as t: x.realize()
+    print(t.summary()); t.save_chrome_trace("trace.json")
+  outside of a trace run_schedule does no tracing work at all
+  """
+  global _active
+  prev, _active = _active, Tracer()
+  try: yield _active
+  finally: _active = prev
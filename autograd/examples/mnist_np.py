@@ -5,6 +5,7 @@ focused on speed rather than model accuracy
 
 import numpy as np
 from autograd.helpers import fetch
+from autograd.datasets import DataLoader
 
 SMALL = 1e-7
 
@@ -98,24 +99,16 @@ class Model:
     self.layer3.biases -= learning_rate * self.layer3.dbiases
 
   def train(self, train_images, train_labels, epochs, learning_rate, batch_size=64):
-    train_images = train_images / 255.0
-    train_dataset_size = train_images.shape[0]
+    loader = DataLoader(train_images, train_labels, batch_size=batch_size, normalize=(True, False))
+    num_batches = len(loader)
 
     for epoch in range(epochs):
-      train_images_indexes = np.arange(train_dataset_size)
-      np.random.shuffle(train_images_indexes) # shuffle train_images in memory
-      train_images = train_images[train_images_indexes]
-      train_labels = train_labels[train_images_indexes]
-
       epoch_loss = 0
       epoch_acc = 0
-      num_batches = train_dataset_size // batch_size
-
-      for i in range(0, train_dataset_size, batch_size):
-        batch_images = train_images[i:i+batch_size]
-        batch_labels = train_labels[i:i+batch_size]
 
-        if len(batch_labels) == 0: continue
+      # batches are shuffled and normalized on a background thread into reused buffers
+      for batch_images, batch_labels in loader:
+        batch_images, batch_labels = batch_images.numpy(), batch_labels.numpy()
 
         predictions = self.forward(batch_images)
         ce_loss = loss(predictions, batch_labels)
@@ -3,7 +3,9 @@ import os
 import platform
 import sys
 import hashlib
-from typing import Any, TypeVar, Union, Tuple, List, Sequence, TypeGuard, Iterable
+import time
+from typing import Any, NamedTuple, TypeVar, Union, Tuple, List, Sequence, TypeGuard, Iterable
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import tempfile
 from math import prod
@@ -38,26 +40,74 @@ def fully_flatten(data) -> Sequence:
 def _cache_download_dir() -> pathlib.Path:
   return cache_dir / "downloads"
 
-def fetch(url: str, allow_caching=not os.getenv("DISABLE_HTTP_CACHE"), allow_zipped:bool=False) -> pathlib.Path:
+class Fetched(NamedTuple):
+  url: str
+  path: pathlib.Path
+  nbytes: int # bytes downloaded by this call, 0 for a cache hit
+  resumed_from: int # size of the partial download that was continued
+  download_time: float
+  decompress_time: float
+  cached: bool
+
+def _check_digest(path: pathlib.Path, checksum: str):
+  # "algorithm:hexdigest", a bare hexdigest is sha256
+  algorithm, _, expected = checksum.rpartition(":")
+  h = hashlib.new(algorithm or "sha256")
+  with open(path, "rb") as f:
+    while chunk := f.read(1 << 20): h.update(chunk)
+  if h.hexdigest() != expected.lower(): raise RuntimeError(f"checksum mismatch for {path.name}, expected {expected} got {h.hexdigest()}")
+
+def _fetch_one(url: str, checksum: str|None, allow_caching: bool, allow_zipped: bool, position: int) -> Fetched:
   file = _cache_download_dir() / (hashlib.md5(url.encode('utf-8')).hexdigest() + (".gzip" if allow_zipped else ""))
-  if not file.is_file() or not allow_caching:
-    (_dir := file.parent).mkdir(parents=True, exist_ok=True)
-    # download the file
-    with requests.get(url, stream=True, timeout=10) as res:
-      assert res.status_code in (200,), res.status_code
-      file_size = int(res.headers.get("Content-Length", 0)) if not allow_zipped else None
-      progress_bar: tqdm = tqdm(total=file_size, unit="B", unit_scale=True, desc=f"{url.split('/')[-1]}")
-      readfile = gzip.GzipFile(fileobj=res.raw) if not allow_zipped else res.raw
-      with tempfile.NamedTemporaryFile(dir=_dir, delete=False) as f:
-        while chunk := readfile.read(16384):
-          f.write(chunk)
-          progress_bar.update(len(chunk))
-        f.close()
-        pathlib.Path(f.name).rename(file)
-      progress_bar.close()
-      if file_size and (downloaded_file_size:=os.stat(file).st_size) < file_size: raise RuntimeError(f"fetch size incomplete, {downloaded_file_size} < {file_size}")
-      res.close()
-  return file
+  if file.is_file() and allow_caching: return Fetched(url, file, 0, 0, 0.0, 0.0, True)
+  (_dir := file.parent).mkdir(parents=True, exist_ok=True)
+  # the compressed bytes go to a partial file named after the url, an interrupted download continues where it stopped
+  partial = file.with_name(file.name + ".partial")
+  resumed_from = partial.stat().st_size if partial.is_file() and allow_caching else 0
+  st = time.perf_counter()
+  with requests.get(url, stream=True, timeout=10, headers={"Range": f"bytes={resumed_from}-"} if resumed_from else None) as res:
+    if not (res.status_code == 416 and resumed_from): # 416: the partial file already holds everything
+      assert res.status_code in (200, 206), res.status_code
+      if res.status_code == 200: resumed_from = 0 # the server ignored the range, start over
+      file_size = int(res.headers.get("Content-Length", 0))
+      with tqdm(total=resumed_from + file_size or None, initial=resumed_from, unit="B", unit_scale=True, desc=url.split('/')[-1],
+                position=position, leave=False) as bar:
+        with open(partial, "ab" if resumed_from else "wb") as f:
+          while chunk := res.raw.read(1 << 20):
+            f.write(chunk)
+            bar.update(len(chunk))
+      if file_size and (downloaded_file_size := partial.stat().st_size - resumed_from) < file_size:
+        raise RuntimeError(f"fetch size incomplete, {downloaded_file_size} < {file_size}")
+  download_time, nbytes = time.perf_counter() - st, partial.stat().st_size - resumed_from
+  if checksum is not None:
+    try: _check_digest(partial, checksum)
+    except RuntimeError:
+      partial.unlink()
+      raise
+  st = time.perf_counter()
+  with open(partial, "rb") as f: gzipped = f.read(2) == b"\x1f\x8b"
+  if gzipped and not allow_zipped:
+    with gzip.open(partial, "rb") as src, tempfile.NamedTemporaryFile(dir=_dir, delete=False) as dst:
+      while chunk := src.read(1 << 20): dst.write(chunk)
+    pathlib.Path(dst.name).replace(file)
+    partial.unlink()
+  else: partial.replace(file)
+  return Fetched(url, file, nbytes, resumed_from, download_time, time.perf_counter() - st, False)
+
+def fetch_many(urls: Sequence[str], checksums: Sequence[str|None]|None=None, max_workers: int=4,
+               allow_caching=not os.getenv("DISABLE_HTTP_CACHE"), allow_zipped: bool=False) -> list[Fetched]:
+  """
+  downloads `urls` on a pool of at most `max_workers` threads and returns one record per url, in order.
+  gzip files are decompressed into the cache unless `allow_zipped`, a checksum ("sha256:<hex>", any hashlib algorithm) is checked
+  against the downloaded bytes. partial downloads are resumed with a Range request
+  """
+  if checksums is not None and len(checksums) != len(urls): raise ValueError(f"got {len(checksums)} checksums for {len(urls)} urls")
+  with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as pool:
+    futures = [pool.submit(_fetch_one, url, checksums[i] if checksums else None, allow_caching, allow_zipped, i) for i, url in enumerate(urls)]
+    return [f.result() for f in futures]
+
+def fetch(url: str, allow_caching=not os.getenv("DISABLE_HTTP_CACHE"), allow_zipped:bool=False) -> pathlib.Path:
+  return fetch_many([url], allow_caching=allow_caching, allow_zipped=allow_zipped)[0].path
 
 def calc_strides(shape: tuple, itemsize: int) -> tuple:
   if not shape:
@@ -67,6 +117,30 @@ def calc_strides(shape: tuple, itemsize: int) -> tuple:
     strides[i] = strides[i + 1] * shape[i + 1]
   return tuple(strides)
 
+def reshape_strides(shape: tuple[int,...], strides: tuple[int,...], new_shape: tuple[int,...], itemsize: int) -> tuple[int,...]|None:
+  """
+  strides that read the elements of a (shape, strides) layout as `new_shape` in the same row-major order, None when no such
+  strides exist and the reshape needs a copy. every group of dims that is merged must be contiguous with itself, split dims
+  take strides derived from the stride of the innermost dim of their group
+  """
+  if 0 in shape: return calc_strides(new_shape, itemsize)
+  old = [(d, s) for d, s in zip(shape, strides) if d != 1]
+  ret = [0] * len(new_shape)
+  oi = ni = 0
+  while oi < len(old) and ni < len(new_shape):
+    # grow the smallest groups old[oi:oj] and new_shape[ni:nj] that hold the same number of elements
+    oj, nj, old_size, new_size = oi + 1, ni + 1, old[oi][0], new_shape[ni]
+    while old_size != new_size:
+      if new_size < old_size: new_size, nj = new_size * new_shape[nj], nj + 1
+      else: old_size, oj = old_size * old[oj][0], oj + 1
+    if any(old[k][1] != old[k + 1][0] * old[k + 1][1] for k in range(oi, oj - 1)): return None
+    ret[nj - 1] = old[oj - 1][1]
+    for k in range(nj - 1, ni, -1): ret[k - 1] = ret[k] * new_shape[k]
+    oi, ni = oj, nj
+  # trailing dims of size 1
+  for k in range(ni, len(new_shape)): ret[k] = ret[ni - 1] if ni else itemsize
+  return tuple(ret)
+
 def all_int(a: Sequence[Any]) -> TypeGuard[Sequence[int]]:
   return all(isinstance(el, int) for el in a)
 
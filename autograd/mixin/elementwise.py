@@ -4,8 +4,7 @@ from typing import ClassVar
 from typing import Self
 from autograd.ops import Ops
 from autograd.ops.uop import UOp
-from autograd.dtypes import least_common_dtype
-from autograd.dtypes import as_dtype
+from autograd.dtypes import DType, DTypeLike, dtypes, float_dtypes, least_common_dtype, dtype_default_float, dtype_default_int, to_dtype
 from autograd.ops.uop import broadcast_shape
 
 class InvalidType:
@@ -24,6 +23,11 @@ class InvalidType:
 PyConst = float|int|bool
 ConstType = PyConst|InvalidType
 
+def _scalar_result_dtype(dtype: DType, value: ConstType) -> DType:
+  if isinstance(value, float) and dtype not in float_dtypes: return dtype_default_float
+  if isinstance(value, int) and not isinstance(value, bool) and dtype == dtypes.boolean: return dtype_default_int
+  return dtype
+
 class ElementwiseMixin:
   @property
   def shape(self):
@@ -35,18 +39,28 @@ class ElementwiseMixin:
   def dtype(self):
     raise NotImplementedError
   def expand(self, target_shape: int|tuple[int,...], *args: int) -> Self: ...
-  def __add__(self, other: Self|ConstType) -> Self: # todo: later scheduler should allow adding ints and floats by broadcasting
+  def _wrap(self, uop: UOp) -> Self: ...
+  def _binary_op(self, op: Ops, other: Self|ConstType) -> Self: # todo: later scheduler should allow adding ints and floats by broadcasting
     if hasattr(other,'shape'):
-      # assert self.shape == other.shape, f"at this moment broadcasting is not supported, cannot add tensors with different shapes {self.shape} != {other.shape}"
       if self.shape != other.shape:
         target_shape = broadcast_shape(self.shape, other.shape)
-        self = self.expand(target_shape)
-        other = other.expand(target_shape)
-      if self.dtype!= other.dtype:
-        target_dtype=least_common_dtype(self, other)
-        if self.dtype != target_dtype:
-          self.uop = UOp(Ops.CAST, dtype=target_dtype, src=(self.uop,))
-        if other.dtype != target_dtype:
-          other.uop = UOp(Ops.CAST, dtype=target_dtype, src=(other.uop,))
-      return self.__class__(UOp(Ops.ADD, dtype=least_common_dtype(self, other), src=(self.uop, other.uop)))
-    return self.__class__(UOp(Ops.ADD, dtype=least_common_dtype(self, other), src=(self.uop, UOp(Ops.CONST, dtype=as_dtype(other),arg=(other,)))))
+        # the operand that already has the target shape is used as it is, a computed result then stays a kernel's own buffer
+        if self.shape != target_shape: self = self.expand(target_shape)
+        if other.shape != target_shape: other = other.expand(target_shape)
+      target_dtype = least_common_dtype(self, other)
+      # promote on new uops, the operands themselves stay untouched
+      srcs = tuple(x.uop if x.dtype == target_dtype else UOp(Ops.CAST, dtype=target_dtype, src=(x.uop,)) for x in (self, other))
+      return self._wrap(UOp(op, dtype=target_dtype, src=srcs))
+    # python scalars are weakly typed: they take the dtype of the tensor unless their kind needs a wider one,
+    # so `t * 0.5` stays float32 and runs as a single pass with the scalar as a kernel immediate
+    dtype = _scalar_result_dtype(self.dtype, other)
+    src = self.uop if self.dtype == dtype else UOp(Ops.CAST, dtype=dtype, src=(self.uop,))
+    return self._wrap(UOp(op, dtype=dtype, src=(src, UOp(Ops.CONST, dtype=dtype, arg=(other,)))))
+  def cast(self, dtype: DTypeLike) -> Self:
+    dtype = to_dtype(dtype)
+    return self if dtype == self.dtype else self._wrap(UOp(Ops.CAST, dtype=dtype, src=(self.uop,)))
+  def __add__(self, other: Self|ConstType) -> Self: return self._binary_op(Ops.ADD, other)
+  def __mul__(self, other: Self|ConstType) -> Self: return self._binary_op(Ops.MUL, other)
+  # ADD and MUL commute, `1 + t` and `0.5 * t` build the same graph as `t + 1` and `t * 0.5`
+  def __radd__(self, other: ConstType) -> Self: return self._binary_op(Ops.ADD, other)
+  def __rmul__(self, other: ConstType) -> Self: return self._binary_op(Ops.MUL, other)
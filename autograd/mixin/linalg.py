@@ -0,0 +1,38 @@
+from __future__ import annotations
+from typing import Self
+from autograd.ops import Ops
+from autograd.ops.uop import UOp, broadcast_shape
+from autograd.dtypes import DType, least_common_dtype
+
+class LinalgMixin:
+  @property
+  def shape(self) -> tuple[int,...]:
+    raise NotImplementedError
+  @property
+  def dtype(self) -> DType:
+    raise NotImplementedError
+  def reshape(self, target_shape:list|tuple|int, *args) -> Self: ...
+  def expand(self, target_shape: int|tuple[int,...], *args: int) -> Self: ...
+  def _wrap(self, uop: UOp) -> Self: ...
+
+  def matmul(self, other: Self) -> Self:
+    """
+    matrix product following numpy semantics: 1-D operands are promoted to a row (self) or a column (other) and the
+    added dim is removed from the result, leading batch dims are broadcast
+    """
+    if not self.shape or not other.shape: raise ValueError("matmul does not accept 0-d tensors")
+    a = self.reshape(1, self.shape[0]) if len(self.shape) == 1 else self
+    b = other.reshape(other.shape[0], 1) if len(other.shape) == 1 else other
+    if a.shape[-1] != b.shape[-2]:
+      raise ValueError(f"matmul shapes {self.shape} and {other.shape} are not aligned: {a.shape[-1]} (dim -1) != {b.shape[-2]} (dim -2)")
+    batch = broadcast_shape(a.shape[:-2], b.shape[:-2])
+    # the kernel reads stride 0 batch dims in place, broadcasting here does not copy
+    if a.shape[:-2] != batch: a = a.expand(batch + a.shape[-2:])
+    if b.shape[:-2] != batch: b = b.expand(batch + b.shape[-2:])
+    target_dtype = least_common_dtype(a, b)
+    srcs = tuple(x.uop if x.dtype == target_dtype else UOp(Ops.CAST, dtype=target_dtype, src=(x.uop,)) for x in (a, b))
+    out = self._wrap(UOp(Ops.MATMUL, dtype=target_dtype, src=srcs))
+    if len(self.shape) == 1: out = out.reshape(out.shape[:-2] + out.shape[-1:])
+    if len(other.shape) == 1: out = out.reshape(out.shape[:-1])
+    return out
+  def __matmul__(self, other: Self) -> Self: return self.matmul(other)
@@ -1,5 +1,5 @@
 from autograd.helpers import argfix
-from autograd.helpers import calc_strides
+from autograd.helpers import calc_strides, reshape_strides
 from autograd.dtypes import DType
 from autograd_core import View
 from math import prod
@@ -21,6 +21,7 @@ class MovementMixin:
   @property
   def dtype(self) -> DType:
     raise NotImplementedError
+  def _wrap(self, uop: UOp) -> Self: ...
 
   def reshape(self, target_shape:list|tuple|int, *args) -> Self:
     if isinstance(target_shape, int):
@@ -35,9 +36,19 @@ class MovementMixin:
       target_shape = list(target_shape)
       target_shape[target_shape.index(-1)] = prod(self.shape) // (-1*prod(target_shape))
       target_shape = tuple(target_shape)
-    new_strides = calc_strides(target_shape, self.dtype.bitsize//8)
+    # a view when the strides of the source can be merged and split into the target shape, a copy otherwise
+    if (new_strides := reshape_strides(self.shape, self.strides, target_shape, self.dtype.bitsize//8)) is None:
+      return self.contiguous().reshape(target_shape)
     new_view = View(target_shape, new_strides, self.offset)
-    return self.__class__(UOp(Ops.RESHAPE,dtype=self.dtype, src=(self.uop,), arg=new_view))
+    return self._wrap(UOp(Ops.RESHAPE,dtype=self.dtype, src=(self.uop,), arg=new_view))
+  def is_contiguous(self) -> bool:
+    # row-major dense from the offset on, the strides of dims of size 1 are never used
+    dense = calc_strides(self.shape, self.dtype.bitsize//8)
+    return 0 in self.shape or all(s == d for n, s, d in zip(self.shape, self.strides, dense) if n != 1)
+  def contiguous(self) -> Self:
+    # a dense copy of a strided or broadcast tensor, dense tensors are returned as they are
+    if self.is_contiguous(): return self
+    return self._wrap(UOp(Ops.CONTIGUOUS, dtype=self.dtype, src=(self.uop,)))
   def expand(self, target_shape: int|tuple[int,...], *args: int):
     if args:
       if not isinstance(target_shape, int): raise ValueError("Error: expand(2,3) or expand((2,3))")
@@ -57,7 +68,19 @@ class MovementMixin:
         raise ValueError(f"cannot expand tensor with shape {self.shape} with target_shape {target_shape}")
     new_strides = tuple(reversed(new_strides))
     view = View(target_shape, new_strides, self.offset)
-    return self.__class__(UOp(Ops.EXPAND, dtype=self.dtype, src=(self.uop,), arg=view))
+    return self._wrap(UOp(Ops.EXPAND, dtype=self.dtype, src=(self.uop,), arg=view))
+
+  def permute(self, order: tuple[int,...]|int, *args: int) -> Self:
+    order = (order,) + args if isinstance(order, int) else tuple(order)
+    if sorted(o % len(self.shape) for o in order) != list(range(len(self.shape))) or len(order) != len(self.shape):
+      raise ValueError(f"{order} is not a permutation of the {len(self.shape)} dims of the tensor")
+    order = tuple(o % len(self.shape) for o in order)
+    view = View(tuple(self.shape[o] for o in order), tuple(self.strides[o] for o in order), self.offset)
+    return self._wrap(UOp(Ops.PERMUTE, dtype=self.dtype, src=(self.uop,), arg=view))
+  def transpose(self, dim0: int=-2, dim1: int=-1) -> Self:
+    order = list(range(len(self.shape)))
+    order[dim0], order[dim1] = order[dim1], order[dim0]
+    return self.permute(tuple(order))
 
   def __getitem__(self,idx) -> Self:
     idx = argfix(idx)
@@ -90,4 +113,4 @@ class MovementMixin:
         raise TypeError(f"unsupported index type: {type(dim)!r}")
       index += 1
     view = View(new_shape, new_strides, new_offset)
-    return self.__class__(UOp(Ops.SLICE, self.dtype, src=(self.uop,), arg=view))
\ No newline at end of file
+    return self._wrap(UOp(Ops.SLICE, self.dtype, src=(self.uop,), arg=view))
\ No newline at end of file
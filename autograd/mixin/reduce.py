@@ -0,0 +1,51 @@
+from __future__ import annotations
+from math import prod
+from typing import Self
+from autograd.ops import Ops
+from autograd.ops.uop import UOp
+from autograd.dtypes import DType, dtypes, float_dtypes, dtype_default_float
+
+class ReduceMixin:
+  @property
+  def shape(self) -> tuple[int,...]:
+    raise NotImplementedError
+  @property
+  def dtype(self) -> DType:
+    raise NotImplementedError
+  def _wrap(self, uop: UOp) -> Self: ...
+
+  def _normalize_axes(self, axis: int|tuple[int,...]|None) -> tuple[int,...]:
+    if axis is None: return tuple(range(len(self.shape)))
+    axes = (axis,) if isinstance(axis, int) else tuple(axis)
+    for a in axes:
+      if not -len(self.shape) <= a < len(self.shape): raise IndexError(f"axis {a} is out of bounds for tensor of dimension {len(self.shape)}")
+    axes = tuple(sorted(a % len(self.shape) for a in axes))
+    if len(set(axes)) != len(axes): raise ValueError(f"repeated axis in {axis}")
+    return axes
+
+  def _reduce(self, op: Ops, axis: int|tuple[int,...]|None, keepdim: bool, dtype: DType|None=None) -> Self:
+    axes = self._normalize_axes(axis)
+    if op != Ops.SUM and any(self.shape[a] == 0 for a in axes): raise ValueError(f"{op} of an empty dimension is undefined")
+    return self._wrap(UOp(op, dtype=dtype or self.dtype, src=(self.uop,), arg=(axes, keepdim))) # type: ignore
+
+  def sum(self, axis: int|tuple[int,...]|None=None, keepdim: bool=False) -> Self:
+    """
+    floats are summed pairwise along contiguous runs (Kahan compensated across them), ints wrap around in their own dtype
+    """
+    return self._reduce(Ops.SUM, axis, keepdim)
+  def max(self, axis: int|tuple[int,...]|None=None, keepdim: bool=False) -> Self:
+    return self._reduce(Ops.MAX, axis, keepdim)
+  def mean(self, axis: int|tuple[int,...]|None=None, keepdim: bool=False) -> Self:
+    # ints are averaged in the default float dtype like in numpy
+    x = self if self.dtype in float_dtypes else self._wrap(UOp(Ops.CAST, dtype=dtype_default_float, src=(self.uop,))) # type: ignore
+    count = prod(self.shape[a] for a in self._normalize_axes(axis))
+    s = x.sum(axis, keepdim)
+    # the scale is a CONST of the sum's dtype so that float32 means stay float32
+    scale = UOp(Ops.CONST, dtype=s.dtype, arg=(1.0 / count if count else float("nan"),))
+    return self._wrap(UOp(Ops.MUL, dtype=s.dtype, src=(s.uop, scale))) # type: ignore
+  def argmax(self, axis: int|None=None, keepdim: bool=False) -> Self:
+    """
+    index of the first maximum along `axis`, or into the flattened tensor when `axis` is None
+    """
+    if axis is not None and not isinstance(axis, int): raise TypeError("argmax takes a single axis")
+    return self._reduce(Ops.ARGMAX, axis, keepdim, dtype=dtypes.int64)
@@ -17,13 +17,29 @@ class Ops(FastEnum):
   CAST=auto() # lazydata: (tensor, shape)
   SLICE=auto()
   EXPAND=auto()
+  MUL=auto()
+  FUSED=auto() # scheduler only: chain of elementwise ops executed as a single kernel, arg=program
+  MATMUL=auto() # src=(a, b), batch dims already broadcast
+  SUM=auto()
+  MAX=auto()
+  ARGMAX=auto() # indices are int64
+  PERMUTE=auto()
+  PAD=auto() # arg=(shape, View): a zero tensor of `shape` with the source written at the View, the gradient of SLICE
+  CHECKPOINT=auto() # src=(x, after): x itself, read only once `after` ran. recomputed segments of backward graphs start from it
+  CONTIGUOUS=auto() # a dense copy of the source, reshapes of views whose strides cannot be merged read from it
 
 """
 View operations do not run any compute on the underlying data. They only change the way the underlying data is interpreted.
 All view ops take View object as an arg
 """
-view_ops = [Ops.RESHAPE, Ops.SLICE, Ops.EXPAND] # arg=View(shape, strides, offset)
+view_ops = [Ops.RESHAPE, Ops.SLICE, Ops.EXPAND, Ops.PERMUTE] # arg=View(shape, strides, offset)
 unary_ops = [Ops.CAST]
-binary_ops = [Ops.ADD] # src=(Tensor, Tensor)
-compute_ops = unary_ops + binary_ops
+binary_ops = [Ops.ADD, Ops.MUL] # src=(Tensor, Tensor)
+commutative_ops = [Ops.ADD, Ops.MUL]
+elementwise_ops = unary_ops + binary_ops
+linalg_ops = [Ops.MATMUL]
+reduce_ops = [Ops.SUM, Ops.MAX, Ops.ARGMAX] # arg=(axes, keepdim), axes sorted and non-negative
+compute_ops = elementwise_ops + linalg_ops + reduce_ops + [Ops.PAD, Ops.CONTIGUOUS]
 input_ops = [Ops.BUFFER, Ops.CONST]
+inplace_ops = [Ops.ADD, Ops.MUL, Ops.FUSED, Ops.CAST] # their kernels can write the result into an existing buffer (out=)
+alias_ops = view_ops + [Ops.CHECKPOINT] # their result shares the storage of the first source
@@ -0,0 +1,135 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from autograd_core import View
+from autograd.ops import Ops
+from autograd.ops.uop import UOp
+from autograd.helpers import calc_strides
+if TYPE_CHECKING: from autograd.tensor import Tensor # the rules wrap UOps like the incoming gradient
+
+def _pad(t: Tensor, shape: tuple[int,...], placement: View) -> Tensor:
+  return t._wrap(UOp(Ops.PAD, t.dtype, src=(t.uop,), arg=(shape, placement)))
+
+def _unpad(g: Tensor, placement: View) -> Tensor:
+  # the gradient of PAD: the slice at `placement` of a dense copy of g, the placement is relative to the start of g
+  g = g.contiguous()
+  view = View(tuple(placement.shape), tuple(placement.strides), placement.offset + g.offset)
+  return g._wrap(UOp(Ops.SLICE, g.dtype, src=(g.uop,), arg=view))
+
+def _index(pos: int, shape: tuple[int,...], strides: tuple[int,...]) -> Optional[list[int]]:
+  # multi-index of the element at byte `pos` (relative to the first element) of a non-overlapping layout
+  index = [0] * len(shape)
+  for d in sorted((d for d in range(len(shape)) if shape[d] > 1), key=lambda d: -abs(strides[d])):
+    if strides[d] == 0: return None
+    index[d], pos = divmod(pos, strides[d])
+    if not 0 <= index[d] < shape[d]: return None
+  return index if pos == 0 else None
+
+def slice_placement(src: UOp, view: View) -> View:
+  """
+  where the elements of `view`, a slice of `src`, sit in a dense tensor of the shape of `src`. slices are absolute views into
+  the storage, the indices are recovered from the layout of `src`, which must not overlap itself (broadcast sources are rejected)
+  """
+  itemsize = src.dtype.bitsize // 8
+  dense = calc_strides(src.shape, itemsize)
+  if 0 in view.shape: return View(tuple(view.shape), (0,) * len(view.shape), 0)
+  def position(pos: int) -> int:
+    if (index := _index(pos - src.offset, src.shape, src.strides)) is None:
+      raise NotImplementedError(f"cannot differentiate a slice of a {src.shape} view with strides {src.strides}")
+    return sum(i * s for i, s in zip(index, dense))
+  offset = position(view.offset)
+  strides = tuple(position(view.offset + s) - offset if d > 1 else 0 for d, s in zip(view.shape, view.strides))
+  return View(tuple(view.shape), strides, offset)
+
+def _reduce_to(g: Tensor, shape: tuple[int,...]) -> Tensor:
+  # the gradient of a broadcast: sum over the broadcast dims
+  lead = len(g.shape) - len(shape)
+  axes = tuple(range(lead)) + tuple(lead + i for i, d in enumerate(shape) if d == 1 and g.shape[lead + i] != 1)
+  if not axes: return g.reshape(shape)
+  return g.sum(axes, keepdim=True).reshape(shape)
+
+def _sum_grad(g: Tensor, u: UOp) -> Tuple[Tensor,...]:
+  axes, keepdim = u.arg
+  src_shape = u.src[0].shape
+  kept = tuple(1 if i in axes else d for i, d in enumerate(src_shape))
+  return (g.reshape(kept).expand(src_shape),)
+
+def _mul_grad(g: Tensor, u: UOp) -> Tuple[Tensor,...]:
+  # scalar CONST operands are multiplied in as immediates
+  a, b = (s.arg[0] if s.op == Ops.CONST else g._wrap(s) for s in u.src)
+  return (g * b, g * a)
+
+def _matmul_grad(g: Tensor, u: UOp) -> Tuple[Tensor,...]:
+  a, b = (g._wrap(s) for s in u.src)
+  return (g.matmul(b.transpose()), a.transpose().matmul(g))
+
+def _inverse(u: UOp) -> list[int]:
+  # the order of a PERMUTE is recovered from the strides of its source and result
+  src, order = u.src[0], []
+  used: set[int] = set()
+  for d, s in zip(u.arg.shape, u.arg.strides):
+    o = next(i for i in range(len(src.shape)) if i not in used and (src.shape[i], src.strides[i]) == (d, s))
+    used.add(o)
+    order.append(o)
+  return [order.index(i) for i in range(len(order))]
+
+GradientRule = Callable[["Tensor", UOp], Tuple[Optional["Tensor"],...]]
+gradient_rules: Dict[Ops, GradientRule] = {
+  Ops.ADD: lambda g, u: (g, g),
+  Ops.MUL: _mul_grad,
+  Ops.CAST: lambda g, u: (g.cast(u.src[0].dtype),),
+  Ops.RESHAPE: lambda g, u: (g.reshape(u.src[0].shape),),
+  Ops.EXPAND: lambda g, u: (_reduce_to(g, u.src[0].shape),),
+  Ops.PERMUTE: lambda g, u: (g.permute(tuple(_inverse(u))),),
+  Ops.SLICE: lambda g, u: (_pad(g, u.src[0].shape, slice_placement(u.src[0], u.arg)),),
+  Ops.PAD: lambda g, u: (_unpad(g, u.arg[1]),),
+  Ops.MATMUL: _matmul_grad,
+  Ops.SUM: _sum_grad,
+  Ops.ARGMAX: lambda g, u: (None,), # indices are piecewise constant
+  Ops.CONTIGUOUS: lambda g, u: (g,),
+  Ops.CHECKPOINT: lambda g, u: (g, None),
+}
+
+Segments = Mapping[UOp, Tuple[UOp,...]] # output of a checkpointed segment -> its inputs
+
+def recompute(output: UOp, inputs: Tuple[UOp,...], after: UOp, recomputed: Dict[UOp, UOp]):
+  """
+  rebuilds the segment of the graph between `inputs` and `output` on top of CHECKPOINT nodes of the inputs and adds the copies to
+  `recomputed`. interning would merge a plain rebuild with the forward graph, the copies are distinct nodes that run after `after`,
+  the incoming gradient of the segment. nodes that do not depend on an input (weights, constants) are shared with the forward graph
+  """
+  copies = {x: UOp(Ops.CHECKPOINT, x.dtype, (recomputed.get(x, x), after)) for x in inputs} # nested segments start from recomputed inputs
+  for u in output.toposort(should_visit=lambda u: u not in copies):
+    src = tuple(copies.get(s, s) for s in u.src)
+    if src != u.src: copies[u] = recomputed[u] = UOp(u.op, u.dtype, src, u.arg)
+
+def needed_nodes(root: UOp, targets: Iterable[UOp]) -> List[UOp]:
+  # the nodes on a path from a target to the root in topological order, only they are differentiated
+  wanted, needed = set(targets), []
+  reached: set[UOp] = set()
+  for u in root.toposort():
+    if u in wanted or any(s in reached for s in u.src):
+      reached.add(u)
+      needed.append(u)
+  return needed
+
+def compute_gradient(root: UOp, root_grad: Tensor, targets: Iterable[UOp], segments: Optional[Segments]=None) -> Dict[UOp, Tensor]:
+  """
+  reverse-mode differentiation over the UOp graph: returns d(root)/d(target) for every target the root depends on. the gradients are
+  lazy tensors, they run through the scheduler like any other graph. contributions of several consumers are summed, only nodes on a
+  path from the root to a target are differentiated.
+  the rules inside the checkpointed `segments` read a recomputed copy of the forward values, see `recompute`
+  """
+  wanted = set(targets)
+  topo = needed_nodes(root, wanted)
+  needed = set(topo)
+  grads: Dict[UOp, Tensor] = {root: root_grad}
+  recomputed: Dict[UOp, UOp] = {}
+  for u in reversed(topo):
+    if (g := grads.get(u)) is None or not u.src: continue
+    if (rule := gradient_rules.get(u.op)) is None: raise NotImplementedError(f"no gradient for op {u.op.name}")
+    if segments and u in segments: recompute(u, segments[u], g.uop, recomputed)
+    for s, sg in zip(u.src, rule(g, recomputed.get(u, u))):
+      if sg is None or s not in needed: continue
+      grads[s] = sg if s not in grads else grads[s] + sg
+  return {t: grads[t] for t in wanted if t in grads}
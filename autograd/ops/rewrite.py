@@ -0,0 +1,119 @@
+from __future__ import annotations
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from autograd_core import View
+from autograd.dtypes import cast_scalar
+from autograd.ops import Ops, view_ops
+from autograd.ops.uop import UOp
+
+@dataclass(frozen=True)
+class UPat:
+  """
+  matches a UOp by op and, recursively, its sources. a named pattern binds the matched UOp under its name.
+  `commutative` also tries the two sources of a binary op in swapped order
+  """
+  op: Optional[Tuple[Ops,...]] = None
+  src: Optional[Tuple[UPat,...]] = None
+  name: Optional[str] = None
+  commutative: bool = False
+
+  def match(self, uop: UOp, bindings: Dict[str, UOp]) -> bool:
+    if self.op is not None and uop.op not in self.op: return False
+    if self.name is not None:
+      if self.name in bindings and bindings[self.name] is not uop: return False
+      bindings[self.name] = uop
+    if self.src is None: return True
+    if len(self.src) != len(uop.src): return False
+    orders = (uop.src, uop.src[::-1]) if self.commutative else (uop.src,)
+    for srcs in orders:
+      attempt = dict(bindings)
+      if all(p.match(s, attempt) for p, s in zip(self.src, srcs)):
+        bindings.update(attempt)
+        return True
+    return False
+
+Rule = Tuple[str, UPat, Callable[..., Optional[UOp]]]
+
+class PatternMatcher:
+  """
+  an ordered list of named rules. a rule returns the replacement of the matched UOp, or None when it does not apply
+  """
+  def __init__(self, rules: List[Rule]):
+    self.rules = rules
+    self.by_op: Dict[Ops, List[Rule]] = {}
+    for rule in rules:
+      for op in rule[1].op or tuple(Ops): self.by_op.setdefault(op, []).append(rule)
+
+  def rewrite(self, uop: UOp) -> Optional[Tuple[str, UOp]]:
+    for name, pat, fn in self.by_op.get(uop.op, ()):
+      bindings: Dict[str, UOp] = {}
+      if pat.match(uop, bindings) and (ret := fn(**bindings)) is not None and ret is not uop: return name, ret
+    return None
+
+def _count_removed(nodes: List[UOp], replace: Dict[UOp, UOp], fired: Dict[UOp, Tuple[str, str]], stats: Counter):
+  """
+  attributes the nodes missing from the rewritten graph to the rules, in one pass over the graph. a rewritten node counts for the last
+  rule that fired on it when that rule returned a node that is in the graph anyway (x+0 -> x), a node whose replacement is not in the
+  rewritten graph counts for the first rule that fired on one of its removed consumers
+  """
+  final = set(replace[nodes[-1]].toposort())
+  users: Dict[UOp, List[UOp]] = {}
+  existing: set[UOp] = set()
+  for u in nodes:
+    for s in u.src: users.setdefault(s, []).append(u)
+    if u in fired and replace[u] in existing and replace[u] in final: stats[fired[u][1]] += 1
+    existing.add(replace[u])
+  cause: Dict[UOp, str] = {}
+  for u in reversed(nodes):
+    if replace[u] not in final and (rule := next((cause[v] for v in users.get(u, ()) if v in cause), None)) is not None:
+      stats[rule] += 1
+      cause[u] = rule
+    if u in fired: cause[u] = fired[u][0]
+
+def graph_rewrite(root: UOp, matcher: PatternMatcher, stats: Optional[Counter]=None) -> UOp:
+  """
+  rewrites the graph bottom-up, every node is rewritten until no rule applies once its sources are final.
+  `stats` counts the nodes each rule removed from the graph
+  """
+  nodes = list(root.toposort())
+  replace: Dict[UOp, UOp] = {}
+  fired: Dict[UOp, Tuple[str, str]] = {} # the first and the last rule that rewrote a node
+  for u in nodes:
+    src = tuple(replace[s] for s in u.src)
+    new = u if src == u.src else UOp(u.op, u.dtype, src, u.arg)
+    while (rewritten := matcher.rewrite(new)) is not None:
+      name, new = rewritten
+      fired[u] = (fired[u][0] if u in fired else name, name)
+    replace[u] = new
+  if stats is not None and fired: _count_removed(nodes, replace, fired, stats)
+  return replace[root]
+
+def _identity(x: UOp, c: UOp, y: UOp, value: int) -> Optional[UOp]:
+  # x+0 and x*1 are x when the constant neither changes the dtype nor broadcasts x
+  return x if c.arg[0] == value and x.dtype == y.dtype and x.shape == y.shape else None
+
+def _fold(c: UOp, a: UOp, b: UOp) -> UOp:
+  # the operands are cast to the dtype of the op first, like the kernels do
+  x, y = cast_scalar(a.arg[0], c.dtype), cast_scalar(b.arg[0], c.dtype)
+  return UOp(Ops.CONST, c.dtype, arg=(cast_scalar(x + y if c.op == Ops.ADD else x * y, c.dtype),))
+
+_const = UPat((Ops.CONST,), name="c")
+_view = (*view_ops,)
+
+simplify = PatternMatcher([
+  # views are absolute (shape, strides and offset into the storage), the outer one alone describes the result
+  ("compose_views", UPat(_view, src=(UPat(_view, src=(UPat(name="x"),)),), name="v"),
+   lambda v, x: UOp(v.op, v.dtype, (x,), v.arg)),
+  ("noop_view", UPat(_view, src=(UPat((Ops.BUFFER, *view_ops), name="x"),), name="v"),
+   lambda v, x: x if isinstance(v.arg, View) and (tuple(v.arg.shape), tuple(v.arg.strides), v.arg.offset) == (x.shape, x.strides, x.offset)
+   else None),
+  ("noop_cast", UPat((Ops.CAST,), src=(UPat(name="x"),), name="c"), lambda c, x: x if c.dtype == x.dtype else None),
+  ("add_zero", UPat((Ops.ADD,), src=(UPat(name="x"), _const), name="y", commutative=True), lambda x, c, y: _identity(x, c, y, 0)),
+  ("mul_one", UPat((Ops.MUL,), src=(UPat(name="x"), _const), name="y", commutative=True), lambda x, c, y: _identity(x, c, y, 1)),
+  ("fold_cast", UPat((Ops.CAST,), src=(UPat((Ops.CONST,), name="x"),), name="c"),
+   lambda c, x: UOp(Ops.CONST, c.dtype, arg=(cast_scalar(x.arg[0], c.dtype),))),
+  ("fold_binary", UPat((Ops.ADD, Ops.MUL), src=(UPat((Ops.CONST,), name="a"), UPat((Ops.CONST,), name="b")), name="c"),
+   _fold),
+])
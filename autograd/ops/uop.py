@@ -1,10 +1,13 @@
 from __future__ import annotations
+import functools
+import weakref
 from collections.abc import Iterable
-from dataclasses import dataclass
 from typing import List, Tuple, Any, Callable, Dict
 
-from autograd.ops import Ops
+from autograd_core import View
+from autograd.ops import Ops, commutative_ops, elementwise_ops, reduce_ops, view_ops
 from autograd.dtypes import DType
+from autograd.helpers import calc_strides
 
 def countOf(t:Iterable, val:int):
   count=0
@@ -23,56 +26,33 @@ def pretty_print(x:UOp, indent=0, cache:dict|None=None) -> str:
   srcs = ''.join(f'\n{pretty_print(src, indent=indent+2, cache=cache)}' for src in x.src)
   return f"{' '*indent}{f'x{cache[x][0]}:=' * (cache[x][1]>1)}{type(x).__name__}({x.op}, {x.dtype}, src=({srcs}))"
 
-# recursive_property replaces functools.cached_property in recursive UOp functions to prevent RecursionError
-class recursive_property(property):
-  def __init__(self, fxn):
-    self.fxn = fxn
-    self.nm = "_RECURSIVE_PROPERTY_"+fxn.__name__
-    self.__doc__ = fxn.__doc__
-  def __get__(self, x:UOp|None, owner=None):
-    if x is None: return self
-    for node in x.toposort(should_visit=lambda node: self.nm not in node.__dict__):
-      node.__dict__[self.nm] = self.fxn(node)
-    return x.__dict__[self.nm]
-
-def _scalar_shape(_): return ()
-def _shape_from_second_arg(uop:UOp): return uop.arg[1]
-def _shape_from_first_src(uop:UOp): return uop.src[0].shape
-def _shape_from_view(uop:UOp): return tuple(uop.arg.shape)
-
-shape_rules: dict[Ops, Callable] = {
-    Ops.BUFFER:_shape_from_second_arg,
-    Ops.RESHAPE:_shape_from_view,
-    Ops.ADD:_shape_from_first_src,
-    Ops.CONST:_scalar_shape,
-    Ops.CAST:_shape_from_first_src,
-    Ops.SLICE: _shape_from_view,
-    Ops.EXPAND: _shape_from_view
-}
-def _scalar_strides(_): return ()
-def _strides_from_first_src(uop:UOp):return uop.src[0].strides
-def _strides_from_third_arg(uop:UOp):return uop.arg[2]
-def _strides_from_view(uop:UOp): return tuple(uop.arg.strides)
-stride_rules = {
-    Ops.BUFFER:_strides_from_third_arg,
-    Ops.RESHAPE:_strides_from_view,
-    Ops.ADD:_strides_from_first_src,
-    Ops.CONST:_scalar_strides,
-    Ops.CAST:_strides_from_first_src,
-    Ops.SLICE: _strides_from_view,
-    Ops.EXPAND: _strides_from_view,
-}
-def _no_offset(uop: UOp): return 0
-def _unchanged_offset(uop: UOp): return uop.src[0].offset
-def _offset_from_view(uop: UOp): return uop.arg.offset
-offset_rules = {
-    Ops.BUFFER:_no_offset,
-    Ops.RESHAPE: _offset_from_view,
-    Ops.ADD:_unchanged_offset,
-    Ops.CONST:_no_offset,
-    Ops.CAST:_unchanged_offset,
-    Ops.SLICE: _offset_from_view,
-    Ops.EXPAND: _offset_from_view,
+Metadata = Tuple[Tuple[int,...], Tuple[int,...], int] # shape, strides in bytes, offset in bytes
+_dense_strides = functools.lru_cache(maxsize=4096)(calc_strides) # graphs repeat a handful of shapes
+
+def _dense(shape: Tuple[int,...], dtype: DType) -> Metadata: return shape, _dense_strides(shape, dtype.bitsize // 8), 0
+# arg is (buffer, shape, strides, offset)
+def _buffer_meta(dtype: DType, src: Tuple[UOp,...], arg: Any) -> Metadata: return arg[1], arg[2], arg[3]
+def _const_meta(dtype: DType, src: Tuple[UOp,...], arg: Any) -> Metadata: return (), (), 0
+def _view_meta(dtype: DType, src: Tuple[UOp,...], arg: Any) -> Metadata: return tuple(arg.shape), tuple(arg.strides), arg.offset
+def _alias_meta(dtype: DType, src: Tuple[UOp,...], arg: Any) -> Metadata: return src[0].shape, src[0].strides, src[0].offset
+def _elementwise_meta(dtype: DType, src: Tuple[UOp,...], arg: Any) -> Metadata: return _dense(src[0].shape, dtype)
+def _matmul_meta(dtype: DType, src: Tuple[UOp,...], arg: Any) -> Metadata: return _dense(src[0].shape[:-1] + src[1].shape[-1:], dtype)
+def _pad_meta(dtype: DType, src: Tuple[UOp,...], arg: Any) -> Metadata: return _dense(arg[0], dtype)
+def _reduce_meta(dtype: DType, src: Tuple[UOp,...], arg: Any) -> Metadata:
+  axes, keepdim = arg
+  return _dense(tuple(1 if i in axes else s for i, s in enumerate(src[0].shape) if keepdim or i not in axes), dtype)
+
+# computes the metadata of a node from its dtype, sources and arg when it is created
+metadata_rules: Dict[Ops, Callable[[DType, Tuple[UOp,...], Any], Metadata]] = {
+  Ops.BUFFER: _buffer_meta,
+  Ops.CONST: _const_meta,
+  **{op: _view_meta for op in view_ops},
+  **{op: _elementwise_meta for op in elementwise_ops},
+  Ops.MATMUL: _matmul_meta,
+  **{op: _reduce_meta for op in reduce_ops},
+  Ops.PAD: _pad_meta,
+  Ops.CONTIGUOUS: _elementwise_meta,
+  Ops.CHECKPOINT: _alias_meta,
 }
 
 def broadcast_shape(shape1: tuple[int, ...], shape2: tuple[int,...]) -> tuple[int,...]:
@@ -90,12 +70,56 @@ def broadcast_shape(shape1: tuple[int, ...], shape2: tuple[int,...]) -> tuple[in
     raise ValueError(f"cannot broadcast shapes {shape1} and {shape2}")
   return tuple(reversed(val_to_ret))
 
-@dataclass(frozen=True) # once created is immutable, changing Tensor is possible only by executing new ops
-class UOp:
+def _arg_key(arg: Any) -> Any:
+  # data is identified by the object holding it, hashing the contents of a buffer would scale with its size
+  if isinstance(arg, tuple): return tuple(_arg_key(a) for a in arg)
+  if isinstance(arg, float): return (float, arg.hex()) # keeps 0.0 and -0.0 apart, nan equal to itself
+  if isinstance(arg, (int, str, type(None), Ops, DType)): return arg
+  if isinstance(arg, View): return ("view", tuple(arg.shape), tuple(arg.strides), arg.offset)
+  return ("id", id(arg))
+
+class UOpMetaClass(type):
+  """
+  UOps are hash-consed: constructing a UOp that already exists returns the existing object.
+  sources are interned as well, so they are compared by identity and a lookup never walks the graph.
+  the cache holds UOps weakly, the arg objects of a live UOp stay alive and their ids cannot be reused
+  """
+  ucache: weakref.WeakValueDictionary[tuple, UOp] = weakref.WeakValueDictionary()
+  def __call__(cls, op: Ops, dtype: DType, src: Tuple[UOp,...]=tuple(), arg: Any=None):
+    key = (op, dtype, src, _arg_key(arg))
+    if (ret:=UOpMetaClass.ucache.get(key)) is not None: return ret
+    UOpMetaClass.ucache[key] = ret = super().__call__(op, dtype, src, arg)
+    return ret
+
+class UOp(metaclass=UOpMetaClass):
+  """
+  a node of the computation graph. once created it is immutable, changing a Tensor is possible only by executing new ops.
+  equality and hashing are by identity, interning makes structurally equal UOps the same object.
+  shape, strides and offset are computed once when the node is created, from the metadata of its sources (see `metadata_rules`)
+  """
+  __slots__ = ("op", "dtype", "src", "arg", "shape", "strides", "offset", "__weakref__") # the interning cache holds UOps weakly
   op: Ops
   dtype: DType # target dtype after operation
-  src: Tuple['UOp',...]=tuple()
-  arg: Any = None # this depending on the operation will be different data structures
+  src: Tuple[UOp,...]
+  arg: Any # this depending on the operation will be different data structures
+  shape: Tuple[int,...]
+  strides: Tuple[int,...]
+  offset: int
+
+  def __init__(self, op: Ops, dtype: DType, src: Tuple[UOp,...]=tuple(), arg: Any=None):
+    if (rule := metadata_rules.get(op)) is None: raise NotImplementedError(f"{op} is not a graph op")
+    shape, strides, offset = rule(dtype, src, arg)
+    init = object.__setattr__
+    init(self, "op", op)
+    init(self, "dtype", dtype)
+    init(self, "src", src)
+    init(self, "arg", arg)
+    init(self, "shape", shape)
+    init(self, "strides", strides)
+    init(self, "offset", offset)
+
+  def __setattr__(self, name: str, value: Any): raise AttributeError(f"UOp is immutable, cannot set {name}")
+  def __delattr__(self, name: str): raise AttributeError(f"UOp is immutable, cannot delete {name}")
 
   def __repr__(self):
     return pretty_print(self)
@@ -104,38 +128,6 @@ class UOp:
   def new_buffer(self):
     pass
 
-  @recursive_property
-  def _shape(self):
-    """
-    for each node in the computation graph this calculates the shape of a tensor that were to be created at that point
-    """
-    return shape_rules[self.op](self)
-
-  @property
-  def shape(self):
-    if (ret:=self._shape) is None: raise RuntimeError(f"shape requested, but {self.op} doesn't have a shape")
-    return ret
-
-  @recursive_property
-  def _strides(self):
-    """
-    for each node in the computation graph this calculates the shape of a tensor that were to be created at that point
-    """
-    return stride_rules[self.op](self)
-
-  @property
-  def strides(self):
-    if (ret:=self._strides) is None: raise RuntimeError(f"strides requested, but {self.op} doesn't have strides")
-    return ret
-
-  @recursive_property
-  def _offset(self):
-    return offset_rules[self.op](self)
-
-  @property
-  def offset(self):
-    return self._offset
-
   def toposort(self,should_visit:Callable|None=None) -> dict:
     cache: Dict[UOp, None] = {}
     queue: List[Tuple[UOp, bool]]  = [(self, False)]
@@ -148,3 +140,18 @@ class UOp:
           for s in reversed(n.src): queue.append((s,False))
       else: cache[n]=None
     return cache
+
+def cse(root: UOp) -> UOp:
+  """
+  common subexpression elimination. interning already shares nodes built twice, this additionally merges commutative
+  ops whose sources are swapped (a+b and b+a) when they produce the same shape, strides and offset
+  """
+  seen: Dict[tuple, UOp] = {}
+  replace: Dict[UOp, UOp] = {}
+  for u in root.toposort():
+    src = tuple(replace[s] for s in u.src)
+    new = u if src == u.src else UOp(u.op, u.dtype, src, u.arg)
+    if new.op in commutative_ops:
+      new = seen.setdefault((new.op, new.dtype, tuple(sorted(map(id, src))), new.shape, new.strides, new.offset), new)
+    replace[u] = new
+  return replace[root]
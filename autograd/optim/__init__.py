@@ -0,0 +1 @@
+from autograd.optim.optimizer import Optimizer, SGD, Adam
@@ -0,0 +1,75 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional, Tuple
+from autograd_core import Buffer, adam_step, sgd_step
+from autograd.scheduler import overwritten
+from autograd.tensor import Tensor
+
+def _zeros_like(buffer: Buffer) -> Buffer: return Buffer.zeros(buffer.shape, buffer.format)
+
+class Optimizer(ABC):
+  """
+  updates `params` in place from their `.grad` with one fused kernel per parameter.
+  parameters are realized when the optimizer is created and keep their buffers, state such as momentum is allocated
+  here as well so that `step` allocates nothing. parameters without a gradient are skipped
+  """
+  def __init__(self, params: Iterable[Tensor], lr: float):
+    self.params: List[Tensor] = list(params)
+    if not self.params: raise ValueError("optimizer got an empty parameter list")
+    self.lr = lr
+    self.buffers = [p._bind_buffer() for p in self.params]
+    self.steps = 0
+    # updates applied to each parameter, a parameter without a gradient is skipped and its state starts with its first update
+    self.updates = [0] * len(self.params)
+
+  def zero_grad(self):
+    for p in self.params: p.grad = None
+
+  def _grads(self) -> List[Optional[Buffer]]:
+    grads: List[Optional[Buffer]] = []
+    for p in self.params:
+      if p.grad is None:
+        grads.append(None)
+        continue
+      g = p.grad if p.grad.dtype == p.dtype else p.grad.cast(p.dtype)
+      grads.append(g.realize()._buffer)
+    return grads
+
+  @abstractmethod
+  def step(self):
+    """applies one update to every parameter that has a gradient"""
+
+class SGD(Optimizer):
+  """stochastic gradient descent with optional momentum (heavy ball or nesterov) and L2 weight decay"""
+  def __init__(self, params: Iterable[Tensor], lr: float, momentum: float=0.0, dampening: float=0.0, weight_decay: float=0.0, nesterov: bool=False):
+    super().__init__(params, lr)
+    if nesterov and (momentum <= 0 or dampening != 0): raise ValueError("nesterov momentum needs a momentum and no dampening")
+    self.momentum, self.dampening, self.weight_decay, self.nesterov = momentum, dampening, weight_decay, nesterov
+    self.momentum_buffers: List[Optional[Buffer]] = [_zeros_like(b) if momentum else None for b in self.buffers]
+
+  def step(self):
+    for i, (param, grad, buf) in enumerate(zip(self.buffers, self._grads(), self.momentum_buffers)):
+      if grad is None: continue
+      # the zeroed momentum buffer makes the first update buf = grad, dampening only applies from the second update on
+      dampening = self.dampening if self.updates[i] else 0.0
+      sgd_step(param, grad, buf, self.lr, self.momentum, dampening, self.weight_decay, self.nesterov)
+      self.updates[i] += 1
+    overwritten(*self.buffers)
+    self.steps += 1
+
+class Adam(Optimizer):
+  """Adam with bias corrected moments, weight_decay adds an L2 term to the gradient"""
+  def __init__(self, params: Iterable[Tensor], lr: float=1e-3, betas: Tuple[float, float]=(0.9, 0.999), eps: float=1e-8, weight_decay: float=0.0):
+    super().__init__(params, lr)
+    self.betas, self.eps, self.weight_decay = betas, eps, weight_decay
+    self.exp_avg = [_zeros_like(b) for b in self.buffers]
+    self.exp_avg_sq = [_zeros_like(b) for b in self.buffers]
+
+  def step(self):
+    self.steps += 1
+    for i, (param, grad, m, v) in enumerate(zip(self.buffers, self._grads(), self.exp_avg, self.exp_avg_sq)):
+      if grad is None: continue
+      # the bias correction counts the updates of this parameter, its moments start at zero with its first gradient
+      self.updates[i] += 1
+      adam_step(param, grad, m, v, self.updates[i], self.lr, self.betas[0], self.betas[1], self.eps, self.weight_decay)
+    overwritten(*self.buffers)
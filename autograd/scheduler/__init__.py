@@ -1,2 +1,7 @@
 from .scheduler import Scheduler
-from .scheduler import Node
\ No newline at end of file
+from .scheduler import Node
+from .scheduler import realized
+from .scheduler import record_realized
+from .scheduler import overwritten
+from .scheduler import capturing
+from .scheduler import is_capturing
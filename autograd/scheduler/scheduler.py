@@ -1,9 +1,13 @@
-from autograd_core import View
+import weakref
+from autograd_core import Buffer, View
+from collections import Counter
+from contextlib import contextmanager
 from enum import Enum, auto
-from typing import Dict, List
-from autograd.dtypes import DType
-from autograd.ops import Ops, input_ops, view_ops
-from autograd.ops.uop import UOp
+from typing import Dict, Iterator, List
+from autograd.dtypes import DType, dtypes
+from autograd.ops import Ops, input_ops, view_ops, elementwise_ops
+from autograd.ops.uop import UOp, cse
+from autograd.ops.rewrite import graph_rewrite, simplify
 
 class NodeType(Enum):
     InputNode = auto()
@@ -17,22 +21,88 @@ def get_node_type(op: Ops) -> NodeType:
         return NodeType.ViewNode
     else: return NodeType.ComputeNode
 
+# buffers of realized nodes whose graph is still referenced, schedules read them instead of recomputing the graph (see Tensor.realize)
+realized: weakref.WeakKeyDictionary[UOp, Buffer] = weakref.WeakKeyDictionary()
+# ids of the buffers the graph of a realized node reads, nodes are interned so a graph rebuilt after one of them was written in place
+# is the same node and must not read the buffer realized before the write
+_reads: weakref.WeakKeyDictionary[UOp, frozenset[int]] = weakref.WeakKeyDictionary()
+
+def record_realized(uop: UOp, buffer: Buffer):
+    realized[uop] = buffer
+    _reads[uop] = frozenset(id(u.arg[0]) for u in uop.toposort() if u.op == Ops.BUFFER)
+
+def overwritten(*buffers: Buffer):
+    """
+    drops the realized nodes whose graph reads one of `buffers`, they were written in place (Tensor.assign, optimizers, accumulated
+    gradients) and the realized values are stale. schedules recompute those nodes from the new values
+    """
+    ids = {id(b) for b in buffers}
+    for u in [u for u, reads in list(_reads.items()) if not ids.isdisjoint(reads)]:
+        realized.pop(u, None)
+        del _reads[u]
+
+def _buffer_node(uop: UOp) -> UOp:
+    buffer = realized[uop]
+    return UOp(Ops.BUFFER, uop.dtype, src=(), arg=(buffer, uop.shape, tuple(buffer.strides), buffer.offset))
+
+_capturing = 0
+
+@contextmanager
+def capturing() -> Iterator[None]:
+    """
+    tensors realized inside the block keep their graph and are not recorded in `realized`: a captured graph (see Jit) is replayed
+    on other inputs, every node between the inputs and the outputs has to stay in it
+    """
+    global _capturing
+    _capturing += 1
+    try: yield
+    finally: _capturing -= 1
+
+def is_capturing() -> bool: return _capturing > 0
+
+def read_realized(root: UOp) -> UOp:
+    """
+    replaces the realized nodes of the graph with BUFFER nodes wrapping their buffers, the graph below them is not visited
+    """
+    if not realized: return root
+    if root in realized: return _buffer_node(root)
+    replace: Dict[UOp, UOp] = {}
+    for u in root.toposort(should_visit=lambda u: u not in realized):
+        src = tuple(replace[s] if s in replace else _buffer_node(s) for s in u.src)
+        replace[u] = u if src == u.src else UOp(u.op, u.dtype, src, u.arg)
+    return replace[root]
+
 class Scheduler:
     """
     scheduler should prepare based on ops the plan for linealizer on how to most efficiently schedule operations
+    several outputs can be scheduled together, their shared subgraph then runs once.
+    realized nodes are read from their buffers unless not `use_realized`. the graph is simplified first, `rewrites` counts the nodes
+    each rule removed
     """
-    def __init__(self,uop: UOp):
-        self.nodes = _create_nodes_from_toposort(uop.toposort())
+    def __init__(self,uop: UOp|tuple[UOp,...], fuse:bool=True, rewrite:bool=True, use_realized:bool=True):
+        self.rewrites: Counter[str] = Counter()
+        roots = uop if isinstance(uop, tuple) else (uop,)
+        if use_realized: roots = tuple(read_realized(root) for root in roots)
+        if rewrite: roots = tuple(graph_rewrite(root, simplify, self.rewrites) for root in roots)
+        roots = tuple(cse(root) for root in roots)
+        order: Dict[UOp, None] = {}
+        for root in roots: order.update(root.toposort()) # nodes already scheduled keep their position
+        ids = {k: i for i, k in enumerate(order)}
+        self.output_ids = tuple(ids[root] for root in roots)
+        self.nodes = _create_nodes_from_toposort(order)
+        if fuse: self.nodes = _fuse_elementwise(self.nodes, keep=frozenset(self.output_ids))
 
 class Node:
-    def __init__(self, id: int,op: Ops, dtype: DType, shape: tuple, strides: tuple,src_ids: tuple[int,...], args:View|tuple|None=None):
-        self.id=id
+    def __init__(self, node_id: int, op: Ops, dtype: DType, shape: tuple, strides: tuple, src_ids: tuple[int,...],
+                 args: View|tuple|None=None, fused_ids: tuple[int,...]=()):
+        self.id=node_id
         self.op=op
         self.dtype=dtype
         self.shape=shape
         self.strides=strides
         self.src_ids=src_ids
         self.args=args
+        self.fused_ids=fused_ids # ids of the nodes executed by a FUSED node
         self.node_type: NodeType = get_node_type(op)
 
     def __repr__(self):
@@ -49,4 +119,88 @@ def _create_nodes_from_toposort(d:Dict[UOp,None]) -> List[Node]:
         nodes.append(
             Node(key_index[el], el.op, el.dtype, el.shape, el.strides, src_ids=tuple([key_index[k] for k in el.src]),args=el.arg)
         )
-    return nodes
\ No newline at end of file
+    return nodes
+
+_fused_opcodes = {Ops.ADD: "add", Ops.MUL: "mul"}
+
+def _register_dtype(dtype: DType) -> DType:
+    # 16-bit floats are only a storage format, fused kernels compute on them in float32 registers
+    return dtypes.float32 if dtype in (dtypes.float16, dtypes.bfloat16) else dtype
+
+def _fuse_elementwise(nodes: List[Node], keep: frozenset[int]=frozenset()) -> List[Node]:
+    """
+    groups chains of elementwise compute ops into FUSED nodes executed in one pass over memory.
+    an op is folded into its consumer when the consumer is elementwise with the same shape and is the only user of the result,
+    scalar CONST operands become immediates and everything else is loaded as a kernel input (stride 0 expands included).
+    nodes in `keep` are outputs and are never folded away.
+    float16/bfloat16 arithmetic runs in float32 registers: a group rounds to 16 bits only at explicit CASTs and at its result
+    """
+    by_id = {n.id: n for n in nodes}
+    users: Dict[int, List[int]] = {n.id: [] for n in nodes}
+    for n in nodes:
+        for s in n.src_ids: users[s].append(n.id)
+
+    def absorbed(n: Node) -> bool:
+        if n.op not in elementwise_ops or len(users[n.id]) != 1 or n.id in keep: return False
+        consumer = by_id[users[n.id][0]]
+        return consumer.op in elementwise_ops and consumer.shape == n.shape
+
+    def scalar_const(n: Node) -> Node|None:
+        # a scalar CONST, possibly broadcast by views, is passed to the kernel as an immediate
+        while n.op in view_ops: n = by_id[n.src_ids[0]]
+        return n if n.op == Ops.CONST and n.shape == () else None
+
+    replaced: Dict[int, Node] = {}
+    dropped: set[int] = set()
+    for root in nodes:
+        if root.op not in elementwise_ops or absorbed(root): continue
+        members = set()
+        stack = [root.id]
+        while stack:
+            members.add(nid := stack.pop())
+            stack.extend(s for s in by_id[nid].src_ids if s not in members and absorbed(by_id[s]))
+        has_const = any(scalar_const(by_id[s]) is not None for m in members for s in by_id[m].src_ids)
+        if len(members) == 1 and not has_const: continue # single op, runs on its dedicated kernel
+
+        program: List[tuple] = []
+        reg_dtype: List[DType] = []
+        reg_of: Dict[int, int] = {}
+        inputs: List[int] = []
+        def emit(instr: tuple, dtype: DType) -> int:
+            program.append(instr)
+            reg_dtype.append(dtype)
+            return len(program) - 1
+        def operand(nid: int, dtype: DType|None) -> int:
+            if nid not in reg_of:
+                src = by_id[nid]
+                if (const := scalar_const(src)) is not None: reg_of[nid] = emit(("const", const.args[0], const.dtype.fmt), const.dtype) # type: ignore
+                else:
+                    inputs.append(nid)
+                    reg_of[nid] = emit(("load", len(inputs) - 1, src.dtype.fmt), src.dtype)
+            reg = reg_of[nid]
+            return reg if dtype is None or reg_dtype[reg] == dtype else emit(("cast", reg, dtype.fmt), dtype)
+        fused_ids = tuple(n.id for n in nodes if n.id in members) # topological order
+        for nid in fused_ids:
+            n = by_id[nid]
+            if n.op == Ops.CAST: reg_of[nid] = emit(("cast", operand(n.src_ids[0], None), n.dtype.fmt), n.dtype)
+            else:
+                dtype = _register_dtype(n.dtype)
+                reg_of[nid] = emit((_fused_opcodes[n.op], *(operand(s, dtype) for s in n.src_ids), dtype.fmt), dtype)
+        if reg_dtype[reg_of[root.id]] != root.dtype: emit(("cast", reg_of[root.id], root.dtype.fmt), root.dtype)
+        replaced[root.id] = Node(root.id, Ops.FUSED, root.dtype, root.shape, root.strides, src_ids=tuple(inputs), args=tuple(program),
+                                 fused_ids=fused_ids)
+        dropped.update(nid for nid in fused_ids if nid != root.id)
+
+    fused = [replaced.get(n.id, n) for n in nodes if n.id not in dropped]
+    # CONST nodes (and their broadcasts) that were turned into immediates everywhere are dropped as well,
+    # consumers are visited first so that a view becoming unused frees its source
+    used: Dict[int, int] = {}
+    for n in fused:
+        for s in n.src_ids: used[s] = used.get(s, 0) + 1
+    kept = []
+    for n in reversed(fused):
+        if scalar_const(n) is not None and not used.get(n.id) and n.id not in keep and n is not fused[-1]:
+            for s in n.src_ids: used[s] -= 1
+            continue
+        kept.append(n)
+    return kept[::-1]
@@ -1,42 +1,38 @@
 from __future__ import annotations
 import pathlib
-import struct
+import weakref
+from contextlib import nullcontext
 import numpy as npy
 from math import prod
-from typing import Iterable, List, Optional, Union
+from typing import Iterable, List, Optional, Tuple, Union
 from autograd_core import numpy as np
+from autograd_core import Buffer, View, buffer_from_list
 
-from autograd.helpers import all_values_same, check_shape_compatibility, fetch, fully_flatten, calc_strides, all_int, argfix
-from autograd.dtypes import DType, dtypes, to_dtype, dtype_default_float, dtype_default_int
-from autograd.dtypes import _from_np_dtypes
+from autograd.helpers import check_shape_compatibility, fetch, calc_strides, all_int, argfix
+from autograd.dtypes import DType, float_dtypes, to_dtype
+from autograd.dtypes import _from_np_dtypes, FMT_TO_DTYPE
 from autograd.ops.uop import UOp
-from autograd.ops import Ops
+from autograd.ops import Ops, input_ops
 from autograd.device import Device
-from autograd.scheduler import Scheduler
-from autograd.engine.realize import run_schedule
+from autograd.scheduler import Scheduler, is_capturing, record_realized
+from autograd.engine import checkpoint
+from autograd.engine.realize import execute_schedule, run_schedule
+from autograd.ops.gradient import Segments, compute_gradient
 from autograd.mixin.movement import MovementMixin
-from autograd.mixin.elementwise import ElementwiseMixin
-
-def get_shape(x) -> tuple[int, ...]:
-  # NOTE: str is special because __getitem__ on a str is still a str, therefore we need to check both getitem and str
-  if not hasattr(x, "__len__") or not hasattr(x, "__getitem__") or isinstance(x, str) or (hasattr(x, "shape") and x.shape == ()): return () # x is a scalar value so its a 0D tensor -> shape(0,)
-  """
-  NOTE: at this point we know that x is an any dimensional iterable, we need to check if all sub-elements have the same shape
-  allowed: [[1,2], [3,4], [4,5]]
-  not allowed: [1, [1,2], [1,2,3]]
-  """
-  if not all_values_same(element_shape:=[get_shape(element) for element in x]): raise ValueError(f"inhomogeneous shape from {x}")
-  return (len(element_shape),) + (element_shape[0] if element_shape else ())
-
-def _uop_from_data(data: list|tuple|bytes, dtype: DType, shape, strides) -> UOp:
-  # get type and flatten data
-  fmt = f"{len(data)}{dtype.fmt}"
-  if isinstance(data, bytes):
-    buf_uop = UOp(Ops.BUFFER,dtype,src=(),arg=(data,shape,strides)) # src is empty we pass everything as args
-    return buf_uop
-  raw_bytes = struct.pack(fmt, *data if hasattr(data,'__len__') else data)
-  buf_uop = UOp(Ops.BUFFER,dtype,src=(),arg=(raw_bytes,shape,strides)) # src is empty we pass everything as args
-  return buf_uop
+from autograd.mixin.elementwise import ElementwiseMixin, ConstType
+from autograd.mixin.linalg import LinalgMixin
+from autograd.mixin.reduce import ReduceMixin
+
+def _uop_from_file(path: pathlib.Path, dtype: DType, shape: tuple[int,...], strides: tuple[int,...], offset: int, copy_on_write: bool=False) -> UOp:
+  # the file is mapped, pages are read when a kernel touches them
+  buffer = Buffer.from_file(path, dtype.fmt, shape, strides, offset, copy_on_write)
+  return UOp(Ops.BUFFER, dtype, src=(), arg=(buffer, shape, strides, 0))
+
+def _execute_roots(roots: List[Tuple[UOp, Optional[Buffer]]], device: str) -> List[Buffer]:
+  # several roots are scheduled together and compute the subgraph they share once, a root paired with a buffer is written into it
+  scheduler = Scheduler(tuple(uop for uop, _ in roots))
+  buffers = execute_schedule(scheduler.nodes, {i: out for i, (_, out) in zip(scheduler.output_ids, roots)}, num_threads=Device.num_threads(device))
+  return [buffers[i] for i in scheduler.output_ids]
 
 def _normalize_shape(s: Optional[Iterable]) -> Optional[tuple[int, ...]]:
   # since shape can be either of list|tuple we need to normalize it
@@ -46,7 +42,7 @@ def _normalize_shape(s: Optional[Iterable]) -> Optional[tuple[int, ...]]:
   assert all_int(ret), "shape should contain ints only"
   return ret
 
-class Tensor(MovementMixin, ElementwiseMixin):
+class Tensor(MovementMixin, ElementwiseMixin, LinalgMixin, ReduceMixin):
   def __init__(
       self,
       data: Union[UOp, pathlib.Path, List, bytes, memoryview, npy.ndarray, None],
@@ -55,13 +51,15 @@ class Tensor(MovementMixin, ElementwiseMixin):
       offset: int = 0,
       device:str|None=None,
       realized:bool|None=None,
+      requires_grad:bool=False,
     ):
     _dtype: DType|None = to_dtype(dtype) if dtype and isinstance(dtype, str) else dtype
     _shape = _normalize_shape(shape)
     self._offset = offset
     self._buffer = None
+    self.grad: Optional[Tensor] = None
     # offset is required to implement __getitem__
-    self._device = Device
+    self._device = Device.canonicalize(device)
 
     if isinstance(data, UOp):
       assert _dtype is None or _dtype == data.dtype, "datatype mismatch"
@@ -72,19 +70,16 @@ class Tensor(MovementMixin, ElementwiseMixin):
       self._strides = data.strides
       self._offset = data.offset
     elif isinstance(data, (list, tuple)):
-      flat = fully_flatten(data)
-      if _dtype is None:
-        if flat and all(isinstance(el, bool) for el in flat):
-          _dtype = dtypes.boolean
-        else:
-          _dtype = dtype_default_int if all_int(flat) else dtype_default_float
-      inferred_shape = get_shape(data)
+      # one native pass infers shape and dtype and writes the values into the buffer
+      buffer = buffer_from_list(data, _dtype.fmt if _dtype else None)
+      inferred_shape = tuple(buffer.shape)
       self._shape = _shape if _shape is not None else inferred_shape
       if not check_shape_compatibility(inferred_shape, self._shape):
         raise ValueError(f"shape {self._shape} is incompatible with data shape {inferred_shape}")
-      self._dtype = _dtype
+      self._dtype = _dtype or FMT_TO_DTYPE[buffer.format]
       self._strides = calc_strides(self._shape, self.dtype.bitsize // 8)
-      self.uop = _uop_from_data(flat, self._dtype, self._shape, self._strides)
+      if self._shape != inferred_shape: buffer = buffer.view(View(self._shape, self._strides, 0))
+      self.uop = UOp(Ops.BUFFER, self.dtype, src=(), arg=(buffer, self._shape, self._strides, 0))
     elif isinstance(data, bytes):
       if _dtype is None:
         raise ValueError("cannot guess datatype from bytes")
@@ -96,7 +91,9 @@ class Tensor(MovementMixin, ElementwiseMixin):
       if prod(self._shape) * itemsize != len(data):
         raise ValueError(f"shape {self._shape} is incompatible with buffer length {len(data)} and dtype {self.dtype.name}")
       self._strides = calc_strides(self._shape, self.dtype.bitsize // 8)
-      self.uop = _uop_from_data(data, self.dtype, self._shape, self._strides)
+      # the bytes are copied into a buffer once, schedules then use it like any other input
+      buffer = Buffer(data, list(self._shape), list(self._strides), self.dtype.fmt, 0)
+      self.uop = UOp(Ops.BUFFER, self.dtype, src=(), arg=(buffer, self._shape, self._strides, 0))
     elif isinstance(data, npy.ndarray):
       self._dtype = _dtype or _from_np_dtypes(data.dtype)
       if data.shape == ():
@@ -104,16 +101,31 @@ class Tensor(MovementMixin, ElementwiseMixin):
         self._strides = ()
         self.uop = UOp(op=Ops.CONST, dtype=self.dtype, arg=(data.item(),))
       else:
-        if not data.flags.c_contiguous:
-          data = npy.ascontiguousarray(data)
-        inferred_shape = tuple(data.shape)
-        self._shape = _shape if _shape is not None else inferred_shape
-        if prod(self._shape) != prod(inferred_shape):
-          raise ValueError(f"shape {self._shape} is incompatible with ndarray shape {inferred_shape}")
-        self._strides = calc_strides(self._shape, self.dtype.bitsize // 8)
-        self.uop = _uop_from_data(data.tobytes(), dtype=self.dtype, shape=self._shape, strides=self._strides)
+        # the array memory is wrapped in place, a copy is only made for a dtype/byte order conversion
+        # or a reshape numpy cannot express as a view
+        if npy.dtype(self.dtype.fmt) != data.dtype: data = data.astype(npy.dtype(self.dtype.fmt))
+        if _shape is not None:
+          if not check_shape_compatibility(data.shape, _shape):
+            raise ValueError(f"shape {_shape} is incompatible with ndarray shape {data.shape}")
+          data = data.reshape(_shape)
+        buffer = Buffer.from_buffer(data)
+        self._shape = tuple(data.shape)
+        self._strides = tuple(buffer.strides)
+        self.uop = UOp(Ops.BUFFER, dtype=self.dtype, src=(), arg=(buffer, self._shape, self._strides, buffer.offset))
+    elif isinstance(data, pathlib.Path):
+      if _dtype is None:
+        raise ValueError("cannot guess datatype from a file")
+      self._dtype = _dtype
+      itemsize = self.dtype.bitsize // 8
+      nbytes = data.stat().st_size - offset
+      self._shape = _shape if _shape is not None else (nbytes // itemsize,)
+      if nbytes < 0 or prod(self._shape) * itemsize > nbytes:
+        raise ValueError(f"shape {self._shape} does not fit into {data} after offset {offset} with dtype {self.dtype.name}")
+      self._strides = calc_strides(self._shape, itemsize)
+      self.uop = _uop_from_file(data, self.dtype, self._shape, self._strides, offset)
     else:
       raise TypeError(f"unsupported data type: {type(data)!r}")
+    if requires_grad: self.requires_grad = True
 
   @staticmethod
   def from_url(url: str, **kwargs) -> Tensor:
@@ -137,23 +149,125 @@ class Tensor(MovementMixin, ElementwiseMixin):
   def dtype(self) -> DType:
     return self._dtype
 
+  @property
+  def device(self) -> str:
+    return self._device
+
+  def _wrap(self, uop: UOp) -> Tensor:
+    # results of ops stay on the device of the tensor they are computed from, a "CPU:n" thread count included
+    return Tensor(uop, device=self.device)
+
   @property
   def offset(self) -> int:
     return self.uop.offset
 
+  @property
+  def requires_grad(self) -> bool:
+    return self in _requires_grad
+
+  @requires_grad.setter
+  def requires_grad(self, value: bool):
+    if not value: _requires_grad.discard(self)
+    elif self.dtype not in float_dtypes: raise TypeError(f"only float tensors can require gradients, got {self.dtype.name}")
+    else: _requires_grad.add(self)
+
   def _make_schedule(self):
     return Scheduler(self.uop).nodes
 
-  def realize(self) -> Tensor:
-    # actually compute the graph
-    if not self._buffer:
-      self._buffer = run_schedule(self._make_schedule())
+  def realize(self, *others: Tensor) -> Tensor:
+    # actually compute the graph, tensors passed along are scheduled together and compute the subgraph they share once
+    if not others:
+      if not self._buffer: self._set_buffer(run_schedule(self._make_schedule(), num_threads=Device.num_threads(self.device)))
+      return self
+    pending = list({id(t): t for t in (self, *others) if not t._buffer}.values())
+    if pending:
+      for t, buffer in zip(pending, _execute_roots([(t.uop, None) for t in pending], self.device)): t._set_buffer(buffer)
+    return self
+
+  def _set_buffer(self, buffer: Buffer):
+    """
+    the realized graph is replaced by a reference to `buffer`, graphs built from this tensor start from it and the inputs of the graph can
+    be freed. a graph backward can still differentiate through is kept, schedules read the buffer instead of recomputing it (see `realized`)
+    """
+    self._buffer = buffer
+    if self.uop.op in input_ops or is_capturing(): return
+    record_realized(self.uop, buffer) # graphs built before the realization read it as well
+    if not _reaches_grad(self.uop): self._rebind(buffer)
+
+  def _rebind(self, buffer: Buffer):
+    self.uop = UOp(Ops.BUFFER, self.dtype, src=(), arg=(buffer, self.shape, tuple(buffer.strides), buffer.offset))
+    self._strides = tuple(buffer.strides)
+
+  def backward(self, gradient: Optional[Tensor]=None) -> Tensor:
+    """
+    adds the gradient of this tensor to `.grad` of every tensor with `requires_grad` it depends on, a scalar needs no `gradient`.
+    the backward graph is built lazily over the forward graph and realized in one schedule together with this tensor: the forward
+    pass runs once, activations the backward graph does not read are freed after their last forward use and existing gradients
+    are accumulated in place. segments marked with `checkpoint` are recomputed, inside `memory_budget` more are picked to fit it
+    """
+    if gradient is None:
+      if self.shape != (): raise RuntimeError(f"backward of a tensor of shape {self.shape} needs a gradient")
+      gradient = self._wrap(UOp(Ops.CONST, self.dtype, arg=(1.0,)))
+    elif gradient.shape != self.shape: raise ValueError(f"gradient of shape {gradient.shape} does not match tensor of shape {self.shape}")
+    # the gradients of tensors used last in the forward pass come first in the schedule, the backward pass then releases
+    # activations and gradients layer by layer instead of holding them until the last gradient is computed
+    position = {u: i for i, u in enumerate(self.uop.toposort())}
+    params = sorted((t for t in _requires_grad if t.uop in position), key=lambda t: -position[t.uop])
+    targets = [t.uop for t in params]
+    def build(segments: Segments) -> Tuple[List[Tuple[UOp, Optional[Buffer]]], List[Tuple[Tensor, Optional[Tensor]]]]:
+      grads = compute_gradient(self.uop, gradient, targets, segments)
+      roots: List[Tuple[UOp, Optional[Buffer]]] = []
+      fresh: List[Tuple[Tensor, Optional[Tensor]]] = []
+      for t in params:
+        if (g := grads.get(t.uop)) is None: continue
+        if t.grad is None: roots.append((g.uop, None))
+        else: roots.append(((t.grad + g).uop, t.grad._bind_buffer()))
+        fresh.append((t, g if t.grad is None else None))
+      if not self._buffer: roots.append((self.uop, None))
+      return roots, fresh
+    segments = checkpoint.segments(self.uop)
+    if (budget := checkpoint.current()) is not None: segments = budget.plan(self.uop, targets, segments, lambda s: build(s)[0])
+    roots, fresh = build(segments)
+    if not roots: return self
+    with budget.measure() if budget is not None else nullcontext(): buffers = _execute_roots(roots, self.device)
+    for (t, g), buffer in zip(fresh, buffers):
+      if g is None: continue
+      # the gradient is rebound to its buffer, it does not keep the forward graph and its inputs alive
+      g._buffer = buffer
+      g._bind_buffer()
+      t.grad = g
+    if not self._buffer: self._set_buffer(buffers[-1])
     return self
 
-  def numpy(self):
+  def _bind_buffer(self) -> Buffer:
+    # realizes the tensor and rebinds its uop to the resulting buffer, so that writes into it reach every later use of the tensor
+    self.realize()
+    buffer: Buffer = self._buffer # type: ignore
+    if self.uop.op != Ops.BUFFER or self.uop.arg[0] is not buffer: self._rebind(buffer)
+    return buffer
+
+  def assign(self, other: Tensor|ConstType) -> Tensor:
+    """
+    writes `other` into the memory of this tensor and returns it, `other` is broadcast to the shape and cast to the dtype of this tensor.
+    the last kernel of its graph writes straight into the existing storage. a lazy tensor is realized first and keeps the resulting buffer,
+    lazy tensors built from this one read the new values when they are realized
+    """
+    buffer = self._bind_buffer()
+    src = other if isinstance(other, Tensor) else self._wrap(UOp(Ops.CONST, self.dtype, arg=(other,)))
+    if src.shape != self.shape: src = src.expand(self.shape)
+    run_schedule(Scheduler(src.cast(self.dtype).uop).nodes, num_threads=Device.num_threads(self.device), out=buffer)
+    return self
+
+  def __iadd__(self, other: Tensor|ConstType) -> Tensor: return self.assign(self + other)
+  def __imul__(self, other: Tensor|ConstType) -> Tensor: return self.assign(self * other)
+
+  def numpy(self) -> npy.ndarray:
+    """
+    ndarray view of the realized buffer, no copy is made and writes go through to the tensor's memory
+    """
     if not self._buffer:
       self.realize()
-    print(np(self._buffer))
+    return npy.asarray(self._buffer)
 
   @staticmethod
   def frombuffer(data: bytes, **kwargs):
@@ -163,6 +277,14 @@ class Tensor(MovementMixin, ElementwiseMixin):
   def from_np(cls,arr: npy.ndarray) -> Tensor:
     return Tensor(arr)
 
+_requires_grad: weakref.WeakSet[Tensor] = weakref.WeakSet()
+
+def _reaches_grad(uop: UOp) -> bool:
+  # whether backward can differentiate through the graph of `uop`, that is it depends on a tensor that requires gradients
+  if not _requires_grad: return False
+  leaves = {t.uop for t in _requires_grad}
+  return any(u in leaves for u in uop.toposort())
+
 def expand(a: Tensor, b: Tensor, target_shape: tuple[int,...]) -> tuple[Tensor, Tensor]:
   a = a.expand(target_shape)
   b = b.expand(target_shape)
@@ -1,3 +1,17 @@
-from .tensor import TestTensor
-from .ops.broadcast import TestBroadcast
-from .ops.expand import TestExpand
\ No newline at end of file
+from .test_tensor import TestTensor
+from .test_scheduler import TestFusion, TestConstOperands, TestHalfPrecision, TestLiveness, TestRealized
+from .test_loaders import TestLoaders, TestDataLoader
+from .test_fetch import TestFetch
+from .test_jit import TestJit
+from .test_trace import TestTrace
+from .test_optim import TestOptim
+from .test_assign import TestAssign
+from .test_backward import TestBackward
+from .test_checkpoint import TestCheckpoint
+from .test_uop import TestInterning, TestMetadata
+from .test_rewrite import TestRewrite
+from .ops.test_broadcast import TestBroadcast
+from .ops.test_expand import TestExpand
+from .ops.test_matmul import TestMatmul
+from .ops.test_reduce import TestReduce
+from .ops.test_reshape import TestReshape
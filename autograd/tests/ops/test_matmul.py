@@ -0,0 +1,40 @@
+from autograd import Tensor
+from autograd.dtypes import dtypes
+import numpy as np
+import unittest
+
+"""
+(2,3) @ (3,4) -> (2,4)
+(3,) @ (3,4) -> (4,)
+(2,3) @ (3,) -> (2,)
+(5,2,3) @ (3,4) -> (5,2,4)
+(5,1,2,3) @ (4,3,2) -> (5,4,2,2)
+should raise:
+(2,3) @ (2,3)
+"""
+
+def arange(*shape, dtype='float32'): return Tensor(np.arange(np.prod(shape), dtype=dtype).reshape(shape))
+
+class TestMatmul(unittest.TestCase):
+  def test_shapes(self):
+    self.assertEqual((arange(2,3) @ arange(3,4)).shape, (2,4))
+    self.assertEqual((arange(3) @ arange(3,4)).shape, (4,))
+    self.assertEqual((arange(2,3) @ arange(3)).shape, (2,))
+    self.assertEqual((arange(3) @ arange(3)).shape, ())
+    self.assertEqual((arange(5,2,3) @ arange(3,4)).shape, (5,2,4))
+    self.assertEqual((arange(5,1,2,3) @ arange(4,3,2)).shape, (5,4,2,2))
+
+  def test_cannot_matmul(self):
+    with self.assertRaises(ValueError):
+      arange(2,3) @ arange(2,3)
+    with self.assertRaises(ValueError):
+      arange(2,2,3) @ arange(3,3,4)
+
+  def test_dtype_promotion(self):
+    self.assertEqual((arange(2,3, dtype='int32') @ arange(3,4, dtype='float64')).dtype, dtypes.float64)
+
+  def test_values(self):
+    a, b = np.arange(6, dtype=np.float64).reshape(2,3), np.arange(12, dtype=np.float64).reshape(3,4)
+    self.assertEqual(str((Tensor(a) @ Tensor(b)).realize()), str(Tensor(a @ b).realize()))
+    # a row of a 2-D tensor is a view with an offset, the kernel reads it in place
+    self.assertEqual(str((Tensor(a)[1] @ Tensor(b)).realize()), str(Tensor(a[1] @ b).realize()))
@@ -0,0 +1,52 @@
+from autograd import Tensor
+from autograd.dtypes import dtypes
+from autograd.ops import Ops
+from autograd.scheduler import Scheduler
+import numpy as np
+import unittest
+
+"""
+(2,3,4).sum(1) -> (2,4)
+(2,3,4).sum((0,2), keepdim=True) -> (1,3,1)
+(2,3,4).max() -> ()
+(2,3,4).argmax(-1) -> (2,3) int64
+should raise:
+(2,3).sum(2)
+(2,3).sum((0,0))
+"""
+
+def arange(*shape, dtype='float32'): return Tensor(np.arange(np.prod(shape), dtype=dtype).reshape(shape))
+
+class TestReduce(unittest.TestCase):
+  def test_shapes(self):
+    self.assertEqual(arange(2,3,4).sum(1).shape, (2,4))
+    self.assertEqual(arange(2,3,4).sum((0,2), keepdim=True).shape, (1,3,1))
+    self.assertEqual(arange(2,3,4).max().shape, ())
+    self.assertEqual(arange(2,3,4).mean(-1, keepdim=True).shape, (2,3,1))
+    self.assertEqual(arange(2,3,4).argmax(-1).shape, (2,3))
+
+  def test_dtypes(self):
+    self.assertEqual(arange(2,3).sum(0).dtype, dtypes.float32)
+    self.assertEqual(arange(2,3).mean(0).dtype, dtypes.float32)
+    self.assertEqual(arange(2,3, dtype='int32').mean(0).dtype, dtypes.float64)
+    self.assertEqual(arange(2,3).argmax(1).dtype, dtypes.int64)
+
+  def test_cannot_reduce(self):
+    with self.assertRaises(IndexError):
+      arange(2,3).sum(2)
+    with self.assertRaises(ValueError):
+      arange(2,3).sum((0,-2))
+    with self.assertRaises(ValueError):
+      arange(0,3).max(0)
+
+  def test_reduce_is_not_fused(self):
+    a = arange(2,3)
+    nodes = Scheduler((a+a).sum(1).uop).nodes
+    self.assertEqual([n.op for n in nodes][-2:], [Ops.ADD, Ops.SUM])
+
+  def test_values(self):
+    x = np.random.default_rng(0).standard_normal((4,5,6))
+    for axis in (0, 1, 2, (0,2), None):
+      self.assertEqual(str(Tensor(x).sum(axis).realize()), str(Tensor(np.sum(x, axis=axis)).realize()))
+      self.assertEqual(str(Tensor(x).max(axis).realize()), str(Tensor(np.max(x, axis=axis)).realize()))
+    self.assertEqual(str(Tensor(x).argmax(1).realize()), str(Tensor(np.argmax(x, axis=1)).realize()))
@@ -0,0 +1,45 @@
+from autograd import Tensor
+from autograd.ops import Ops
+import numpy as np
+import unittest
+
+def copies(t: Tensor) -> int: return sum(u.op == Ops.CONTIGUOUS for u in t.uop.toposort())
+
+class TestReshape(unittest.TestCase):
+  def setUp(self):
+    self.a = np.arange(24, dtype=np.float32).reshape(4, 6)
+    self.t = Tensor(self.a)
+
+  def test_views_are_not_copied(self):
+    # rows of a slice, every other column and a split of a sliced dim keep their strides
+    for t, expected in [(self.t[1:3].reshape(12), self.a[1:3].reshape(12)),
+                        (self.t[:, ::2].reshape(12), self.a[:, ::2].reshape(12)),
+                        (self.t[:, 1:4].reshape(2, 2, 3), self.a[:, 1:4].reshape(2, 2, 3)),
+                        (self.t[:, :2].expand(3, 4, 2).reshape(3, 2, 2, 2), np.broadcast_to(self.a[:, :2], (3, 4, 2)).reshape(3, 2, 2, 2))]:
+      self.assertEqual(copies(t), 0)
+      np.testing.assert_array_equal(t.numpy(), expected)
+    self.assertEqual(self.t[:, 1:4].reshape(2, 2, 3).strides, (48, 24, 4))
+
+  def test_copies_when_strides_cannot_merge(self):
+    for t, expected in [(self.t.transpose().reshape(24), self.a.T.reshape(24)),
+                        (self.t[:, 1:4].reshape(12), self.a[:, 1:4].reshape(12)),
+                        (Tensor(self.a[0]).reshape(6, 1).expand(6, 3).reshape(18), np.repeat(self.a[0], 3))]:
+      self.assertEqual(copies(t), 1)
+      np.testing.assert_array_equal(t.numpy(), expected)
+
+  def test_contiguous(self):
+    self.assertIs(self.t.contiguous(), self.t)
+    rows = self.t[1:3]
+    self.assertIs(rows.contiguous(), rows) # dense from its offset on
+    t = self.t.transpose().contiguous()
+    self.assertTrue(t.is_contiguous())
+    self.assertEqual(t.strides, (16, 4))
+    np.testing.assert_array_equal(t.numpy(), self.a.T)
+
+  def test_gradient(self):
+    x = Tensor(self.a.astype(np.float64), requires_grad=True)
+    w = np.arange(12.0)
+    (x[:, 1:4].reshape(12) * Tensor(w)).sum().backward()
+    expected = np.zeros((4, 6))
+    expected[:, 1:4] = w.reshape(4, 3)
+    np.testing.assert_array_equal(x.grad.numpy(), expected)
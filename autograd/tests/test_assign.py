@@ -0,0 +1,56 @@
+import unittest
+import numpy as npy
+from autograd import Tensor
+from autograd.dtypes import dtypes
+from autograd.engine.trace import trace
+
+def address(t: Tensor) -> int: return t.numpy().__array_interface__["data"][0]
+
+class TestAssign(unittest.TestCase):
+  def test_assign_writes_in_place(self):
+    x = npy.arange(6, dtype=npy.float32).reshape(2, 3)
+    a = Tensor(x)
+    memory = address(a)
+    self.assertIs(a.assign(a * 2 + 1), a)
+    self.assertEqual(address(a), memory)
+    npy.testing.assert_equal(x, npy.arange(6).reshape(2, 3) * 2 + 1)
+
+  def test_inplace_operators(self):
+    a = Tensor(npy.ones((2, 3), npy.float32))
+    memory = address(a)
+    a += Tensor(npy.arange(3, dtype=npy.float32))
+    a *= 0.5
+    self.assertEqual(address(a), memory)
+    npy.testing.assert_equal(a.numpy(), npy.tile([0.5, 1, 1.5], (2, 1)))
+    i = Tensor(npy.arange(3))
+    i += 1.5 # the result is cast back to the dtype of the tensor
+    self.assertEqual(i.dtype, dtypes.int64)
+    npy.testing.assert_equal(i.numpy(), [1, 2, 3])
+
+  def test_assign_to_lazy_tensor(self):
+    t = Tensor(npy.ones(3, npy.float32)) + 1
+    t.assign(3.0)
+    u = t + 1
+    t.assign(t * 2)
+    npy.testing.assert_equal(t.numpy(), [6, 6, 6])
+    npy.testing.assert_equal(u.numpy(), [7, 7, 7])
+
+  def test_assign_overlapping_view(self):
+    x = npy.arange(6, dtype=npy.float32)
+    a = Tensor(x)
+    a[1:].assign(a[:-1])
+    npy.testing.assert_equal(x, [0, 0, 1, 2, 3, 4])
+
+  def test_dead_intermediate_is_donated(self):
+    x, w, b = npy.ones((4, 3), npy.float32), npy.ones((3, 2), npy.float32), npy.arange(2, dtype=npy.float32)
+    with trace() as t: y = ((Tensor(x) @ Tensor(w) + Tensor(b)) * 2).realize()
+    allocated = {e.kernel: e.bytes_allocated for e in t.events}
+    self.assertEqual(allocated["matmul"], 32)
+    self.assertEqual(allocated["fused[add,mul]"], 0)
+    npy.testing.assert_equal(y.numpy(), (x @ w + b) * 2)
+
+  def test_viewed_intermediate_is_not_donated(self):
+    # the matmul result dies with the multiplication, a reshape of it is still read afterwards
+    m = Tensor(npy.ones((2, 2), npy.float32)) @ Tensor(npy.ones((2, 2), npy.float32))
+    out = m.reshape(4) + (m * 2).reshape(4)
+    npy.testing.assert_equal(out.numpy(), [6, 6, 6, 6])
@@ -0,0 +1,69 @@
+import unittest
+import numpy as npy
+from autograd import Tensor
+from autograd.dtypes import dtypes
+
+def address(t: Tensor) -> int: return t.numpy().__array_interface__["data"][0]
+
+class TestBackward(unittest.TestCase):
+  def setUp(self):
+    rng = npy.random.default_rng(0)
+    self.x, self.w, self.b = rng.standard_normal((3, 4)), rng.standard_normal((4, 2)), rng.standard_normal(2)
+
+  def test_dense_layer(self):
+    x, w, b = (Tensor(a, requires_grad=True) for a in (self.x, self.w, self.b))
+    h = x @ w + b
+    loss = (h * h).sum()
+    loss.backward()
+    g = 2 * (self.x @ self.w + self.b)
+    npy.testing.assert_allclose(loss.numpy(), (g * g / 4).sum())
+    npy.testing.assert_allclose(w.grad.numpy(), self.x.T @ g)
+    npy.testing.assert_allclose(x.grad.numpy(), g @ self.w.T)
+    npy.testing.assert_allclose(b.grad.numpy(), g.sum(0)) # the gradient of the broadcast is summed over the batch
+
+  def test_views(self):
+    x = Tensor(self.x, requires_grad=True)
+    (x[1:, ::2] * 3.0).sum().backward()
+    expected = npy.zeros_like(self.x)
+    expected[1:, ::2] = 3
+    npy.testing.assert_equal(x.grad.numpy(), expected)
+    x.grad = None
+    (x.reshape(12)[3:9].sum() + (x.transpose()[1:3] * 2.0).sum(0).sum()).backward()
+    expected = npy.zeros(12)
+    expected[3:9] = 1
+    expected = expected.reshape(3, 4) + npy.array([0, 2, 2, 0])
+    npy.testing.assert_equal(x.grad.numpy(), expected)
+
+  def test_cast(self):
+    x = Tensor(self.x, requires_grad=True)
+    (x.cast(dtypes.float32) * 2.0).sum().backward()
+    self.assertEqual(x.grad.dtype, dtypes.float64)
+    npy.testing.assert_equal(x.grad.numpy(), npy.full((3, 4), 2.0))
+
+  def test_accumulates_in_place(self):
+    x = Tensor(self.x, requires_grad=True)
+    (x * x).sum().backward()
+    memory = address(x.grad)
+    (x * x).sum().backward()
+    self.assertEqual(address(x.grad), memory)
+    npy.testing.assert_allclose(x.grad.numpy(), 4 * self.x)
+
+  def test_only_tensors_that_require_grad(self):
+    x, w = Tensor(self.x, requires_grad=True), Tensor(self.w)
+    (x @ w).sum().backward(Tensor(npy.array(2.0)))
+    self.assertIsNone(w.grad)
+    npy.testing.assert_allclose(x.grad.numpy(), npy.tile(2 * self.w.sum(1), (3, 1)))
+
+  def test_errors(self):
+    with self.assertRaises(TypeError): Tensor([1, 2, 3], requires_grad=True)
+    x = Tensor(self.x, requires_grad=True)
+    with self.assertRaises(RuntimeError): (x * 2.0).backward()
+    with self.assertRaisesRegex(NotImplementedError, "no gradient for op MAX"): x.max().backward()
+
+  def test_realize_together(self):
+    x = Tensor(self.x)
+    h = x @ Tensor(self.w)
+    a, b = h.sum(0), h * 2.0
+    a.realize(b)
+    npy.testing.assert_allclose(a.numpy(), (self.x @ self.w).sum(0))
+    npy.testing.assert_allclose(b.numpy(), self.x @ self.w * 2)
@@ -0,0 +1,46 @@
+import unittest
+import numpy as npy
+from autograd import Tensor
+from autograd.engine.checkpoint import checkpoint, memory_budget
+
+def layer(h: Tensor, w: Tensor) -> Tensor: return (z := h @ w) * z * 0.1 + h
+
+class TestCheckpoint(unittest.TestCase):
+  def setUp(self):
+    rng = npy.random.default_rng(0)
+    self.x = rng.standard_normal((64, 32))
+    self.ws = [rng.standard_normal((32, 32)) * 0.1 for _ in range(8)]
+
+  def run_model(self, checkpointed: bool=False, budget: int=1 << 40):
+    params = [Tensor(w, requires_grad=True) for w in self.ws]
+    h = Tensor(self.x)
+    for w in params: h = checkpoint(lambda h, w=w: layer(h, w), h) if checkpointed else layer(h, w)
+    loss = (h * h).sum()
+    with memory_budget(budget) as b: loss.backward()
+    self.assertEqual(len(b.reports), 1)
+    return loss.numpy(), [p.grad.numpy() for p in params], b.reports[0]
+
+  def test_checkpoint_recomputes_segments(self):
+    loss, grads, plain = self.run_model()
+    ck_loss, ck_grads, marked = self.run_model(checkpointed=True)
+    npy.testing.assert_allclose(ck_loss, loss)
+    for g, ck in zip(grads, ck_grads): npy.testing.assert_allclose(ck, g)
+    self.assertEqual((plain.segments, marked.segments), (0, 0)) # the budget is met, nothing is picked automatically
+    self.assertLess(marked.predicted_peak, plain.predicted_peak)
+    self.assertLess(marked.actual_peak, plain.actual_peak)
+
+  def test_memory_budget(self):
+    _, grads, plain = self.run_model()
+    _, auto_grads, report = self.run_model(budget=plain.predicted_peak * 3 // 4)
+    for g, auto in zip(grads, auto_grads): npy.testing.assert_allclose(auto, g)
+    self.assertEqual(report.baseline_peak, plain.predicted_peak)
+    self.assertGreater(report.segments, 0)
+    self.assertLessEqual(report.predicted_peak, report.budget)
+    self.assertLess(report.actual_peak, plain.actual_peak)
+    # the prediction replays the schedule, only scratch memory of kernels is not part of it
+    self.assertAlmostEqual(report.actual_peak, report.predicted_peak, delta=report.predicted_peak // 20)
+
+  def test_unreachable_budget_uses_the_lowest_peak(self):
+    _, _, report = self.run_model(budget=1)
+    self.assertGreater(report.segments, 0)
+    self.assertLess(report.predicted_peak, report.baseline_peak)
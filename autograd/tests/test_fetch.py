@@ -0,0 +1,70 @@
+import gzip
+import hashlib
+import http.server
+import pathlib
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from autograd import helpers
+from autograd.helpers import fetch, fetch_many
+
+class _RangeHandler(http.server.BaseHTTPRequestHandler):
+  # serves `files` from memory and honours "Range: bytes=N-" like a CDN would
+  files: dict[str, bytes] = {}
+  ranges: list[str|None] = []
+  def do_GET(self):
+    data, rng = self.files[self.path], self.headers.get("Range")
+    self.ranges.append(rng)
+    start = int(rng.removeprefix("bytes=").removesuffix("-")) if rng else 0
+    self.send_response(206 if rng else 200)
+    if rng: self.send_header("Content-Range", f"bytes {start}-{len(data)-1}/{len(data)}")
+    self.send_header("Content-Length", str(len(data) - start))
+    self.end_headers()
+    self.wfile.write(data[start:])
+  def log_message(self, *args): pass
+
+class TestFetch(unittest.TestCase):
+  def setUp(self):
+    self.payloads = {f"/file{i}.gz": bytes(range(256)) * (i + 1) * 1000 for i in range(3)}
+    _RangeHandler.files = {k: gzip.compress(v) for k, v in self.payloads.items()}
+    _RangeHandler.ranges = []
+    self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _RangeHandler)
+    threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+    self.dir = tempfile.TemporaryDirectory()
+    self.cache = mock.patch.object(helpers, "cache_dir", pathlib.Path(self.dir.name))
+    self.cache.start()
+  def tearDown(self):
+    self.cache.stop()
+    self.server.shutdown()
+    self.server.server_close()
+    self.dir.cleanup()
+
+  def test_parallel_download_is_decompressed_and_cached(self):
+    urls = [self.base + name for name in self.payloads]
+    results = fetch_many(urls, max_workers=3)
+    self.assertEqual([r.path.read_bytes() for r in results], list(self.payloads.values()))
+    self.assertEqual([r.nbytes for r in results], [len(v) for v in _RangeHandler.files.values()])
+    self.assertTrue(all(r.download_time > 0 and r.decompress_time > 0 and not r.cached for r in results))
+    self.assertTrue(all(r.cached for r in fetch_many(urls)))
+    self.assertEqual(fetch(urls[0]), results[0].path)
+    self.assertEqual(len(_RangeHandler.ranges), 3)
+
+  def test_resumes_a_partial_download(self):
+    url, raw = self.base + "/file2.gz", _RangeHandler.files["/file2.gz"]
+    file = helpers._cache_download_dir() / hashlib.md5(url.encode()).hexdigest()
+    file.parent.mkdir(parents=True)
+    file.with_name(file.name + ".partial").write_bytes(raw[:1000])
+    result, = fetch_many([url], checksums=["sha256:" + hashlib.sha256(raw).hexdigest()])
+    self.assertEqual((result.resumed_from, result.nbytes), (1000, len(raw) - 1000))
+    self.assertEqual(_RangeHandler.ranges, ["bytes=1000-"])
+    self.assertEqual(result.path.read_bytes(), self.payloads["/file2.gz"])
+
+  def test_checksum_mismatch(self):
+    url = self.base + "/file0.gz"
+    with self.assertRaises(RuntimeError):
+      fetch_many([url], checksums=["md5:" + "0" * 32])
+    self.assertEqual(list(helpers._cache_download_dir().iterdir()), [])
+    checksum = hashlib.sha256(_RangeHandler.files["/file0.gz"]).hexdigest()
+    self.assertEqual(fetch_many([url], checksums=[checksum])[0].path.read_bytes(), self.payloads["/file0.gz"])
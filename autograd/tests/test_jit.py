@@ -0,0 +1,70 @@
+import unittest
+import numpy as npy
+from autograd import Tensor, Jit
+from autograd.ops import Ops
+from autograd.scheduler import Scheduler
+
+class TestJit(unittest.TestCase):
+  def test_replay_matches_eager(self):
+    calls = []
+    @Jit
+    def f(x, y):
+      calls.append(1)
+      return (x @ y + x).sum(axis=1)
+    for i in range(3):
+      a = npy.arange(16, dtype=npy.float32).reshape(4,4) + i
+      b = npy.eye(4, dtype=npy.float32) * i
+      npy.testing.assert_allclose(f(Tensor(a), Tensor(b)).numpy(), (a @ b + a).sum(axis=1))
+    self.assertEqual(len(calls), 1)
+
+  def test_new_signature_is_captured_again(self):
+    calls = []
+    @Jit
+    def f(x, scale):
+      calls.append(1)
+      return x * scale
+    npy.testing.assert_array_equal(f(Tensor([1,2,3]), 2).numpy(), [2,4,6])
+    npy.testing.assert_array_equal(f(Tensor([[1],[2]]), 2).numpy(), [[2],[4]])
+    npy.testing.assert_array_equal(f(Tensor([1,2,3]), 3).numpy(), [3,6,9])
+    npy.testing.assert_array_equal(f(Tensor([4,5,6]), 2).numpy(), [8,10,12])
+    self.assertEqual(len(calls), 3)
+
+  def test_multiple_outputs_share_work(self):
+    w = Tensor(npy.full((3,), 2.0))
+    @Jit
+    def f(x):
+      h = x * w
+      return h, h + x
+    for v in ([1.0,2.0,3.0], [4.0,5.0,6.0]):
+      h, g = f(Tensor(v))
+      npy.testing.assert_array_equal(h.numpy(), npy.array(v) * 2)
+      npy.testing.assert_array_equal(g.numpy(), npy.array(v) * 3)
+
+  def test_scheduler_keeps_outputs(self):
+    a, b = Tensor([1,2,3]), Tensor([4,5,6])
+    h = a * b
+    scheduler = Scheduler((h.uop, (h + a).uop))
+    ids = {n.id for n in scheduler.nodes}
+    self.assertTrue(all(oid in ids for oid in scheduler.output_ids))
+    self.assertEqual([n.op for n in scheduler.nodes].count(Ops.MUL), 1)
+
+  def test_realized_intermediates_are_recomputed(self):
+    @Jit
+    def f(x):
+      h = x * 2
+      h.realize()
+      return h + x
+    for v in ([1.0, 2.0], [3.0, 4.0], [5.0, 6.0]):
+      npy.testing.assert_array_equal(f(Tensor(v)).numpy(), npy.array(v) * 3)
+
+  def test_graphs_realized_outside_are_not_frozen(self):
+    x = Tensor([1.0, 2.0], requires_grad=True)
+    h = x * 2
+    h.realize() # h keeps its graph for backward, the x*2 traced below is the same node
+    f = Jit(lambda t: t * 2 + 1)
+    npy.testing.assert_array_equal(f(x).numpy(), [3, 5])
+    npy.testing.assert_array_equal(f(Tensor([5.0, 6.0])).numpy(), [11, 13])
+
+  def test_outputs_keep_the_device(self):
+    f = Jit(lambda x: x * 2)
+    for _ in range(2): self.assertEqual(f(Tensor([1.0, 2.0], device="CPU:2")).device, "CPU:2")
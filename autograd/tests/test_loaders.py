@@ -0,0 +1,74 @@
+import pathlib
+import struct
+import tempfile
+import unittest
+import numpy as np
+from autograd import Tensor
+from autograd.dtypes import dtypes
+from autograd.datasets import DataLoader, load_idx, load_npy
+
+class TestLoaders(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.path = pathlib.Path(self.dir.name)
+  def tearDown(self):
+    self.dir.cleanup()
+
+  def test_raw_file(self):
+    (p := self.path / "raw.bin").write_bytes(bytes(range(16)))
+    t = Tensor(p, dtype=dtypes.int32, shape=(3,), offset=4)
+    self.assertEqual((t.shape, t.dtype), ((3,), dtypes.int32))
+    np.testing.assert_array_equal(t.numpy(), np.frombuffer(bytes(range(16)), dtype=np.int32)[1:])
+    with self.assertRaises(ValueError):
+      Tensor(p, dtype=dtypes.int32, shape=(4,), offset=4)
+
+  def test_npy(self):
+    a = np.arange(12, dtype=np.float32).reshape(3,4)
+    np.save(p := self.path / "a.npy", a)
+    t = load_npy(p)
+    self.assertEqual((t.shape, t.dtype, t.strides), ((3,4), dtypes.float32, a.strides))
+    np.testing.assert_array_equal(t.numpy(), a)
+    np.save(p := self.path / "f.npy", np.asfortranarray(a))
+    self.assertEqual(load_npy(p).strides, np.asfortranarray(a).strides)
+
+  def test_idx(self):
+    images = np.arange(2*3*4, dtype=np.uint8).reshape(2,3,4)
+    (p := self.path / "images-idx3-ubyte").write_bytes(struct.pack(">HBB3I", 0, 0x08, 3, 2, 3, 4) + images.tobytes())
+    t = load_idx(p)
+    self.assertEqual((t.shape, t.dtype), ((2,3,4), dtypes.uint8))
+    np.testing.assert_array_equal(t.numpy(), images)
+
+class TestDataLoader(unittest.TestCase):
+  def setUp(self):
+    self.images = np.arange(10*2*3, dtype=np.uint8).reshape(10,2,3)
+    self.labels = np.arange(10, dtype=np.int64)
+
+  def test_epoch_covers_every_row_once(self):
+    loader = DataLoader(Tensor(self.images), Tensor(self.labels), batch_size=4, seed=0)
+    self.assertEqual(len(loader), 3)
+    seen = []
+    for images, labels in loader:
+      self.assertEqual(images.dtype, dtypes.uint8)
+      np.testing.assert_array_equal(images.numpy(), self.images[labels.numpy()])
+      seen.extend(labels.numpy().tolist())
+    self.assertEqual(sorted(seen), list(range(10)))
+    self.assertNotEqual(seen, list(range(10)))
+
+  def test_normalize_and_drop_last(self):
+    loader = DataLoader(self.images, self.labels, batch_size=4, shuffle=False, drop_last=True, normalize=(True, False))
+    batches = [(images.numpy().copy(), labels.numpy().copy()) for images, labels in loader]
+    self.assertEqual(len(batches), 2)
+    self.assertEqual(batches[0][0].dtype, np.float32)
+    np.testing.assert_allclose(batches[1][0], self.images[4:8] / 255, rtol=1e-6)
+    np.testing.assert_array_equal(batches[1][1], self.labels[4:8])
+
+  def test_batches_reuse_the_ring(self):
+    loader = DataLoader(self.labels, batch_size=2, shuffle=False, prefetch=1)
+    addresses = {batch.numpy().__array_interface__["data"][0] for batch, in loader}
+    self.assertEqual(len(addresses), 2)
+    for _ in loader: break # an abandoned epoch stops its worker
+    self.assertEqual([batch.numpy().tolist() for batch, in loader][-1], [8, 9])
+
+  def test_mismatched_sources(self):
+    with self.assertRaises(ValueError):
+      DataLoader(self.images, self.labels[:5])
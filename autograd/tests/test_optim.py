@@ -0,0 +1,75 @@
+import unittest
+import numpy as npy
+from autograd import Tensor
+from autograd.ops import Ops
+from autograd.optim import SGD, Adam, Optimizer
+
+def params(seed: int=0):
+  rng = npy.random.default_rng(seed)
+  return rng.standard_normal((3, 4)), [rng.standard_normal((3, 4)) for _ in range(3)]
+
+class TestOptim(unittest.TestCase):
+  def test_sgd_updates_in_place(self):
+    w0, grads = params()
+    w = Tensor(w0.copy())
+    memory = w.numpy().__array_interface__["data"][0]
+    opt = SGD([w], lr=0.1)
+    for g in grads:
+      w.grad = Tensor(g)
+      opt.step()
+    self.assertEqual(w.numpy().__array_interface__["data"][0], memory)
+    npy.testing.assert_allclose(w.numpy(), w0 - 0.1 * sum(grads))
+
+  def test_sgd_momentum(self):
+    for nesterov in (False, True):
+      w0, grads = params()
+      w, ref, buf = Tensor(w0.copy()), w0.copy(), None
+      opt = SGD([w], lr=0.1, momentum=0.9, weight_decay=0.01, nesterov=nesterov)
+      for g in grads:
+        w.grad = Tensor(g)
+        opt.step()
+        d = g + 0.01 * ref
+        buf = d if buf is None else 0.9 * buf + d
+        ref = ref - 0.1 * (d + 0.9 * buf if nesterov else buf)
+      npy.testing.assert_allclose(w.numpy(), ref)
+
+  def test_adam(self):
+    w0, grads = params()
+    w, ref, m, v = Tensor(w0.copy()), w0.copy(), npy.zeros_like(w0), npy.zeros_like(w0)
+    opt = Adam([w], lr=0.01)
+    for t, g in enumerate(grads, 1):
+      w.grad = Tensor(g)
+      opt.step()
+      m, v = 0.9 * m + 0.1 * g, 0.999 * v + 0.001 * g * g
+      ref = ref - 0.01 * (m / (1 - 0.9**t)) / (npy.sqrt(v / (1 - 0.999**t)) + 1e-8)
+    npy.testing.assert_allclose(w.numpy(), ref, rtol=1e-6)
+
+  def test_state_starts_with_the_first_gradient(self):
+    # b has no gradient on the first two steps, its momentum and moments start on the third like a new parameter
+    w0, grads = params()
+    for opt_cls, kwargs in ((SGD, dict(lr=0.1, momentum=0.9, dampening=0.5)), (Adam, dict(lr=0.01))):
+      a, b = Tensor(w0.copy()), Tensor(w0.copy())
+      opt = opt_cls([a, b], **kwargs)
+      for i, g in enumerate(grads):
+        a.grad, b.grad = Tensor(g), Tensor(g) if i == 2 else None
+        opt.step()
+      fresh = Tensor(w0.copy())
+      ref = opt_cls([fresh], **kwargs)
+      fresh.grad = Tensor(grads[2])
+      ref.step()
+      npy.testing.assert_allclose(b.numpy(), fresh.numpy())
+
+  def test_lazy_param_and_missing_grad(self):
+    a = Tensor(npy.ones(4, dtype=npy.float32))
+    w, b = a * 2, Tensor(npy.zeros(4, dtype=npy.float32))
+    opt = SGD([w, b], lr=1.0)
+    self.assertEqual(w.uop.op, Ops.BUFFER)
+    w.grad = Tensor(npy.full(4, 0.5, dtype=npy.float32))
+    opt.step()
+    npy.testing.assert_array_equal((w + b).numpy(), npy.full(4, 1.5, dtype=npy.float32))
+    opt.zero_grad()
+    self.assertIsNone(w.grad)
+    with self.assertRaises(ValueError):
+      SGD([], lr=0.1)
+    with self.assertRaises(TypeError): # subclasses implement step
+      Optimizer([b], lr=0.1) # type: ignore
@@ -0,0 +1,50 @@
+import unittest
+from collections import Counter
+from autograd import Tensor
+from autograd.dtypes import dtypes
+from autograd.ops import Ops
+from autograd.ops.uop import UOp
+from autograd.ops.rewrite import graph_rewrite, simplify
+from autograd.scheduler import Scheduler
+
+class TestRewrite(unittest.TestCase):
+  def test_view_chain_collapses(self):
+    a = Tensor([[1,2,3],[4,5,6]])
+    t = a.reshape(3,2)[1:].reshape(1,4).expand(2,4)
+    stats = Counter()
+    root = graph_rewrite(t.uop, simplify, stats)
+    self.assertEqual([u.op for u in root.toposort()], [Ops.BUFFER, Ops.EXPAND])
+    self.assertEqual(root.arg.shape, t.uop.arg.shape)
+    self.assertEqual(stats["compose_views"], 3)
+
+  def test_noop_cast_and_identities(self):
+    a = Tensor([1.0, 2.0])
+    stats = Counter()
+    root = graph_rewrite(UOp(Ops.CAST, dtypes.float64, src=((a * 1.0 + 0.0).uop,)), simplify, stats)
+    self.assertIs(root, a.uop)
+    self.assertEqual((stats["noop_cast"], stats["add_zero"], stats["mul_one"]), (1, 2, 2))
+
+  def test_broadcasting_identity_is_kept(self):
+    a = Tensor([1, 2])
+    b = a.reshape(2,1) + Tensor([0, 0, 0])
+    self.assertIsNot(graph_rewrite(b.uop, simplify), a.uop)
+
+  def test_constants_fold(self):
+    cast = UOp(Ops.CAST, dtypes.int8, src=(UOp(Ops.CONST, dtypes.int64, arg=(100,)),))
+    c = UOp(Ops.ADD, dtypes.int8, src=(UOp(Ops.CONST, dtypes.int8, arg=(100,)), cast))
+    folded = graph_rewrite(UOp(Ops.MUL, dtypes.int8, src=(c, UOp(Ops.CONST, dtypes.int8, arg=(2,)))), simplify)
+    self.assertEqual((folded.op, folded.arg), (Ops.CONST, (-112,)))
+
+  def test_scheduler_reports_rewrites(self):
+    a = Tensor([1, 2, 3])
+    scheduler = Scheduler((a.reshape(3,1).reshape(1,3) + 0).uop)
+    self.assertEqual([n.op for n in scheduler.nodes], [Ops.BUFFER, Ops.RESHAPE])
+    self.assertEqual(scheduler.rewrites, Counter({"compose_views": 1, "add_zero": 2}))
+
+  def test_long_chains_count_every_node_once(self):
+    a = Tensor([1.0, 2.0])
+    t = a
+    for _ in range(2000): t = t.reshape(2, 1).reshape(2) + 0.0
+    stats = Counter()
+    self.assertIs(graph_rewrite(t.uop, simplify, stats), a.uop)
+    self.assertEqual(stats, Counter({"compose_views": 2000, "noop_view": 2000, "add_zero": 2001}))
@@ -0,0 +1,167 @@
+import gc
+import unittest
+import weakref
+import numpy as npy
+from autograd import Tensor
+from autograd.dtypes import dtypes
+from autograd.ops import Ops
+from autograd.scheduler import Scheduler
+from autograd.engine.realize import dead_after
+from autograd.optim import SGD
+
+class TestFusion(unittest.TestCase):
+  def test_chain_is_fused_into_one_node(self):
+    a, b, c = Tensor([1,2,3]), Tensor([4,5,6]), Tensor([7,8,9])
+    nodes = Scheduler((a*b+c+a).uop).nodes
+    self.assertEqual([n.op for n in nodes].count(Ops.FUSED), 1)
+    self.assertFalse(any(n.op in (Ops.ADD, Ops.MUL) for n in nodes))
+    self.assertEqual(len(nodes[-1].src_ids), 3)
+    self.assertEqual(len(nodes[-1].fused_ids), 3)
+
+  def test_shared_intermediate_is_materialized(self):
+    a, b = Tensor([1,2,3]), Tensor([4,5,6])
+    c = a+b
+    nodes = Scheduler((c*c).uop).nodes
+    self.assertIn(Ops.ADD, [n.op for n in nodes])
+
+  def test_const_becomes_immediate(self):
+    a = Tensor([1,2,3])
+    nodes = Scheduler((a+1).uop).nodes
+    self.assertNotIn(Ops.CONST, [n.op for n in nodes])
+    self.assertIn(("const", 1, "q"), nodes[-1].args)
+
+  def test_fused_result_matches_unfused(self):
+    a, b = Tensor([1,2,3]), Tensor([[1],[2]])
+    self.assertEqual(str((a*b+a).realize()), str(Tensor([[2,4,6],[3,6,9]]).realize()))
+
+class TestConstOperands(unittest.TestCase):
+  def test_scalars_keep_the_tensor_dtype(self):
+    a = Tensor(npy.arange(4, dtype=npy.float32))
+    self.assertEqual((a * 0.5 + 1).dtype, dtypes.float32)
+    self.assertEqual((Tensor([1, 2]) * 0.5).dtype, dtypes.float64)
+    self.assertEqual((Tensor([True, False]) + 1).dtype, dtypes.int64)
+    nodes = Scheduler((a * 0.5 + 1).uop).nodes
+    self.assertEqual([n.op for n in nodes], [Ops.BUFFER, Ops.FUSED])
+    npy.testing.assert_array_equal((a * 0.5 + 1).numpy(), npy.arange(4, dtype=npy.float32) * 0.5 + 1)
+
+  def test_reflected_scalars(self):
+    a = Tensor(npy.arange(4, dtype=npy.float32))
+    self.assertIs((1 + a).uop, (a + 1).uop)
+    self.assertIs((0.5 * a).uop, (a * 0.5).uop)
+    self.assertEqual((0.5 * Tensor([1, 2])).dtype, dtypes.float64)
+    npy.testing.assert_array_equal((0.5 * a + 1).numpy(), npy.arange(4, dtype=npy.float32) * 0.5 + 1)
+
+  def test_broadcast_const_is_an_immediate(self):
+    a = Tensor([[1, 2], [3, 4]])
+    nodes = Scheduler((a + Tensor(npy.array(10))).uop).nodes
+    self.assertEqual([n.op for n in nodes], [Ops.BUFFER, Ops.FUSED])
+    self.assertEqual(nodes[-1].src_ids, (nodes[0].id,))
+    npy.testing.assert_array_equal((a + Tensor(npy.array(10))).numpy(), [[11, 12], [13, 14]])
+
+  def test_broadcast_const_is_not_materialized(self):
+    a = Tensor(npy.ones((2, 3), dtype=npy.float32))
+    nodes = Scheduler((a @ Tensor(npy.array(2.0, dtype=npy.float32)).expand(3, 2)).uop).nodes
+    const = next(n for n in nodes if n.op == Ops.CONST)
+    self.assertEqual(const.shape, ())
+    npy.testing.assert_array_equal((a @ Tensor(npy.array(2.0, dtype=npy.float32)).expand(3, 2)).numpy(), npy.full((2, 2), 6.0))
+
+class TestHalfPrecision(unittest.TestCase):
+  def test_cast(self):
+    a = Tensor(npy.array([1.5, -2.25, 65519.0, 1e-8], dtype=npy.float64))
+    self.assertIs(a.cast(dtypes.float64), a)
+    self.assertEqual(a.cast("float16").dtype, dtypes.float16)
+    npy.testing.assert_array_equal(a.cast(dtypes.float16).numpy(), npy.array([1.5, -2.25, 65504.0, 0.0], dtype=npy.float16))
+    npy.testing.assert_array_equal(a.cast(dtypes.float16).cast(dtypes.int32).numpy(), [1, -2, 65504, 0])
+
+  def test_fused_halves_compute_in_float32(self):
+    x = npy.array([1.0, 200.0, 0.1, -3.0], dtype=npy.float16)
+    a, b = Tensor(x), Tensor(x)
+    nodes = Scheduler((a*b+a).uop).nodes
+    program = nodes[-1].args
+    self.assertEqual(nodes[-1].dtype, dtypes.float16)
+    self.assertEqual([ins[-1] for ins in program if ins[0] in ("add", "mul")], ["f", "f"])
+    self.assertEqual(program[-1], ("cast", len(program) - 2, "e"))
+    x32 = x.astype(npy.float32)
+    npy.testing.assert_array_equal((a*b+a).numpy(), (x32*x32+x32).astype(npy.float16))
+
+  def test_explicit_cast_rounds_inside_a_group(self):
+    x = npy.array([0.1, 1/3, 2049.0], dtype=npy.float32)
+    a = Tensor(x)
+    npy.testing.assert_array_equal((a.cast(dtypes.float16).cast(dtypes.float32) * 2).numpy(), x.astype(npy.float16).astype(npy.float32) * 2)
+
+  def test_folded_casts_round_like_the_kernels(self):
+    # a 0-d tensor is a CONST, its cast is folded while the schedule is built
+    values = [1 + 2**-8 + 2**-30, 1 + 2**-8, 1 + 2**-11 + 2**-40, -3.1, 1e-40, 7e4, 4e38]
+    for dtype in (dtypes.float16, dtypes.bfloat16):
+      kernel = Tensor(npy.array(values)).cast(dtype).cast(dtypes.float64).numpy()
+      folded = [Tensor(npy.array(v)).cast(dtype).cast(dtypes.float64).numpy() for v in values]
+      npy.testing.assert_array_equal(folded, kernel)
+    self.assertEqual(Tensor(npy.array(1 + 2**-8 + 2**-30)).cast(dtypes.bfloat16).cast(dtypes.float64).numpy(), 1.0078125)
+
+class TestLiveness(unittest.TestCase):
+  def test_buffers_die_after_last_use(self):
+    a, b = Tensor([1,2,3]), Tensor([4,5,6])
+    c = a+b
+    nodes = Scheduler((c*c+a).uop, fuse=False).nodes
+    dead = dead_after(nodes)
+    freed = [nid for i in sorted(dead) for nid in dead[i]]
+    self.assertEqual(sorted(freed), sorted({s for n in nodes for s in n.src_ids}))
+    self.assertNotIn(nodes[-1].id, freed)
+    for i, n in enumerate(nodes):
+      for s in n.src_ids: self.assertTrue(any(s in dead[j] for j in dead if j >= i))
+
+class TestRealized(unittest.TestCase):
+  def test_realized_graph_is_replaced_by_its_buffer(self):
+    a, b = Tensor(npy.arange(4.0)), Tensor(npy.ones(4))
+    c = a + b
+    inputs = weakref.ref(a.uop)
+    c.realize()
+    self.assertEqual(c.uop.op, Ops.BUFFER)
+    self.assertIs(c.uop.arg[0], c._buffer)
+    del a, b
+    gc.collect()
+    self.assertIsNone(inputs()) # the inputs are no longer reachable from c
+    d = c + 1
+    self.assertEqual([n.op for n in Scheduler(d.uop).nodes], [Ops.BUFFER, Ops.FUSED])
+    npy.testing.assert_array_equal(d.numpy(), [2, 3, 4, 5])
+
+  def test_graph_built_before_realize_reads_the_buffer(self):
+    a = Tensor(npy.arange(6.0).reshape(2, 3))
+    c = a @ Tensor(npy.ones((3, 2)))
+    d = c[1:] * 2.0
+    c.realize()
+    self.assertNotIn(Ops.MATMUL, [n.op for n in Scheduler(d.uop).nodes])
+    npy.testing.assert_array_equal(d.numpy(), [[24, 24]])
+
+  def test_graph_needed_by_backward_is_kept(self):
+    w = Tensor(npy.arange(3.0), requires_grad=True)
+    h = w * w
+    h.realize()
+    self.assertEqual(h.uop.op, Ops.MUL)
+    self.assertEqual([n.op for n in Scheduler((h + 1).uop).nodes], [Ops.BUFFER, Ops.FUSED])
+    h.sum().backward()
+    npy.testing.assert_array_equal(w.grad.numpy(), [0, 2, 4])
+
+  def test_write_drops_realized_graphs_that_read_the_buffer(self):
+    a = Tensor([1., 2.])
+    b = a * 2
+    c = b + 1
+    b.realize()
+    a.assign(Tensor([10., 20.]))
+    # a*2 is the interned node b realized, it is recomputed from the new values
+    npy.testing.assert_array_equal((a * 2).numpy(), [20, 40])
+    npy.testing.assert_array_equal(c.numpy(), [21, 41])
+    npy.testing.assert_array_equal(b.numpy(), [2, 4])
+
+  def test_optimizer_step_drops_the_realized_loss(self):
+    w = Tensor(npy.array([1.0, 2.0]), requires_grad=True)
+    opt = SGD([w], lr=0.5)
+    losses = []
+    for _ in range(3):
+      opt.zero_grad()
+      loss = (w * w).sum()
+      loss.backward()
+      opt.step()
+      losses.append(float(loss.numpy()))
+      npy.testing.assert_array_equal((w * w).sum().numpy(), (w.numpy() ** 2).sum())
+    self.assertEqual(losses, [5.0, 0.0, 0.0])
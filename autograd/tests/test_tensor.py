@@ -1,6 +1,10 @@
 from autograd.dtypes import dtypes
+import threading
 import unittest
-from autograd import Tensor
+import numpy as npy
+from autograd import Tensor, Device
+from autograd_core import get_num_threads
+from autograd.engine.realize import threads
 
 class TestTensor(unittest.TestCase):
   def test_can_add_tensors(self):
@@ -24,4 +28,56 @@ class TestTensor(unittest.TestCase):
     b = a[1]
     assert b.dtype == a.dtype
     assert b.shape == ()
-    assert b.strides == ()
\ No newline at end of file
+    assert b.strides == ()
+
+  def test_device_threads(self):
+    self.assertEqual(Tensor([1,2,3], device="cpu:4").device, "CPU:4")
+    self.assertEqual(Device.num_threads("CPU:4"), 4)
+    self.assertIsNone(Device.num_threads("CPU"))
+    a = Tensor([[1.,2.],[3.,4.]], device="CPU:3")
+    self.assertEqual((a * 2).device, "CPU:3")
+    for t in (a + a, a + 1, a.cast("float32"), a.reshape(4), a.transpose(), a[1:], a.sum(), a.mean(0), a @ a):
+      self.assertEqual(t.device, "CPU:3")
+    before = get_num_threads()
+    (a * 2).numpy()
+    self.assertEqual(get_num_threads(), before) # the count only holds while the schedule runs
+    # and only for the thread running the schedule
+    other: list[int] = []
+    with threads(3):
+      self.assertEqual(get_num_threads(), 3)
+      worker = threading.Thread(target=lambda: other.append(get_num_threads()))
+      worker.start()
+      worker.join()
+    self.assertEqual(other, [before])
+    with self.assertRaises(ValueError):
+      Tensor([1,2,3], device="CPU:0")
+
+  def test_bytes_become_a_buffer_once(self):
+    data = npy.arange(6, dtype=npy.float32).tobytes()
+    t = Tensor(data, shape=(2, 3), dtype=dtypes.float32)
+    self.assertEqual(len(t.uop.arg), 4)
+    self.assertIs(t.realize()._buffer, t.uop.arg[0]) # realizing reads the buffer, nothing is rebuilt from the bytes
+    npy.testing.assert_array_equal((t + 1).numpy(), npy.arange(1, 7, dtype=npy.float32).reshape(2, 3))
+
+  def test_numpy_is_zero_copy(self):
+    a = npy.arange(6, dtype=npy.float32).reshape(2,3)
+    out = Tensor(a).numpy()
+    self.assertTrue(npy.shares_memory(out, a))
+    npy.testing.assert_array_equal(out, a)
+
+  def test_from_strided_ndarray(self):
+    a = npy.arange(12, dtype=npy.int64).reshape(3,4)[:, ::2]
+    t = Tensor.from_np(a)
+    self.assertEqual(t.shape, (3,2))
+    self.assertEqual(t.strides, a.strides)
+    npy.testing.assert_array_equal((t+t).numpy(), a+a)
+
+  def test_from_nested_list(self):
+    self.assertEqual(Tensor([[True, False]]).dtype, dtypes.boolean)
+    self.assertEqual(Tensor([[1, 2], [3, 4]]).dtype, dtypes.int64)
+    t = Tensor(((1, 2.5), [3, True]))
+    self.assertEqual((t.shape, t.dtype), ((2,2), dtypes.float64))
+    npy.testing.assert_array_equal(t.numpy(), [[1, 2.5], [3, 1]])
+    npy.testing.assert_array_equal(Tensor([1, 2, 3], dtype=dtypes.int8).numpy(), npy.array([1, 2, 3], dtype=npy.int8))
+    with self.assertRaises(ValueError): Tensor([[1, 2], [3]])
+    with self.assertRaises(ValueError): Tensor([1, [2, 3]])
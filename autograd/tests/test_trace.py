@@ -0,0 +1,44 @@
+import contextlib
+import io
+import json
+import pathlib
+import tempfile
+import unittest
+import numpy as npy
+from autograd import Tensor
+from autograd.engine import trace as tracing
+from autograd.engine.trace import trace
+
+class TestTrace(unittest.TestCase):
+  def test_events_per_node(self):
+    a, b = Tensor(npy.ones((4, 8), dtype=npy.float32)), Tensor(npy.ones(8, dtype=npy.float32))
+    with trace() as t:
+      (a * b.expand(4, 8) + 1).realize()
+      (a @ Tensor(npy.ones((8, 2), dtype=npy.float32))).realize()
+    self.assertIsNone(tracing.current())
+    self.assertEqual({e.run for e in t.events}, {0, 1})
+    fused = next(e for e in t.events if e.op == "FUSED")
+    self.assertEqual((fused.kernel, fused.group, fused.node_id), ("fused[mul,add]", fused.node_id, fused.node_id))
+    self.assertEqual((fused.bytes_read, fused.bytes_written, fused.bytes_allocated), (4*8*4 + 8*4, 4*8*4, 4*8*4))
+    expand = next(e for e in t.events if e.op == "EXPAND")
+    self.assertEqual((expand.bytes_read, expand.bytes_allocated), (0, 0))
+    matmul = next(e for e in t.events if e.op == "MATMUL")
+    self.assertEqual((matmul.bytes_written, matmul.shape, matmul.group), (4*2*4, (4, 2), None))
+    self.assertTrue(all(e.duration >= 0 for e in t.events))
+
+  def test_summary_and_chrome_trace(self):
+    a = Tensor(npy.arange(6, dtype=npy.float32))
+    with trace() as t:
+      (a + a).realize()
+    self.assertIn("add", t.summary().splitlines()[1])
+    with tempfile.TemporaryDirectory() as d:
+      t.save_chrome_trace(p := pathlib.Path(d) / "trace.json")
+      events = json.loads(p.read_text())["traceEvents"]
+    self.assertEqual([e["name"] for e in events], [e.kernel for e in t.events])
+    self.assertTrue(all(e["ph"] == "X" and "bytes_read" in e["args"] for e in events))
+
+  def test_untraced_runs_are_silent(self):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+      (Tensor([[1, 2, 3], [4, 5, 6]]) + Tensor([4, 5, 6]).expand((2, 3))).realize()
+    self.assertEqual(out.getvalue(), "")
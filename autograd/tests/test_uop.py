@@ -0,0 +1,40 @@
+import unittest
+from autograd_core import Buffer
+from autograd import Tensor
+from autograd.dtypes import dtypes
+from autograd.ops import Ops
+from autograd.ops.uop import UOp, cse
+from autograd.scheduler import Scheduler
+
+class TestInterning(unittest.TestCase):
+  def test_equal_uops_are_the_same_object(self):
+    a = Tensor([1.0, 2.0])
+    self.assertIs((a+a).uop, (a+a).uop)
+    self.assertIs(UOp(Ops.CONST, dtypes.float32, arg=(1.0,)), UOp(Ops.CONST, dtypes.float32, arg=(1.0,)))
+    self.assertIsNot(UOp(Ops.CONST, dtypes.float32, arg=(0.0,)), UOp(Ops.CONST, dtypes.float32, arg=(-0.0,)))
+
+  def test_buffers_are_keyed_by_identity(self):
+    data, copy = (Buffer(bytes(1 << 20), [1 << 20], [1], "B", 0) for _ in range(2))
+    a = UOp(Ops.BUFFER, dtypes.uint8, arg=(data, (1 << 20,), (1,), 0))
+    self.assertIs(a, UOp(Ops.BUFFER, dtypes.uint8, arg=(data, (1 << 20,), (1,), 0)))
+    self.assertIsNot(a, UOp(Ops.BUFFER, dtypes.uint8, arg=(copy, (1 << 20,), (1,), 0)))
+
+  def test_swapped_operands_are_merged(self):
+    a, b = Tensor([1, 2, 3]), Tensor([4, 5, 6])
+    root = cse(((a+b) * (b+a)).uop)
+    self.assertIs(root.src[0], root.src[1])
+    nodes = Scheduler(((a+b) * (b+a)).uop, fuse=False).nodes
+    self.assertEqual([n.op for n in nodes].count(Ops.ADD), 1)
+
+class TestMetadata(unittest.TestCase):
+  def test_metadata_is_computed_on_construction(self):
+    a = Tensor([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    u = (a.transpose() + 1.0).uop
+    self.assertEqual((u.shape, u.strides, u.offset), ((3, 2), (16, 8), 0))
+    self.assertFalse(hasattr(u, "__dict__"))
+    with self.assertRaises(NotImplementedError): UOp(Ops.FUSED, dtypes.float32, (u,))
+
+  def test_uops_are_immutable(self):
+    u = Tensor([1.0, 2.0]).uop
+    with self.assertRaises(AttributeError): u.shape = (3,)
+    with self.assertRaises(AttributeError): del u.src
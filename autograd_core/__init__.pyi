@@ -1,6 +1,7 @@
 # This file is automatically generated by pyo3_stub_gen
 # ruff: noqa: E501, F401
 
+import os
 import typing
 from autograd import Tensor
 
@@ -8,12 +9,44 @@ class Buffer:
     def __new__(cls, py_data: typing.Any, shape: typing.Sequence[int], strides: typing.Sequence[int], format: str, offset: int) -> "Buffer": ...
     def __repr__(self) -> str: ...
     @classmethod
+    def from_buffer(cls, obj: typing.Any) -> Buffer: ...
+    @classmethod
+    def from_file(cls, path: str | os.PathLike, fmt: str, shape: typing.Sequence[int], strides: typing.Sequence[int], offset: int, copy_on_write: bool) -> Buffer: ...
+    @property
+    def shape(self) -> list[int]: ...
+    @property
+    def strides(self) -> list[int]: ...
+    @property
+    def offset(self) -> int: ...
+    @property
+    def format(self) -> str: ...
+    @property
+    def writable(self) -> bool: ...
+    @property
+    def unique(self) -> bool: ...
+    def __buffer__(self, flags: int) -> memoryview: ...
+    @classmethod
+    def zeros(cls, shape: typing.Sequence[int], fmt: str) -> Buffer: ...
+    @classmethod
     def cast_buffer(cls, buffer: Buffer, new_dtype: str) -> Buffer: ...
     def view(self, view: View) -> Buffer: ...
 
-def add_tensors(a:Buffer,b:Buffer) -> Buffer: ...
-def mul_tensors(a:Buffer,b:Buffer) -> Buffer: ...
+def add_tensors(a:Buffer,b:Buffer,out:Buffer|None=None) -> Buffer: ...
+def mul_tensors(a:Buffer,b:Buffer,out:Buffer|None=None) -> Buffer: ...
+def fused_elementwise(inputs: typing.Sequence[Buffer], program: typing.Sequence[tuple], shape: typing.Sequence[int], out: Buffer|None=None) -> Buffer: ...
+def contiguous(a: Buffer) -> Buffer: ...
+def matmul(a:Buffer,b:Buffer) -> Buffer: ...
+def reduce(a:Buffer, op: str, axes: typing.Sequence[int], keepdim: bool) -> Buffer: ...
+def sgd_step(param: Buffer, grad: Buffer, momentum_buffer: Buffer | None, lr: float, momentum: float = 0.0, dampening: float = 0.0, weight_decay: float = 0.0, nesterov: bool = False) -> None: ...
+def adam_step(param: Buffer, grad: Buffer, exp_avg: Buffer, exp_avg_sq: Buffer, step: int, lr: float, beta1: float = 0.9, beta2: float = 0.999, eps: float = 1e-8, weight_decay: float = 0.0) -> None: ...
+def buffer_from_list(data: list | tuple, fmt: str | None = None) -> Buffer: ...
 def numpy(a:Tensor) -> str: ...
+def arena_stats() -> dict[str, int]: ...
+def reset_arena_stats() -> None: ...
+def clear_arena() -> None: ...
+def set_num_threads(n: int) -> None: ...
+def get_num_threads() -> int: ...
+def set_local_num_threads(n: int | None = None) -> int | None: ...
 
 class View:
     def __new__(cls, shape: tuple[int,...], strides:  tuple[int,...], offset: int) -> View: ...
@@ -0,0 +1,123 @@
+// Size-bucketed arena for Storage allocations.
+//
+// Buffers of a schedule are released as soon as their last consumer ran, their bytes are
+// kept in per-size free lists (power of two buckets) and handed out again to the next
+// allocation of the same bucket instead of going back to the system allocator.
+// The arena also tracks live and peak bytes of all storages so the effect of liveness
+// analysis can be measured from Python.
+
+use std::sync::Mutex;
+use std::sync::atomic::{AtomicUsize, Ordering};
+
+use pyo3::prelude::*;
+use pyo3::types::PyDict;
+
+const MIN_BUCKET: usize = 64;
+// upper bound of bytes kept in the free lists, overridable with AUTOGRAD_ARENA_LIMIT
+const DEFAULT_LIMIT: usize = 1 << 30;
+
+struct FreeLists {
+    // buckets[i] holds vectors of exactly MIN_BUCKET << i initialized bytes
+    buckets: Vec<Vec<Vec<u8>>>,
+    limit: Option<usize>,
+}
+
+static FREE: Mutex<FreeLists> = Mutex::new(FreeLists {
+    buckets: Vec::new(),
+    limit: None,
+});
+static POOLED_BYTES: AtomicUsize = AtomicUsize::new(0);
+static LIVE_BYTES: AtomicUsize = AtomicUsize::new(0);
+static PEAK_BYTES: AtomicUsize = AtomicUsize::new(0);
+static ALLOCATIONS: AtomicUsize = AtomicUsize::new(0);
+static REUSE_HITS: AtomicUsize = AtomicUsize::new(0);
+
+pub fn bucket_size(nbytes: usize) -> usize {
+    nbytes.max(MIN_BUCKET).next_power_of_two()
+}
+
+fn bucket_index(bucket: usize) -> usize {
+    (bucket / MIN_BUCKET).trailing_zeros() as usize
+}
+
+fn limit(free: &mut FreeLists) -> usize {
+    *free.limit.get_or_insert_with(|| {
+        std::env::var("AUTOGRAD_ARENA_LIMIT")
+            .ok()
+            .and_then(|v| v.parse().ok())
+            .unwrap_or(DEFAULT_LIMIT)
+    })
+}
+
+// Returns a vector of `bucket_size(nbytes)` initialized bytes, recycled when possible.
+// Recycled bytes are not cleared.
+pub fn take(nbytes: usize) -> Vec<u8> {
+    let bucket = bucket_size(nbytes);
+    ALLOCATIONS.fetch_add(1, Ordering::Relaxed);
+    let recycled = {
+        let mut free = FREE.lock().unwrap();
+        free.buckets.get_mut(bucket_index(bucket)).and_then(|b| b.pop())
+    };
+    match recycled {
+        Some(v) => {
+            POOLED_BYTES.fetch_sub(bucket, Ordering::Relaxed);
+            REUSE_HITS.fetch_add(1, Ordering::Relaxed);
+            v
+        }
+        None => vec![0u8; bucket],
+    }
+}
+
+// Gives a vector obtained from `take` back to the arena.
+pub fn give(v: Vec<u8>) {
+    let bucket = v.len();
+    debug_assert!(bucket.is_power_of_two() && bucket >= MIN_BUCKET);
+    let mut free = FREE.lock().unwrap();
+    if POOLED_BYTES.load(Ordering::Relaxed) + bucket > limit(&mut free) {
+        return;
+    }
+    let idx = bucket_index(bucket);
+    if free.buckets.len() <= idx {
+        free.buckets.resize_with(idx + 1, Vec::new);
+    }
+    free.buckets[idx].push(v);
+    POOLED_BYTES.fetch_add(bucket, Ordering::Relaxed);
+}
+
+pub fn track_alloc(nbytes: usize) {
+    let live = LIVE_BYTES.fetch_add(nbytes, Ordering::Relaxed) + nbytes;
+    PEAK_BYTES.fetch_max(live, Ordering::Relaxed);
+}
+
+pub fn track_free(nbytes: usize) {
+    LIVE_BYTES.fetch_sub(nbytes, Ordering::Relaxed);
+}
+
+// Returns the counters of the storage arena: live_bytes, peak_bytes, pooled_bytes,
+// allocations and reuse_hits.
+#[pyfunction]
+pub fn arena_stats(py: Python<'_>) -> PyResult<Bound<'_, PyDict>> {
+    let stats = PyDict::new(py);
+    stats.set_item("live_bytes", LIVE_BYTES.load(Ordering::Relaxed))?;
+    stats.set_item("peak_bytes", PEAK_BYTES.load(Ordering::Relaxed))?;
+    stats.set_item("pooled_bytes", POOLED_BYTES.load(Ordering::Relaxed))?;
+    stats.set_item("allocations", ALLOCATIONS.load(Ordering::Relaxed))?;
+    stats.set_item("reuse_hits", REUSE_HITS.load(Ordering::Relaxed))?;
+    Ok(stats)
+}
+
+// Resets the allocation counters, the peak starts again from the bytes that are live now.
+#[pyfunction]
+pub fn reset_arena_stats() {
+    ALLOCATIONS.store(0, Ordering::Relaxed);
+    REUSE_HITS.store(0, Ordering::Relaxed);
+    PEAK_BYTES.store(LIVE_BYTES.load(Ordering::Relaxed), Ordering::Relaxed);
+}
+
+// Releases every pooled allocation back to the system allocator.
+#[pyfunction]
+pub fn clear_arena() {
+    let mut free = FREE.lock().unwrap();
+    free.buckets.clear();
+    POOLED_BYTES.store(0, Ordering::Relaxed);
+}
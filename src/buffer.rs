@@ -1,24 +1,34 @@
-use crate::dtype::DType;
-use crate::helpers::{calc_strides, get_coords};
+use crate::dtype::{DType, Element, dispatch_dtype};
+use crate::half::{BF16, F16};
+use crate::helpers::calc_strides;
 use crate::storage::Storage;
+use crate::parallel::SendPtr;
+use crate::strided::{StridedLoop, dense_strides, map1, to_elements};
 use crate::view::View;
-use pyo3::ffi::Py_buffer;
+use pyo3::exceptions::{PyBufferError, PyValueError};
+use pyo3::ffi::{self, Py_buffer};
 use pyo3::prelude::*;
 use pyo3::types::PyType;
 use pyo3_stub_gen::derive::{gen_stub_pyclass, gen_stub_pymethods};
 use std::fmt::{Display, Write};
-use std::os::raw::{c_int, c_void};
-use std::rc::Rc;
+use std::ffi::CStr;
+use std::fs::File;
+use std::path::PathBuf;
+use std::os::raw::{c_char, c_int, c_void};
+use std::sync::Arc;
 
 #[gen_stub_pyclass]
-#[pyclass(unsendable)]
+#[pyclass]
 #[derive(Debug, Clone)]
 #[repr(C)]
 pub struct Buffer {
-    pub data: Rc<Storage>,
+    pub data: Arc<Storage>,
+    #[pyo3(get)]
     pub shape: Vec<isize>,
+    #[pyo3(get)]
     pub strides: Vec<isize>,
     pub dtype: DType,
+    #[pyo3(get)]
     pub offset: usize,
 }
 
@@ -38,7 +48,7 @@ impl Buffer {
         let storage = Storage::from_slice(bytes);
 
         Ok(Buffer {
-            data: Rc::new(storage),
+            data: Arc::new(storage),
             shape,
             strides,
             dtype,
@@ -55,7 +65,7 @@ impl Buffer {
         dtype: &str,
     ) -> Buffer {
         Buffer {
-            data: Rc::new(Storage::from_slice(bytes.as_slice())),
+            data: Arc::new(Storage::from_slice(bytes.as_slice())),
             shape,
             strides,
             dtype: DType::from_str(dtype),
@@ -63,79 +73,157 @@ impl Buffer {
         }
     }
 
+    // Wraps the memory of an object exporting the buffer protocol (numpy arrays, memoryview,
+    // bytes, array.array) without copying. The strides of the export are kept, so non-contiguous
+    // arrays are wrapped as they are. The buffer keeps the exporter alive, writable exports stay writable.
     #[classmethod]
-    fn cast_buffer(_cls: &Bound<'_, PyType>, buffer: PyRef<Buffer>, new_dtype: &str) -> Buffer {
-        let numel = buffer.shape.iter().map(|n| *n as usize).product::<usize>();
-        let target_dtype = DType::from_str(new_dtype);
-        let dtype = DType::from_str(new_dtype);
-        match buffer.dtype {
-            DType::Int32 => match target_dtype {
-                DType::Int64 => unsafe {
-                    generic_cast_buffer::<i32, i64>(buffer, dtype, numel, |x| x as i64)
-                },
-                DType::Float32 => unsafe {
-                    generic_cast_buffer::<i32, f32>(buffer, dtype, numel, |x| x as f32)
-                },
-                DType::Float64 => unsafe {
-                    generic_cast_buffer::<i32, f64>(buffer, dtype, numel, |x| x as f64)
-                },
-                _ => panic!("not implemented yet"),
-            },
-            DType::Int64 => match target_dtype {
-                DType::Float64 => unsafe {
-                    generic_cast_buffer::<i64, f64>(buffer, dtype, numel, |x| x as f64)
-                },
-                _ => panic!("not implemented yet"),
-            },
-            DType::Float32 => match target_dtype {
-                DType::Float64 => unsafe {
-                    generic_cast_buffer::<f32, f64>(buffer, dtype, numel, |x| x as f64)
-                },
-                _ => panic!("not implemented yet"),
+    fn from_buffer(cls: &Bound<'_, PyType>, obj: &Bound<'_, PyAny>) -> PyResult<Buffer> {
+        let py = cls.py();
+        let mut view: Box<Py_buffer> = Box::new(unsafe { std::mem::zeroed() });
+        unsafe {
+            if ffi::PyObject_GetBuffer(obj.as_ptr(), &mut *view, ffi::PyBUF_RECORDS) != 0 {
+                // not writable (bytes, read-only arrays), retry read-only
+                PyErr::take(py);
+                if ffi::PyObject_GetBuffer(obj.as_ptr(), &mut *view, ffi::PyBUF_RECORDS_RO) != 0 {
+                    return Err(PyErr::fetch(py));
+                }
+            }
+        }
+        let ndim = view.ndim as usize;
+        let (shape, strides) = match ndim {
+            0 => (vec![], vec![]),
+            _ => unsafe {
+                (
+                    std::slice::from_raw_parts(view.shape, ndim).to_vec(),
+                    std::slice::from_raw_parts(view.strides, ndim).to_vec(),
+                )
             },
-            _ => panic!("not implemented yet"),
+        };
+        let itemsize = view.itemsize as usize;
+        let format = match view.format.is_null() {
+            true => "B".to_owned(),
+            false => unsafe { CStr::from_ptr(view.format) }.to_string_lossy().into_owned(),
+        };
+        // lowest and one past the highest byte of the export, negative strides reach below `buf`
+        let (mut lo, mut hi) = (0isize, itemsize as isize);
+        let empty = shape.iter().any(|d| *d == 0);
+        if !empty {
+            for (d, s) in shape.iter().zip(&strides) {
+                match (d - 1) * s {
+                    ext if ext < 0 => lo += ext,
+                    ext => hi += ext,
+                }
+            }
         }
+        let base = unsafe { (view.buf as *mut u8).offset(lo) };
+        // from here on the storage releases the export, also on the error path below
+        let storage = unsafe { Storage::from_py_buffer(view, base, if empty { 0 } else { (hi - lo) as usize }) };
+        let dtype = DType::from_buffer_format(&format, itemsize).ok_or_else(|| {
+            PyValueError::new_err(format!("unsupported buffer format {format:?} with itemsize {itemsize}"))
+        })?;
+        Ok(Buffer {
+            data: Arc::new(storage),
+            shape,
+            strides,
+            dtype,
+            offset: (-lo) as usize,
+        })
+    }
+
+    // Maps the bytes of a tensor stored in a file, `offset` is the byte position of the first
+    // element. Nothing is read until the pages are touched. The buffer is read-only unless
+    // `copy_on_write` is set, writes then stay private to the process.
+    #[classmethod]
+    fn from_file(
+        _cls: &Bound<'_, PyType>,
+        path: PathBuf,
+        fmt: &str,
+        shape: Vec<isize>,
+        strides: Vec<isize>,
+        offset: u64,
+        copy_on_write: bool,
+    ) -> PyResult<Buffer> {
+        let dtype = DType::from_str(fmt);
+        if shape.len() != strides.len() || strides.iter().any(|s| *s < 0) || shape.iter().any(|d| *d < 0) {
+            return Err(PyValueError::new_err(format!(
+                "invalid layout shape={shape:?} strides={strides:?} for a file buffer"
+            )));
+        }
+        let span = match shape.iter().any(|d| *d == 0) {
+            true => 0,
+            false => (shape.iter().zip(&strides).map(|(d, s)| (d - 1) * s).sum::<isize>() + dtype.get_bit_size() / 8) as u64,
+        };
+        let file = File::open(&path)?;
+        let file_len = file.metadata()?.len();
+        if offset + span > file_len {
+            return Err(PyValueError::new_err(format!(
+                "{} has {file_len} bytes, the tensor needs {span} bytes from offset {offset}",
+                path.display()
+            )));
+        }
+        Ok(Buffer {
+            data: Arc::new(Storage::map_file(&file, offset, span as usize, copy_on_write)?),
+            shape,
+            strides,
+            dtype,
+            offset: 0,
+        })
+    }
+
+    // A dense buffer of zeros.
+    #[classmethod]
+    fn zeros(_cls: &Bound<'_, PyType>, shape: Vec<isize>, fmt: &str) -> Buffer {
+        let dtype = DType::from_str(fmt);
+        let itemsize = dtype.get_bit_size() / 8;
+        let numel = shape.iter().map(|n| *n as usize).product::<usize>();
+        Buffer {
+            data: Arc::new(Storage::zeroed(numel * itemsize as usize)),
+            strides: calc_strides(&shape, itemsize),
+            shape,
+            dtype,
+            offset: 0,
+        }
+    }
+
+    // Casts to `new_dtype` with the semantics of `as` (see `Element`), 16-bit floats round to
+    // nearest even. Dense inputs run a flat loop over memory, strided ones a strided loop.
+    #[classmethod]
+    fn cast_buffer(_cls: &Bound<'_, PyType>, buffer: PyRef<Buffer>, new_dtype: &str) -> Buffer {
+        let numel = buffer.numel();
+        let dtype = DType::from_str(new_dtype);
+        let buffer = Buffer::clone(&buffer);
+        // the kernel only touches Rust memory, other Python threads keep running meanwhile
+        _cls.py().detach(move || {
+            dispatch_dtype!(&buffer.dtype, S => {
+                dispatch_dtype!(&dtype, D => unsafe {
+                    generic_cast_buffer::<S, D>(&buffer, dtype.clone(), numel, D::cast_from::<S>)
+                }, unreachable!())
+            }, unreachable!())
+        })
     }
 }
 
-unsafe fn generic_cast_buffer<T, U>(
-    buffer: PyRef<Buffer>,
-    new_dtype: DType,
-    numel: usize,
-    cast: fn(T) -> U,
-) -> Buffer
+unsafe fn generic_cast_buffer<T, U, F>(buffer: &Buffer, new_dtype: DType, numel: usize, cast: F) -> Buffer
 where
     T: Copy,
     U: Copy,
+    F: Fn(T) -> U + Sync,
 {
     unsafe {
-        let itemsize_T = std::mem::size_of::<T>();
-        let slice =
-            std::slice::from_raw_parts(buffer.data.as_ptr().add(buffer.offset) as *const T, numel);
         let itemsize_U = std::mem::size_of::<U>();
         let strides_U = calc_strides(&buffer.shape, itemsize_U as isize);
-        let nbytes = numel * itemsize_U;
-        let mut new_storage = Storage::allocate(nbytes);
-        let output_slice =
-            std::slice::from_raw_parts_mut(new_storage.as_mut_ptr() as *mut U, numel);
-        for linear_index in 0..numel {
-            let coords = get_coords(&buffer.shape, linear_index);
-
-            let mut buffer_sum = 0;
-            let mut output_sum = 0;
-
-            for i in 0..coords.len() {
-                buffer_sum += (buffer.strides[i] * coords[i]) as usize;
-                output_sum += strides_U[i] * coords[i];
-            }
-
-            let buffer_idx = buffer_sum / itemsize_T;
-            let output_idx = (output_sum / (itemsize_U as isize)) as usize;
-            let item = cast(slice[buffer_idx]);
-            output_slice[output_idx] = item;
-        }
+        let mut new_storage = Storage::allocate(numel * itemsize_U);
+        let (in_strides, in_offset) = buffer.element_layout(std::mem::size_of::<T>());
+        let out_strides = dense_strides(&buffer.shape);
+        let lp = StridedLoop::new(&buffer.shape, &[&out_strides, &in_strides], &[0, in_offset]);
+        map1(
+            &lp,
+            new_storage.as_mut_ptr() as *mut U,
+            buffer.data.as_ptr() as *const T,
+            cast,
+        );
         Buffer {
-            data: Rc::new(new_storage),
+            data: Arc::new(new_storage),
             shape: buffer.shape.to_owned(),
             strides: strides_U,
             dtype: new_dtype,
@@ -144,6 +232,105 @@ where
     }
 }
 
+impl Buffer {
+    pub fn numel(&self) -> usize {
+        self.shape.iter().map(|n| *n as usize).product::<usize>()
+    }
+
+    // element strides and element offset of this buffer for an item of `itemsize` bytes
+    pub fn element_layout(&self, itemsize: usize) -> (Vec<isize>, isize) {
+        to_elements(&self.strides, self.offset, itemsize)
+    }
+
+    // A kernel result of `shape` and `dtype` can be written into this buffer: same shape and
+    // dtype, writable memory and no broadcast dims, which would alias several results.
+    pub fn check_out(&self, shape: &[isize], dtype: &DType) -> PyResult<()> {
+        if self.shape != shape || self.dtype != *dtype {
+            return Err(PyValueError::new_err(format!(
+                "cannot write a {dtype} {shape:?} result into a {} {:?} buffer",
+                self.dtype, self.shape
+            )));
+        }
+        if self.data.is_readonly() {
+            return Err(PyValueError::new_err("cannot write into a read-only buffer"));
+        }
+        if self.shape.iter().zip(&self.strides).any(|(d, s)| *d > 1 && *s == 0) {
+            return Err(PyValueError::new_err("cannot write into a broadcast buffer"));
+        }
+        Ok(())
+    }
+
+    // true when `input` reads the memory of this buffer at other positions than this buffer is
+    // written at. Reading and writing the very same elements is safe for elementwise kernels.
+    pub fn conflicts_with(&self, input: &Buffer) -> bool {
+        let (start, end) = (self.data.as_ptr() as usize, self.data.as_ptr() as usize + self.data.len());
+        let (in_start, in_end) = (input.data.as_ptr() as usize, input.data.as_ptr() as usize + input.data.len());
+        let overlaps = start < in_end && in_start < end;
+        let same_elements = start + self.offset == in_start + input.offset
+            && self.strides == input.strides
+            && self.dtype.get_bit_size() == input.dtype.get_bit_size();
+        overlaps && !same_elements
+    }
+
+    // Copies `src` of the same shape and dtype into the memory of this buffer, both in any layout.
+    pub unsafe fn copy_from(&self, src: &Buffer) {
+        dispatch_dtype!(&self.dtype, T => unsafe {
+            let (strides, offset) = self.element_layout(std::mem::size_of::<T>());
+            let (src_strides, src_offset) = src.element_layout(std::mem::size_of::<T>());
+            let lp = StridedLoop::new(&self.shape, &[&strides, &src_strides], &[offset, src_offset]);
+            map1(&lp, self.data.as_ptr() as *mut T, src.data.as_ptr() as *const T, |x: T| x)
+        }, unreachable!())
+    }
+}
+
+// Runs an elementwise kernel without the GIL: `kernel(ptr, strides, offset)` writes a result of
+// `shape` and `dtype` at the given element strides and offset from `ptr`. Without `out` the
+// result is a new dense buffer. With `out` it is written in place and `out` is returned, through
+// a temporary when one of `inputs` reads the memory of `out` at other positions (`a[::-1]` into `a`).
+pub fn write_output<'py, F>(
+    py: Python<'py>,
+    out: Option<Bound<'py, Buffer>>,
+    inputs: &[&Buffer],
+    shape: &[isize],
+    dtype: &DType,
+    kernel: F,
+) -> PyResult<Bound<'py, Buffer>>
+where
+    F: Fn(*mut u8, &[isize], isize) + Sync,
+{
+    let itemsize = (dtype.get_bit_size() / 8) as usize;
+    let allocate = || {
+        let numel = shape.iter().map(|n| *n as usize).product::<usize>();
+        let mut storage = Storage::allocate(numel * itemsize);
+        let ptr = SendPtr(storage.as_mut_ptr());
+        py.detach(|| kernel(ptr.get(), &dense_strides(shape), 0));
+        Buffer {
+            data: Arc::new(storage),
+            shape: shape.to_vec(),
+            strides: calc_strides(shape, itemsize as isize),
+            dtype: dtype.clone(),
+            offset: 0,
+        }
+    };
+    let Some(out) = out else {
+        return Bound::new(py, allocate());
+    };
+    {
+        let target = out.borrow();
+        target.check_out(shape, dtype)?;
+        let target: &Buffer = &target;
+        if inputs.iter().any(|input| target.conflicts_with(input)) {
+            let result = allocate();
+            py.detach(|| unsafe { target.copy_from(&result) });
+        } else {
+            let (strides, offset) = target.element_layout(itemsize);
+            let ptr = SendPtr(target.data.as_ptr() as *mut u8);
+            py.detach(|| kernel(ptr.get(), &strides, offset));
+        }
+    }
+    Ok(out)
+}
+
 pub fn write_tensor_to_string<T>(tensor: PyRef<Buffer>, num_cols: usize) -> String
 where
     T: Clone + Display,
@@ -178,6 +365,8 @@ pub fn numpy(tensor: PyRef<Buffer>) -> String {
         DType::Int64 => write_tensor_to_string::<i64>(tensor, num_cols),
         DType::Float32 => write_tensor_to_string::<f32>(tensor, num_cols),
         DType::Float64 => write_tensor_to_string::<f64>(tensor, num_cols),
+        DType::Float16 => write_tensor_to_string::<F16>(tensor, num_cols),
+        DType::Bfloat16 => write_tensor_to_string::<BF16>(tensor, num_cols),
         _ => return "Not implemented".to_owned(),
     }
 }
@@ -186,27 +375,66 @@ pub fn numpy(tensor: PyRef<Buffer>) -> String {
 impl Buffer {
     // https://docs.python.org/3/c-api/typeobj.html#c.PyBufferProcs.bf_getbuffer
     // from https://docs.python.org/3/c-api/buffer.html
-    unsafe fn __getbuffer__(
-        slf: PyRefMut<'_, Self>,
-        view: *mut Py_buffer,
-        _flags: c_int,
-    ) -> PyResult<()> {
-        let itemsize = DType::get_byte_size(&slf.dtype);
-        let len = slf.shape.iter().product::<isize>();
+    // Exports the buffer with its strides and offset, numpy.asarray(buffer) is a view of it.
+    unsafe fn __getbuffer__(slf: Bound<'_, Self>, view: *mut Py_buffer, flags: c_int) -> PyResult<()> {
+        let buffer = slf.borrow();
+        let itemsize = (buffer.dtype.get_bit_size() / 8) as isize;
+        if flags & ffi::PyBUF_WRITABLE == ffi::PyBUF_WRITABLE && buffer.data.is_readonly() {
+            return Err(PyBufferError::new_err("buffer is read-only"));
+        }
+        let contiguous = buffer.strides == calc_strides(&buffer.shape, itemsize);
+        let wants_contiguous = [ffi::PyBUF_C_CONTIGUOUS, ffi::PyBUF_ANY_CONTIGUOUS]
+            .iter()
+            .any(|f| flags & f == *f);
+        if !contiguous && (flags & ffi::PyBUF_STRIDES != ffi::PyBUF_STRIDES || wants_contiguous) {
+            return Err(PyBufferError::new_err("buffer is not C-contiguous"));
+        }
+        let len = buffer.shape.iter().product::<isize>();
         unsafe {
-            (*view).buf = slf.data.as_ptr().add(slf.offset) as *mut c_void;
-            (*view).len = len * (itemsize as isize);
-            (*view).itemsize = itemsize as isize;
-            (*view).readonly = 0; // modifiable on
-            (*view).ndim = slf.shape.len() as c_int;
-            (*view).shape = slf.shape.as_ptr() as *mut isize;
-            (*view).strides = slf.strides.as_ptr() as *mut isize;
+            (*view).buf = buffer.data.as_ptr().add(buffer.offset) as *mut c_void;
+            (*view).len = len * itemsize;
+            (*view).itemsize = itemsize;
+            (*view).readonly = buffer.data.is_readonly() as c_int;
+            (*view).format = match flags & ffi::PyBUF_FORMAT {
+                0 => std::ptr::null_mut(),
+                _ => buffer.dtype.format_cstr().as_ptr() as *mut c_char,
+            };
+            (*view).ndim = buffer.shape.len() as c_int;
+            (*view).shape = match flags & ffi::PyBUF_ND {
+                0 => std::ptr::null_mut(),
+                _ => buffer.shape.as_ptr() as *mut isize,
+            };
+            (*view).strides = match flags & ffi::PyBUF_STRIDES == ffi::PyBUF_STRIDES {
+                true => buffer.strides.as_ptr() as *mut isize,
+                false => std::ptr::null_mut(),
+            };
             (*view).suboffsets = std::ptr::null_mut();
             (*view).internal = std::ptr::null_mut() as *mut c_void;
         }
+        drop(buffer);
+        // the export holds a reference to this Buffer, shape, strides and storage stay alive with it
+        unsafe { (*view).obj = slf.into_any().into_ptr() };
         Ok(())
     }
 
+    // true when no other buffer (a view) shares the storage, a kernel may then reuse it for its
+    // result once the buffer itself is dead
+    #[getter]
+    fn unique(&self) -> bool {
+        Arc::strong_count(&self.data) == 1
+    }
+
+    // false when the memory may not be written, e.g. a wrapped `bytes` object
+    #[getter]
+    fn writable(&self) -> bool {
+        !self.data.is_readonly()
+    }
+
+    #[getter]
+    fn format(&self) -> String {
+        self.dtype.format_char().to_string()
+    }
+
     fn view(&self, view: View) -> Self {
         Self {
             data: self.data.clone(),
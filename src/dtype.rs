@@ -1,4 +1,7 @@
 use core::fmt;
+use std::ffi::CStr;
+
+use crate::half::{BF16, F16};
 
 #[derive(Debug, Clone, PartialEq, Eq)]
 pub enum DType {
@@ -56,7 +59,7 @@ impl DType {
             DType::Int8 => 8 / 8,
             DType::Int16 => 16 / 8,
             DType::Int32 => 32 / 8,
-            DType::Int64 => 8 / 8,
+            DType::Int64 => 64 / 8,
             DType::Uint8 => 8 / 8,
             DType::Float16 => 16 / 8,
             DType::Float32 => 32 / 8,
@@ -65,6 +68,13 @@ impl DType {
         }
     }
 
+    pub fn is_float(&self) -> bool {
+        matches!(
+            self,
+            DType::Float16 | DType::Float32 | DType::Float64 | DType::Bfloat16
+        )
+    }
+
     pub fn format_char(&self) -> char {
         // https://numpy.org/devdocs/reference/arrays.dtypes.html
         match self {
@@ -81,6 +91,47 @@ impl DType {
         }
     }
 
+    // format string handed out through the buffer protocol
+    pub fn format_cstr(&self) -> &'static CStr {
+        match self {
+            DType::Bool => c"?",
+            DType::Int8 => c"b",
+            DType::Int16 => c"h",
+            DType::Int32 => c"i",
+            DType::Int64 => c"q",
+            DType::Uint8 => c"B",
+            DType::Float16 => c"e",
+            DType::Float32 => c"f",
+            DType::Float64 => c"d",
+            DType::Bfloat16 => c"v",
+        }
+    }
+
+    // Parses the struct-style format of a buffer export. Integer codes are resolved by their
+    // size (numpy exports int64 as 'l' on most platforms), non-native byte orders are rejected.
+    pub fn from_buffer_format(format: &str, itemsize: usize) -> Option<DType> {
+        let code = match format.as_bytes() {
+            [c] => *c,
+            [b'@' | b'=', c] => *c,
+            [b'<', c] if cfg!(target_endian = "little") => *c,
+            [b'>' | b'!', c] if cfg!(target_endian = "big") => *c,
+            _ => return None,
+        };
+        let dtype = match (code, itemsize) {
+            (b'?', 1) => DType::Bool,
+            (b'B', 1) => DType::Uint8,
+            (b'b' | b'h' | b'i' | b'l' | b'q', 1) => DType::Int8,
+            (b'b' | b'h' | b'i' | b'l' | b'q', 2) => DType::Int16,
+            (b'b' | b'h' | b'i' | b'l' | b'q', 4) => DType::Int32,
+            (b'b' | b'h' | b'i' | b'l' | b'q', 8) => DType::Int64,
+            (b'e', 2) => DType::Float16,
+            (b'f', 4) => DType::Float32,
+            (b'd', 8) => DType::Float64,
+            _ => return None,
+        };
+        Some(dtype)
+    }
+
     pub fn from_str(string: &str) -> DType {
         match string {
             "?" => DType::Bool,
@@ -97,3 +148,197 @@ impl DType {
         }
     }
 }
+
+// Rust element types that kernels can be instantiated with. Conversions mirror `as`:
+// integers go through i64 and floats through f64 so that every cast is a single rounding.
+// `Acc` is the type kernels accumulate and compute in, 16-bit floats are widened to f32
+// when they are loaded and rounded once when the result is stored.
+pub trait Element: Copy + Default + Send + Sync + 'static {
+    const IS_FLOAT: bool;
+    type Acc: Element + PartialOrd;
+    fn to_i64(self) -> i64;
+    fn to_f64(self) -> f64;
+    fn from_i64(v: i64) -> Self;
+    fn from_f64(v: f64) -> Self;
+    fn to_acc(self) -> Self::Acc;
+    fn from_acc(v: Self::Acc) -> Self;
+    fn add(self, other: Self) -> Self;
+    fn sub(self, other: Self) -> Self;
+    fn mul(self, other: Self) -> Self;
+
+    #[inline(always)]
+    fn cast_from<T: Element>(v: T) -> Self {
+        if T::IS_FLOAT {
+            Self::from_f64(v.to_f64())
+        } else {
+            Self::from_i64(v.to_i64())
+        }
+    }
+}
+
+macro_rules! impl_int_element {
+    ($($t:ty),*) => {$(
+        impl Element for $t {
+            const IS_FLOAT: bool = false;
+            type Acc = $t;
+            #[inline(always)] fn to_i64(self) -> i64 { self as i64 }
+            #[inline(always)] fn to_f64(self) -> f64 { self as f64 }
+            #[inline(always)] fn from_i64(v: i64) -> Self { v as $t }
+            #[inline(always)] fn from_f64(v: f64) -> Self { v as $t }
+            #[inline(always)] fn to_acc(self) -> Self { self }
+            #[inline(always)] fn from_acc(v: Self) -> Self { v }
+            #[inline(always)] fn add(self, other: Self) -> Self { self.wrapping_add(other) }
+            #[inline(always)] fn sub(self, other: Self) -> Self { self.wrapping_sub(other) }
+            #[inline(always)] fn mul(self, other: Self) -> Self { self.wrapping_mul(other) }
+        }
+    )*};
+}
+
+macro_rules! impl_float_element {
+    ($($t:ty),*) => {$(
+        impl Element for $t {
+            const IS_FLOAT: bool = true;
+            type Acc = $t;
+            #[inline(always)] fn to_i64(self) -> i64 { self as i64 }
+            #[inline(always)] fn to_f64(self) -> f64 { self as f64 }
+            #[inline(always)] fn from_i64(v: i64) -> Self { v as $t }
+            #[inline(always)] fn from_f64(v: f64) -> Self { v as $t }
+            #[inline(always)] fn to_acc(self) -> Self { self }
+            #[inline(always)] fn from_acc(v: Self) -> Self { v }
+            #[inline(always)] fn add(self, other: Self) -> Self { self + other }
+            #[inline(always)] fn sub(self, other: Self) -> Self { self - other }
+            #[inline(always)] fn mul(self, other: Self) -> Self { self * other }
+        }
+    )*};
+}
+
+// Single ops on 16-bit floats are exact in f64 (f16) or rounded from it without a double
+// rounding error (bf16, f64 has more than twice its precision).
+macro_rules! impl_half_element {
+    ($($t:ty),*) => {$(
+        impl Element for $t {
+            const IS_FLOAT: bool = true;
+            type Acc = f32;
+            #[inline(always)] fn to_i64(self) -> i64 { self.to_f32() as i64 }
+            #[inline(always)] fn to_f64(self) -> f64 { self.to_f32() as f64 }
+            #[inline(always)] fn from_i64(v: i64) -> Self { <$t>::from_f64(v as f64) }
+            #[inline(always)] fn from_f64(v: f64) -> Self { <$t>::from_f64(v) }
+            #[inline(always)] fn to_acc(self) -> f32 { self.to_f32() }
+            #[inline(always)] fn from_acc(v: f32) -> Self { <$t>::from_f64(v as f64) }
+            #[inline(always)] fn add(self, other: Self) -> Self { <$t>::from_f64(self.to_f64() + other.to_f64()) }
+            #[inline(always)] fn sub(self, other: Self) -> Self { <$t>::from_f64(self.to_f64() - other.to_f64()) }
+            #[inline(always)] fn mul(self, other: Self) -> Self { <$t>::from_f64(self.to_f64() * other.to_f64()) }
+        }
+    )*};
+}
+
+impl_int_element!(i8, i16, i32, i64, u8);
+impl_float_element!(f32, f64);
+impl_half_element!(F16, BF16);
+
+// A bool stored as one byte. Any non-zero byte is true, results are always 0 or 1.
+// Like numpy, `add` is a logical or and `mul` a logical and.
+#[derive(Clone, Copy, Default, Debug)]
+#[repr(transparent)]
+pub struct Bool(pub u8);
+
+impl Bool {
+    #[inline(always)]
+    pub fn get(self) -> bool {
+        self.0 != 0
+    }
+}
+
+impl PartialEq for Bool {
+    fn eq(&self, other: &Self) -> bool {
+        self.get() == other.get()
+    }
+}
+
+impl PartialOrd for Bool {
+    fn partial_cmp(&self, other: &Self) -> Option<std::cmp::Ordering> {
+        self.get().partial_cmp(&other.get())
+    }
+}
+
+impl fmt::Display for Bool {
+    fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
+        fmt::Display::fmt(&self.get(), f)
+    }
+}
+
+impl Element for Bool {
+    const IS_FLOAT: bool = false;
+    type Acc = Bool;
+    #[inline(always)] fn to_i64(self) -> i64 { self.get() as i64 }
+    #[inline(always)] fn to_f64(self) -> f64 { self.get() as i64 as f64 }
+    #[inline(always)] fn from_i64(v: i64) -> Self { Bool((v != 0) as u8) }
+    #[inline(always)] fn from_f64(v: f64) -> Self { Bool((v != 0.0) as u8) }
+    #[inline(always)] fn to_acc(self) -> Self { self }
+    #[inline(always)] fn from_acc(v: Self) -> Self { v }
+    #[inline(always)] fn add(self, other: Self) -> Self { Bool((self.get() || other.get()) as u8) }
+    #[inline(always)] fn sub(self, other: Self) -> Self { Bool((self.get() != other.get()) as u8) }
+    #[inline(always)] fn mul(self, other: Self) -> Self { Bool((self.get() && other.get()) as u8) }
+}
+
+// Binds `$T` to the Rust element type of `$dtype` and evaluates `$body`,
+// dtypes without an element type evaluate `$fallback` (every dtype has one at the moment).
+macro_rules! dispatch_dtype {
+    ($dtype:expr, $T:ident => $body:expr, $fallback:expr) => {
+        match $dtype {
+            $crate::dtype::DType::Int8 => {
+                #[allow(dead_code)]
+                type $T = i8;
+                $body
+            }
+            $crate::dtype::DType::Int16 => {
+                #[allow(dead_code)]
+                type $T = i16;
+                $body
+            }
+            $crate::dtype::DType::Int32 => {
+                #[allow(dead_code)]
+                type $T = i32;
+                $body
+            }
+            $crate::dtype::DType::Int64 => {
+                #[allow(dead_code)]
+                type $T = i64;
+                $body
+            }
+            $crate::dtype::DType::Uint8 => {
+                #[allow(dead_code)]
+                type $T = u8;
+                $body
+            }
+            $crate::dtype::DType::Bool => {
+                #[allow(dead_code)]
+                type $T = $crate::dtype::Bool;
+                $body
+            }
+            $crate::dtype::DType::Float16 => {
+                #[allow(dead_code)]
+                type $T = $crate::half::F16;
+                $body
+            }
+            $crate::dtype::DType::Bfloat16 => {
+                #[allow(dead_code)]
+                type $T = $crate::half::BF16;
+                $body
+            }
+            $crate::dtype::DType::Float32 => {
+                #[allow(dead_code)]
+                type $T = f32;
+                $body
+            }
+            $crate::dtype::DType::Float64 => {
+                #[allow(dead_code)]
+                type $T = f64;
+                $body
+            }
+            #[allow(unreachable_patterns)]
+            _ => $fallback,
+        }
+    };
+}
+pub(crate) use dispatch_dtype;
@@ -0,0 +1,156 @@
+// 16-bit float element types.
+//
+// Rust has no stable f16, both formats are kept as their bit pattern and converted in
+// software. Narrowing rounds to nearest even straight from f64, so a cast rounds once;
+// NaN stays NaN and magnitudes past the largest finite value become infinities. Widening
+// to f32 is exact, kernels compute on f32 values and only round when they store.
+
+use std::cmp::Ordering;
+use std::fmt;
+
+// IEEE 754 binary16: 5 exponent and 10 mantissa bits
+#[derive(Clone, Copy, Default, Debug)]
+#[repr(transparent)]
+pub struct F16(pub u16);
+
+// bfloat16: the upper half of a binary32, 8 exponent and 7 mantissa bits
+#[derive(Clone, Copy, Default, Debug)]
+#[repr(transparent)]
+pub struct BF16(pub u16);
+
+// Rounds `v` to a binary float with `EXP` exponent and `MAN` mantissa bits and returns its bits.
+pub fn narrow<const EXP: u32, const MAN: u32>(v: f64) -> u16 {
+    let bits = v.to_bits();
+    let sign = ((bits >> 63) as u16) << 15;
+    let exp = ((bits >> 52) & 0x7ff) as i64;
+    let man = bits & ((1u64 << 52) - 1);
+    let inf = ((1u16 << EXP) - 1) << MAN;
+    if exp == 0x7ff {
+        return sign | inf | if man != 0 { 1 << (MAN - 1) } else { 0 };
+    }
+    if exp == 0 {
+        // f64 subnormals are far below the smallest 16-bit subnormal
+        return sign;
+    }
+    // biased exponent of the result, results with e <= 0 are subnormal and drop more bits
+    let e = exp - 1023 + (1 << (EXP - 1)) - 1;
+    let shift = (52 - MAN) as i64 + if e <= 0 { 1 - e } else { 0 };
+    if shift > 53 {
+        return sign;
+    }
+    let full = man | (1u64 << 52);
+    let mut m = full >> shift;
+    let rem = full & ((1u64 << shift) - 1);
+    let half = 1u64 << (shift - 1);
+    if rem > half || (rem == half && m & 1 == 1) {
+        m += 1;
+    }
+    // normal results carry the implicit bit at position MAN, adding it on top of the exponent
+    // field also handles a rounding carry into the next binade (and from subnormal to normal)
+    let out = if e <= 0 { m } else { (((e - 1) as u64) << MAN) + m };
+    if out >= inf as u64 {
+        return sign | inf;
+    }
+    sign | out as u16
+}
+
+impl F16 {
+    #[inline(always)]
+    pub fn to_f32(self) -> f32 {
+        let h = self.0 as u32;
+        let sign = (h >> 15) << 31;
+        let (exp, man) = ((h >> 10) & 0x1f, h & 0x3ff);
+        match exp {
+            0x1f => f32::from_bits(sign | 0x7f80_0000 | (man << 13)),
+            0 => {
+                let v = man as f32 * (1.0 / 16_777_216.0); // man * 2^-24, exact
+                if sign != 0 { -v } else { v }
+            }
+            _ => f32::from_bits(sign | ((exp + 112) << 23) | (man << 13)),
+        }
+    }
+    #[inline(always)]
+    pub fn from_f64(v: f64) -> F16 {
+        F16(narrow::<5, 10>(v))
+    }
+}
+
+impl BF16 {
+    #[inline(always)]
+    pub fn to_f32(self) -> f32 {
+        f32::from_bits((self.0 as u32) << 16)
+    }
+    #[inline(always)]
+    pub fn from_f64(v: f64) -> BF16 {
+        BF16(narrow::<8, 7>(v))
+    }
+}
+
+macro_rules! impl_half_traits {
+    ($($t:ty),*) => {$(
+        impl PartialEq for $t {
+            fn eq(&self, other: &Self) -> bool {
+                self.to_f32() == other.to_f32()
+            }
+        }
+        impl PartialOrd for $t {
+            fn partial_cmp(&self, other: &Self) -> Option<Ordering> {
+                self.to_f32().partial_cmp(&other.to_f32())
+            }
+        }
+        impl fmt::Display for $t {
+            fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
+                fmt::Display::fmt(&self.to_f32(), f)
+            }
+        }
+    )*};
+}
+
+impl_half_traits!(F16, BF16);
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn f16_round_trips_every_value() {
+        for bits in 0..=u16::MAX {
+            let h = F16(bits);
+            let back = F16::from_f64(h.to_f32() as f64);
+            if h.to_f32().is_nan() {
+                assert!(back.to_f32().is_nan());
+            } else {
+                assert_eq!(back.0, bits, "{bits:#06x}");
+            }
+        }
+    }
+
+    #[test]
+    fn bf16_round_trips_every_value() {
+        for bits in 0..=u16::MAX {
+            let h = BF16(bits);
+            let back = BF16::from_f64(h.to_f32() as f64);
+            if h.to_f32().is_nan() {
+                assert!(back.to_f32().is_nan());
+            } else {
+                assert_eq!(back.0, bits, "{bits:#06x}");
+            }
+        }
+    }
+
+    #[test]
+    fn rounds_to_nearest_even() {
+        assert_eq!(F16::from_f64(1.0 + 2f64.powi(-11)).0, F16::from_f64(1.0).0); // tie, even stays
+        assert_eq!(F16::from_f64(1.0 + 3.0 * 2f64.powi(-11)).to_f32(), 1.0 + 2f32.powi(-9)); // tie, odd rounds up
+        assert_eq!(F16::from_f64(1.0 + 2f64.powi(-11) + 2f64.powi(-30)).to_f32(), 1.0 + 2f32.powi(-10));
+        assert_eq!(F16::from_f64(65519.0).to_f32(), 65504.0);
+        assert!(F16::from_f64(65520.0).to_f32().is_infinite());
+        assert_eq!(F16::from_f64(2f64.powi(-25)).0, 0); // half the smallest subnormal ties to zero
+        assert_eq!(F16::from_f64(1.5 * 2f64.powi(-25)).0, 1);
+        assert_eq!(F16::from_f64(-0.0).0, 0x8000);
+        assert_eq!(BF16::from_f64(1.0 + 2f64.powi(-8)).to_f32(), 1.0);
+        assert_eq!(BF16::from_f64(3.14159).to_f32(), 3.140625);
+        assert!(BF16::from_f64(f64::MAX).to_f32().is_infinite());
+        assert!(BF16::from_f64(f64::NAN).to_f32().is_nan());
+    }
+}
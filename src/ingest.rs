@@ -0,0 +1,179 @@
+// Single pass ingestion of nested Python lists.
+//
+// The shape is read off the first element of every nesting level. One walk over the nested
+// lists/tuples then checks that every level has exactly that length, reads every scalar once
+// and appends it to a native vector while tracking the dtype it needs (bool < int < float).
+// The vector is converted into a storage of the target dtype by a final loop over memory.
+// No flattened copy, per element shape lists or argument tuples are built on the Python side.
+
+use std::sync::Arc;
+
+use crate::buffer::Buffer;
+use crate::dtype::{DType, Element, dispatch_dtype};
+use crate::helpers::calc_strides;
+use crate::storage::Storage;
+use pyo3::exceptions::{PyNotImplementedError, PyTypeError, PyValueError};
+use pyo3::prelude::*;
+use pyo3::types::{PyBool, PyFloat, PyInt, PyList, PyTuple};
+
+enum Values {
+    Int(Vec<i64>),
+    Float(Vec<f64>),
+}
+
+struct Ingest {
+    values: Values,
+    all_bool: bool,
+}
+
+fn inhomogeneous() -> PyErr {
+    PyValueError::new_err("inhomogeneous shape, all sequences of a level must have the same length")
+}
+
+// length and first item of a list or tuple, None for anything else
+fn sequence_head<'py>(obj: &Bound<'py, PyAny>) -> Option<(usize, Option<Bound<'py, PyAny>>)> {
+    if let Ok(list) = obj.downcast::<PyList>() {
+        return Some((list.len(), list.get_item(0).ok()));
+    }
+    if let Ok(tuple) = obj.downcast::<PyTuple>() {
+        return Some((tuple.len(), tuple.get_item(0).ok()));
+    }
+    None
+}
+
+impl Ingest {
+    fn with_capacity(numel: usize) -> Ingest {
+        Ingest {
+            values: Values::Int(Vec::with_capacity(numel)),
+            all_bool: true,
+        }
+    }
+
+    #[inline]
+    fn push(&mut self, obj: &Bound<'_, PyAny>) -> PyResult<()> {
+        if obj.is_instance_of::<PyBool>() {
+            let v = obj.is_truthy()? as i64;
+            match &mut self.values {
+                Values::Int(ints) => ints.push(v),
+                Values::Float(floats) => floats.push(v as f64),
+            }
+            return Ok(());
+        }
+        self.all_bool = false;
+        if obj.is_instance_of::<PyInt>() {
+            let v = obj.extract::<i64>()?;
+            match &mut self.values {
+                Values::Int(ints) => ints.push(v),
+                Values::Float(floats) => floats.push(v as f64),
+            }
+            return Ok(());
+        }
+        // floats and anything implementing __float__ (numpy scalars)
+        let v = match obj.is_instance_of::<PyFloat>() {
+            true => obj.extract::<f64>()?,
+            false => obj.extract::<f64>().map_err(|_| {
+                PyTypeError::new_err(format!("cannot build a tensor from {}", obj.get_type()))
+            })?,
+        };
+        if let Values::Int(ints) = &mut self.values {
+            // the first float turns the values read so far into floats
+            let mut floats = Vec::with_capacity(ints.capacity());
+            floats.extend(ints.iter().map(|v| *v as f64));
+            self.values = Values::Float(floats);
+        }
+        if let Values::Float(floats) = &mut self.values {
+            floats.push(v);
+        }
+        Ok(())
+    }
+
+    fn walk(&mut self, obj: &Bound<'_, PyAny>, shape: &[usize]) -> PyResult<()> {
+        let Some((&len, inner)) = shape.split_first() else {
+            if sequence_head(obj).is_some() {
+                return Err(inhomogeneous());
+            }
+            return self.push(obj);
+        };
+        if let Ok(list) = obj.downcast::<PyList>() {
+            if list.len() != len {
+                return Err(inhomogeneous());
+            }
+            for item in list.iter() {
+                self.walk(&item, inner)?;
+            }
+            return Ok(());
+        }
+        if let Ok(tuple) = obj.downcast::<PyTuple>() {
+            if tuple.len() != len {
+                return Err(inhomogeneous());
+            }
+            for item in tuple.iter() {
+                self.walk(&item, inner)?;
+            }
+            return Ok(());
+        }
+        Err(inhomogeneous())
+    }
+
+    fn dtype(&self, numel: usize) -> DType {
+        match self.values {
+            Values::Float(_) => DType::Float64,
+            Values::Int(_) if self.all_bool && numel > 0 => DType::Bool,
+            Values::Int(_) => DType::Int64,
+        }
+    }
+
+    fn into_storage(self, dtype: &DType) -> PyResult<Storage> {
+        dispatch_dtype!(dtype, T => {
+            let n = match &self.values {
+                Values::Int(v) => v.len(),
+                Values::Float(v) => v.len(),
+            };
+            let mut storage = Storage::allocate(n * std::mem::size_of::<T>());
+            if n > 0 {
+                let out = unsafe { std::slice::from_raw_parts_mut(storage.as_mut_ptr() as *mut T, n) };
+                match &self.values {
+                    Values::Int(v) => out.iter_mut().zip(v).for_each(|(o, x)| *o = T::from_i64(*x)),
+                    Values::Float(v) => out.iter_mut().zip(v).for_each(|(o, x)| *o = T::from_f64(*x)),
+                }
+            }
+            Ok(storage)
+        }, Err(PyNotImplementedError::new_err(format!("cannot build {dtype} tensors from lists"))))
+    }
+}
+
+// Builds a contiguous buffer from nested lists/tuples of bool, int and float. Without a format
+// the dtype is inferred like numpy does: bool if every element is a bool, int64 if they are all
+// ints, float64 otherwise.
+#[pyfunction]
+#[pyo3(signature = (data, fmt=None))]
+pub fn buffer_from_list(data: &Bound<'_, PyAny>, fmt: Option<&str>) -> PyResult<Buffer> {
+    let mut shape = vec![];
+    let mut level = data.clone();
+    while let Some((len, first)) = sequence_head(&level) {
+        shape.push(len);
+        match first {
+            Some(first) => level = first,
+            None => break,
+        }
+    }
+    if shape.is_empty() {
+        return Err(PyTypeError::new_err("buffer_from_list expects a list or a tuple"));
+    }
+    let numel = shape.iter().product::<usize>();
+    let mut ingest = Ingest::with_capacity(numel);
+    ingest.walk(data, &shape)?;
+    let dtype = match fmt {
+        Some(fmt) => DType::from_str(fmt),
+        None => ingest.dtype(numel),
+    };
+    let itemsize = dtype.get_bit_size() / 8;
+    let shape: Vec<isize> = shape.iter().map(|d| *d as isize).collect();
+    Ok(Buffer {
+        data: Arc::new(ingest.into_storage(&dtype)?),
+        strides: calc_strides(&shape, itemsize),
+        shape,
+        dtype,
+        offset: 0,
+    })
+}
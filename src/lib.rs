@@ -1,15 +1,28 @@
+use arena::{arena_stats, clear_arena, reset_arena_stats};
 use buffer::{Buffer, numpy};
+use ingest::buffer_from_list;
+use ops::copy::contiguous;
+use ops::fused::fused_elementwise;
+use ops::matmul::matmul;
 use ops::ops::{add_tensors, mul_tensors};
+use ops::optim::{adam_step, sgd_step};
+use ops::reduce::reduce;
+use parallel::{get_num_threads, set_local_num_threads, set_num_threads};
 // use ops::select::slice_buffer;
 use pyo3::prelude::*;
 use pyo3::wrap_pyfunction;
 use view::View;
 
+pub mod arena;
 pub mod buffer;
 pub mod dtype;
+pub mod half;
 pub mod helpers;
+pub mod ingest;
 pub mod ops;
+pub mod parallel;
 pub mod storage;
+pub mod strided;
 pub mod view;
 
 #[pymodule]
@@ -18,6 +31,19 @@ fn autograd_core(m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_class::<View>()?;
     m.add_function(wrap_pyfunction!(add_tensors, m)?)?;
     m.add_function(wrap_pyfunction!(mul_tensors, m)?)?;
+    m.add_function(wrap_pyfunction!(fused_elementwise, m)?)?;
+    m.add_function(wrap_pyfunction!(contiguous, m)?)?;
+    m.add_function(wrap_pyfunction!(matmul, m)?)?;
+    m.add_function(wrap_pyfunction!(reduce, m)?)?;
+    m.add_function(wrap_pyfunction!(sgd_step, m)?)?;
+    m.add_function(wrap_pyfunction!(adam_step, m)?)?;
     m.add_function(wrap_pyfunction!(numpy, m)?)?;
+    m.add_function(wrap_pyfunction!(buffer_from_list, m)?)?;
+    m.add_function(wrap_pyfunction!(arena_stats, m)?)?;
+    m.add_function(wrap_pyfunction!(reset_arena_stats, m)?)?;
+    m.add_function(wrap_pyfunction!(clear_arena, m)?)?;
+    m.add_function(wrap_pyfunction!(set_num_threads, m)?)?;
+    m.add_function(wrap_pyfunction!(get_num_threads, m)?)?;
+    m.add_function(wrap_pyfunction!(set_local_num_threads, m)?)?;
     Ok(())
 }
@@ -0,0 +1,70 @@
+// Strided copy into a new dense buffer, the kernel of the CONTIGUOUS op.
+//
+// The copy does not look at the values, elements are moved as unsigned integers of the
+// item size. The StridedLoop merges the dims that are contiguous in the source, every inner
+// run with unit stride is a single memcpy, broadcast runs (stride 0) are a fill and the
+// others are gathered element by element. Large copies are split over the worker threads.
+
+use std::sync::Arc;
+
+use crate::buffer::Buffer;
+use crate::helpers::calc_strides;
+use crate::parallel::{SendPtr, parallel_for};
+use crate::storage::Storage;
+use crate::strided::{StridedLoop, dense_strides, to_elements};
+use pyo3::exceptions::PyNotImplementedError;
+use pyo3::prelude::*;
+
+unsafe fn copy_strided<T: Copy>(lp: &StridedLoop, out: *mut T, a: *const T) {
+    if lp.numel() == 0 {
+        return;
+    }
+    let sa = lp.inner_strides()[1];
+    let (out, a) = (SendPtr(out), SendPtr(a as *mut T));
+    parallel_for(lp.numel(), |start, end| {
+        let (out, a) = (out.get(), a.get());
+        // the output is dense, its inner stride is 1
+        lp.for_each_run_in(start, end, |o, len| unsafe {
+            let (po, pa) = (out.offset(o[0]), a.offset(o[1]) as *const T);
+            match sa {
+                1 => std::ptr::copy_nonoverlapping(pa, po, len),
+                0 => std::slice::from_raw_parts_mut(po, len).fill(*pa),
+                _ => {
+                    for i in 0..len as isize {
+                        *po.offset(i) = *pa.offset(i * sa);
+                    }
+                }
+            }
+        });
+    });
+}
+
+// A dense copy of `a` with the same shape and dtype, `a` may be in any layout.
+#[pyfunction]
+pub fn contiguous(py: Python<'_>, a: PyRef<Buffer>) -> PyResult<Buffer> {
+    let itemsize = (a.dtype.get_bit_size() / 8) as usize;
+    if ![1, 2, 4, 8].contains(&itemsize) {
+        return Err(PyNotImplementedError::new_err(format!("cannot copy {} buffers", a.dtype)));
+    }
+    let a = Buffer::clone(&a);
+    let mut output = Storage::allocate(a.numel() * itemsize);
+    let (strides, offset) = to_elements(&a.strides, a.offset, itemsize);
+    let lp = StridedLoop::new(&a.shape, &[&dense_strides(&a.shape), &strides], &[0, offset]);
+    let (out, src) = (SendPtr(output.as_mut_ptr()), SendPtr(a.data.as_ptr() as *mut u8));
+    // the kernel only touches Rust memory, other Python threads keep running meanwhile
+    py.detach(|| unsafe {
+        match itemsize {
+            1 => copy_strided::<u8>(&lp, out.get(), src.get()),
+            2 => copy_strided::<u16>(&lp, out.get() as *mut u16, src.get() as *const u16),
+            4 => copy_strided::<u32>(&lp, out.get() as *mut u32, src.get() as *const u32),
+            _ => copy_strided::<u64>(&lp, out.get() as *mut u64, src.get() as *const u64),
+        }
+    });
+    Ok(Buffer {
+        data: Arc::new(output),
+        strides: calc_strides(&a.shape, itemsize as isize),
+        shape: a.shape,
+        dtype: a.dtype,
+        offset: 0,
+    })
+}
@@ -0,0 +1,272 @@
+// Fused elementwise kernels.
+//
+// The scheduler groups chains of elementwise ops into a small register program
+// (one register per instruction, the last register is the result). The program is
+// evaluated block by block: every inner run of the strided loop is cut into blocks of
+// at most `BLOCK` elements, inputs are gathered into registers, the arithmetic runs
+// on registers that stay in L1 and only the final register is written to memory.
+// Intermediates of the group never touch main memory.
+
+use crate::buffer::{Buffer, write_output};
+use crate::dtype::{DType, Element, dispatch_dtype};
+use crate::parallel::{SendPtr, parallel_for};
+use crate::strided::StridedLoop;
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+
+pub const BLOCK: usize = 1024;
+
+#[derive(Debug, Clone)]
+pub enum Instr {
+    // gather input buffer `n`
+    Load(usize, DType),
+    // immediate value, ints are kept as i64 and floats as f64
+    Const(i64, f64, DType),
+    Add(usize, usize, DType),
+    Mul(usize, usize, DType),
+    Cast(usize, DType),
+}
+
+impl Instr {
+    pub fn dtype(&self) -> &DType {
+        match self {
+            Instr::Load(_, dt)
+            | Instr::Const(_, _, dt)
+            | Instr::Add(_, _, dt)
+            | Instr::Mul(_, _, dt)
+            | Instr::Cast(_, dt) => dt,
+        }
+    }
+}
+
+// A kernel input in element units.
+pub struct Operand {
+    pub ptr: *const u8,
+    pub dtype: DType,
+    pub strides: Vec<isize>,
+    pub offset: isize,
+}
+
+// inputs are only read, and the buffers they point into outlive the kernel
+unsafe impl Send for Operand {}
+unsafe impl Sync for Operand {}
+
+// Checks register references and dtypes, returns the dtype of the result.
+pub fn validate(program: &[Instr], inputs: &[Operand]) -> Result<DType, String> {
+    let Some(last) = program.last() else {
+        return Err("fused program is empty".to_owned());
+    };
+    for (i, instr) in program.iter().enumerate() {
+        let supported = dispatch_dtype!(instr.dtype(), T => true, false);
+        if !supported {
+            return Err(format!("fused kernels do not support {}", instr.dtype()));
+        }
+        let regs: Vec<usize> = match instr {
+            Instr::Load(n, dt) => {
+                match inputs.get(*n) {
+                    Some(op) if op.dtype == *dt => {}
+                    Some(op) => return Err(format!("load of input {n} expects {dt}, got {}", op.dtype)),
+                    None => return Err(format!("load of missing input {n}")),
+                }
+                vec![]
+            }
+            Instr::Const(..) => vec![],
+            Instr::Add(a, b, _) | Instr::Mul(a, b, _) => vec![*a, *b],
+            Instr::Cast(a, _) => vec![*a],
+        };
+        for r in regs {
+            if r >= i {
+                return Err(format!("instruction {i} reads register {r} before it is written"));
+            }
+        }
+        if let Instr::Add(a, b, dt) | Instr::Mul(a, b, dt) = instr {
+            if program[*a].dtype() != dt || program[*b].dtype() != dt {
+                return Err(format!("instruction {i} mixes dtypes, cast operands to {dt} first"));
+            }
+        }
+    }
+    Ok(last.dtype().clone())
+}
+
+#[inline(always)]
+fn reg<T>(r: &[u64]) -> &[T] {
+    unsafe { std::slice::from_raw_parts(r.as_ptr() as *const T, BLOCK) }
+}
+
+#[inline(always)]
+fn reg_mut<T>(r: &mut [u64]) -> &mut [T] {
+    unsafe { std::slice::from_raw_parts_mut(r.as_mut_ptr() as *mut T, BLOCK) }
+}
+
+#[inline(always)]
+unsafe fn load<T: Element>(dst: &mut [u64], src: *const T, stride: isize, n: usize) {
+    let dst = &mut reg_mut::<T>(dst)[..n];
+    unsafe {
+        if stride == 1 {
+            dst.copy_from_slice(std::slice::from_raw_parts(src, n));
+        } else if stride == 0 {
+            dst.fill(*src);
+        } else {
+            for (i, d) in dst.iter_mut().enumerate() {
+                *d = *src.offset(i as isize * stride);
+            }
+        }
+    }
+}
+
+#[inline(always)]
+unsafe fn store<T: Element>(dst: *mut T, stride: isize, src: &[u64], n: usize) {
+    let src = &reg::<T>(src)[..n];
+    unsafe {
+        if stride == 1 {
+            std::slice::from_raw_parts_mut(dst, n).copy_from_slice(src);
+        } else {
+            for (i, s) in src.iter().enumerate() {
+                *dst.offset(i as isize * stride) = *s;
+            }
+        }
+    }
+}
+
+#[inline(always)]
+fn binary<T: Element>(dst: &mut [u64], a: &[u64], b: &[u64], n: usize, f: fn(T, T) -> T) {
+    let (a, b) = (&reg::<T>(a)[..n], &reg::<T>(b)[..n]);
+    for ((d, x), y) in reg_mut::<T>(dst)[..n].iter_mut().zip(a).zip(b) {
+        *d = f(*x, *y);
+    }
+}
+
+#[inline(always)]
+fn cast<S: Element, D: Element>(dst: &mut [u64], src: &[u64], n: usize) {
+    for (d, s) in reg_mut::<D>(dst)[..n].iter_mut().zip(&reg::<S>(src)[..n]) {
+        *d = D::cast_from(*s);
+    }
+}
+
+// Evaluates a validated program over `shape` and writes the result to `out` at the given
+// element strides and offset, large kernels are split over the worker threads.
+pub unsafe fn run_program(program: &[Instr], shape: &[isize], inputs: &[Operand], out: *mut u8, out_strides: &[isize], out_offset: isize) {
+    let mut strides: Vec<&[isize]> = vec![out_strides];
+    strides.extend(inputs.iter().map(|op| op.strides.as_slice()));
+    let mut offsets = vec![out_offset];
+    offsets.extend(inputs.iter().map(|op| op.offset));
+    let lp = StridedLoop::new(shape, &strides, &offsets);
+    let out = SendPtr(out);
+    parallel_for(lp.numel(), |start, end| unsafe {
+        run_range(program, &lp, inputs, out.get(), start, end)
+    });
+}
+
+unsafe fn run_range(
+    program: &[Instr],
+    lp: &StridedLoop,
+    inputs: &[Operand],
+    out: *mut u8,
+    start: usize,
+    end: usize,
+) {
+    let mut regs: Vec<Vec<u64>> = program.iter().map(|_| vec![0u64; BLOCK]).collect();
+    for (i, instr) in program.iter().enumerate() {
+        if let Instr::Const(iv, fv, dt) = instr {
+            dispatch_dtype!(dt, T => {
+                let v = if T::IS_FLOAT { T::from_f64(*fv) } else { T::from_i64(*iv) };
+                reg_mut::<T>(&mut regs[i]).fill(v)
+            }, unreachable!())
+        }
+    }
+
+    let inner = lp.inner_strides().to_vec();
+    let result = program.len() - 1;
+    let out_dtype = program[result].dtype();
+    lp.for_each_run_in(start, end, |offs, len| {
+        let mut start = 0;
+        while start < len {
+            let n = BLOCK.min(len - start);
+            for (i, instr) in program.iter().enumerate() {
+                let (done, rest) = regs.split_at_mut(i);
+                let dst = &mut rest[0];
+                match instr {
+                    Instr::Load(k, dt) => {
+                        let stride = inner[k + 1];
+                        let at = offs[k + 1] + start as isize * stride;
+                        dispatch_dtype!(dt, T => unsafe {
+                            load::<T>(dst, (inputs[*k].ptr as *const T).offset(at), stride, n)
+                        }, unreachable!())
+                    }
+                    Instr::Const(..) => {}
+                    Instr::Add(a, b, dt) => {
+                        dispatch_dtype!(dt, T => binary::<T>(dst, &done[*a], &done[*b], n, <T as Element>::add), unreachable!())
+                    }
+                    Instr::Mul(a, b, dt) => {
+                        dispatch_dtype!(dt, T => binary::<T>(dst, &done[*a], &done[*b], n, <T as Element>::mul), unreachable!())
+                    }
+                    Instr::Cast(a, dt) => {
+                        dispatch_dtype!(program[*a].dtype(), S => {
+                            dispatch_dtype!(dt, D => cast::<S, D>(dst, &done[*a], n), unreachable!())
+                        }, unreachable!())
+                    }
+                }
+            }
+            let at = offs[0] + start as isize * inner[0];
+            dispatch_dtype!(out_dtype, T => unsafe {
+                store::<T>((out as *mut T).offset(at), inner[0], &regs[result], n)
+            }, unreachable!());
+            start += n;
+        }
+    });
+}
+
+fn parse_instr(t: &[Bound<'_, PyAny>]) -> PyResult<Instr> {
+    if t.len() < 3 {
+        return Err(PyValueError::new_err(format!("malformed fused instruction of length {}", t.len())));
+    }
+    let op: String = t[0].extract()?;
+    let dtype = DType::from_str(&t[t.len() - 1].extract::<String>()?);
+    Ok(match (op.as_str(), t.len()) {
+        ("load", 3) => Instr::Load(t[1].extract()?, dtype),
+        ("const", 3) if dtype.is_float() => Instr::Const(0, t[1].extract()?, dtype),
+        ("const", 3) => Instr::Const(t[1].extract()?, 0.0, dtype),
+        ("add", 4) => Instr::Add(t[1].extract()?, t[2].extract()?, dtype),
+        ("mul", 4) => Instr::Mul(t[1].extract()?, t[2].extract()?, dtype),
+        ("cast", 3) => Instr::Cast(t[1].extract()?, dtype),
+        _ => return Err(PyValueError::new_err(format!("unknown fused instruction {op}"))),
+    })
+}
+
+// Runs a fused elementwise program, `program` is a list of tuples built by the scheduler:
+// ("load", input, fmt), ("const", value, fmt), ("add", a, b, fmt), ("mul", a, b, fmt), ("cast", a, fmt).
+// The result is written to a new buffer, or in place into `out` (see `write_output`).
+#[pyfunction]
+#[pyo3(signature = (inputs, program, shape, out=None))]
+pub fn fused_elementwise<'py>(
+    py: Python<'py>,
+    inputs: Vec<PyRef<Buffer>>,
+    program: Vec<Vec<Bound<'py, PyAny>>>,
+    shape: Vec<isize>,
+    out: Option<Bound<'py, Buffer>>,
+) -> PyResult<Bound<'py, Buffer>> {
+    let program = program.iter().map(|t| parse_instr(t)).collect::<PyResult<Vec<Instr>>>()?;
+    let mut operands = Vec::with_capacity(inputs.len());
+    for input in inputs.iter() {
+        if input.shape != shape {
+            return Err(PyValueError::new_err(format!(
+                "fused input of shape {:?} does not match kernel shape {:?}",
+                input.shape, shape
+            )));
+        }
+        let itemsize = dispatch_dtype!(&input.dtype, T => std::mem::size_of::<T>(), DType::get_byte_size(&input.dtype));
+        let (strides, offset) = input.element_layout(itemsize);
+        operands.push(Operand {
+            ptr: input.data.as_ptr(),
+            dtype: input.dtype.clone(),
+            strides,
+            offset,
+        });
+    }
+    let dtype = validate(&program, &operands).map_err(PyValueError::new_err)?;
+    // `inputs` keeps the input storages alive while the kernel runs without the GIL
+    let buffers: Vec<&Buffer> = inputs.iter().map(|b| &**b).collect();
+    write_output(py, out, &buffers, &shape, &dtype, |ptr, strides, offset| unsafe {
+        run_program(&program, &shape, &operands, ptr, strides, offset)
+    })
+}
@@ -0,0 +1,290 @@
+// Cache-blocked matrix multiplication.
+//
+// C[b] = A[b] @ B[b] for every batch index b, A is (M, K), B is (K, N) and both may have
+// arbitrary element strides (transposed views and stride 0 broadcast batches are read
+// in place). The output is split into (batch, MC rows, NC columns) tiles that are handed
+// to the worker threads. For every tile the K dimension is walked in KC slices: a KC x NC
+// slice of B is packed into NR wide column panels (stays in L2), an MC x KC block of A into
+// MR high row panels (stays in L1/L2), and an MR x NR register tile of C is accumulated by
+// the micro kernel from the two packed panels. Panels and the C tile hold `T::Acc`: 16-bit
+// floats are widened while packing, accumulate in f32 over the whole K dimension and are
+// rounded once when the tile is written out.
+
+use std::sync::Arc;
+
+use crate::buffer::Buffer;
+use crate::dtype::{DType, Element, dispatch_dtype};
+use crate::helpers::calc_strides;
+use crate::parallel::{SendPtr, parallel_tasks};
+use crate::storage::Storage;
+use pyo3::exceptions::{PyNotImplementedError, PyValueError};
+use pyo3::prelude::*;
+
+const MR: usize = 4;
+const NR: usize = 8;
+const MC: usize = 128;
+const KC: usize = 256;
+const NC: usize = 512;
+
+// A strided matrix in element units.
+#[derive(Clone, Copy)]
+pub struct MatRef<T> {
+    pub ptr: *const T,
+    pub rs: isize,
+    pub cs: isize,
+}
+
+impl<T> MatRef<T> {
+    #[inline(always)]
+    unsafe fn at(&self, row: usize, col: usize) -> *const T {
+        unsafe { self.ptr.offset(row as isize * self.rs + col as isize * self.cs) }
+    }
+
+    #[inline(always)]
+    unsafe fn sub(self, row: usize, col: usize) -> MatRef<T> {
+        MatRef { ptr: unsafe { self.at(row, col) }, ..self }
+    }
+}
+
+// Packs the mc x kc block at `a` into row panels of MR rows stored k-major:
+// dst[panel * MR * kc + k * MR + i], rows past mc are zero.
+unsafe fn pack_a<T: Element>(dst: &mut [T::Acc], a: MatRef<T>, mc: usize, kc: usize) {
+    for p in 0..mc.div_ceil(MR) {
+        let rows = MR.min(mc - p * MR);
+        let panel = &mut dst[p * MR * kc..(p + 1) * MR * kc];
+        for i in 0..MR {
+            if i >= rows {
+                for k in 0..kc {
+                    panel[k * MR + i] = T::Acc::default();
+                }
+                continue;
+            }
+            let row = unsafe { a.at(p * MR + i, 0) };
+            for k in 0..kc {
+                panel[k * MR + i] = unsafe { *row.offset(k as isize * a.cs) }.to_acc();
+            }
+        }
+    }
+}
+
+// Packs the kc x nc block at `b` into column panels of NR columns stored k-major:
+// dst[panel * NR * kc + k * NR + j], columns past nc are zero.
+unsafe fn pack_b<T: Element>(dst: &mut [T::Acc], b: MatRef<T>, kc: usize, nc: usize) {
+    for p in 0..nc.div_ceil(NR) {
+        let cols = NR.min(nc - p * NR);
+        let panel = &mut dst[p * NR * kc..(p + 1) * NR * kc];
+        for k in 0..kc {
+            let row = unsafe { b.at(k, p * NR) };
+            let dst = &mut panel[k * NR..(k + 1) * NR];
+            if b.cs == 1 && cols == NR {
+                let src = unsafe { std::slice::from_raw_parts(row, NR) };
+                dst.iter_mut().zip(src).for_each(|(d, s)| *d = s.to_acc());
+                continue;
+            }
+            for j in 0..NR {
+                dst[j] = if j < cols {
+                    unsafe { *row.offset(j as isize * b.cs) }.to_acc()
+                } else {
+                    T::Acc::default()
+                };
+            }
+        }
+    }
+}
+
+// C[0..mr, 0..nr] (+)= packed A panel @ packed B panel, `ldc` is the row stride of C.
+#[inline(always)]
+unsafe fn micro_kernel<A: Element>(
+    kc: usize,
+    a: &[A],
+    b: &[A],
+    c: *mut A,
+    ldc: usize,
+    mr: usize,
+    nr: usize,
+    accumulate: bool,
+) {
+    let mut acc = [[A::default(); NR]; MR];
+    for (a, b) in a.chunks_exact(MR).zip(b.chunks_exact(NR)).take(kc) {
+        for i in 0..MR {
+            for j in 0..NR {
+                acc[i][j] = acc[i][j].add(a[i].mul(b[j]));
+            }
+        }
+    }
+    for i in 0..mr {
+        let row = unsafe { c.add(i * ldc) };
+        for j in 0..nr {
+            unsafe {
+                let p = row.add(j);
+                *p = if accumulate { (*p).add(acc[i][j]) } else { acc[i][j] };
+            }
+        }
+    }
+}
+
+pub struct Scratch<T: Element> {
+    a: Vec<T::Acc>,
+    b: Vec<T::Acc>,
+    c: Vec<T::Acc>,
+}
+
+impl<T: Element> Scratch<T> {
+    pub fn new() -> Self {
+        Scratch {
+            a: vec![T::Acc::default(); MC * KC],
+            b: vec![T::Acc::default(); KC * NC],
+            c: vec![T::Acc::default(); MC * NC],
+        }
+    }
+}
+
+// Computes the tile C[0..mc, 0..nc] = A[0..mc, :] @ B[:, 0..nc] for a dense C with row stride ldc.
+pub unsafe fn gemm_tile<T: Element>(
+    scratch: &mut Scratch<T>,
+    a: MatRef<T>,
+    b: MatRef<T>,
+    c: *mut T,
+    ldc: usize,
+    mc: usize,
+    nc: usize,
+    k: usize,
+) {
+    let Scratch { a: sa, b: sb, c: sc } = scratch;
+    for pc in (0..k).step_by(KC) {
+        let kc = KC.min(k - pc);
+        unsafe {
+            pack_b(sb, MatRef { ptr: b.at(pc, 0), ..b }, kc, nc);
+            pack_a(sa, MatRef { ptr: a.at(0, pc), ..a }, mc, kc);
+        }
+        for jr in (0..nc).step_by(NR) {
+            let bp = &sb[jr * kc..(jr + NR) * kc];
+            for ir in (0..mc).step_by(MR) {
+                let ap = &sa[ir * kc..(ir + MR) * kc];
+                unsafe {
+                    micro_kernel(
+                        kc,
+                        ap,
+                        bp,
+                        sc.as_mut_ptr().add(ir * NC + jr),
+                        NC,
+                        MR.min(mc - ir),
+                        NR.min(nc - jr),
+                        pc > 0,
+                    )
+                };
+            }
+        }
+    }
+    for i in 0..mc {
+        let row = unsafe { std::slice::from_raw_parts_mut(c.add(i * ldc), nc) };
+        row.iter_mut().zip(&sc[i * NC..i * NC + nc]).for_each(|(d, s)| *d = T::from_acc(*s));
+    }
+}
+
+// Batched matmul over element-strided operands, `a_strides`/`b_strides` cover the batch dims
+// followed by the two matrix dims. Writes a dense (batch.., m, n) result to `c`.
+pub unsafe fn batched_matmul<T: Element>(
+    batch: &[isize],
+    (m, k, n): (usize, usize, usize),
+    a: *const T,
+    a_strides: &[isize],
+    b: *const T,
+    b_strides: &[isize],
+    c: *mut T,
+) {
+    let nbatch = batch.iter().map(|d| *d as usize).product::<usize>();
+    if nbatch == 0 || m == 0 || n == 0 {
+        return;
+    }
+    if k == 0 {
+        unsafe { std::ptr::write_bytes(c, 0, nbatch * m * n) };
+        return;
+    }
+    let nd = batch.len();
+    let (mblocks, nblocks) = (m.div_ceil(MC), n.div_ceil(NC));
+    let (a, b, c) = (SendPtr(a as *mut T), SendPtr(b as *mut T), SendPtr(c));
+    parallel_tasks(
+        nbatch * mblocks * nblocks,
+        nbatch * m * n * k,
+        Scratch::<T>::new,
+        |scratch, task| {
+            let (bi, rest) = (task / (mblocks * nblocks), task % (mblocks * nblocks));
+            let (ic, jc) = ((rest / nblocks) * MC, (rest % nblocks) * NC);
+            // element offsets of batch `bi` in both operands
+            let (mut a_off, mut b_off, mut rem) = (0isize, 0isize, bi);
+            for d in (0..nd).rev() {
+                let idx = (rem % batch[d] as usize) as isize;
+                rem /= batch[d] as usize;
+                a_off += idx * a_strides[d];
+                b_off += idx * b_strides[d];
+            }
+            let am = MatRef { ptr: a.get() as *const T, rs: a_strides[nd], cs: a_strides[nd + 1] };
+            let bm = MatRef { ptr: b.get() as *const T, rs: b_strides[nd], cs: b_strides[nd + 1] };
+            unsafe {
+                gemm_tile(
+                    scratch,
+                    MatRef { ptr: am.ptr.offset(a_off), ..am }.sub(ic, 0),
+                    MatRef { ptr: bm.ptr.offset(b_off), ..bm }.sub(0, jc),
+                    c.get().add(bi * m * n + ic * n + jc),
+                    n,
+                    MC.min(m - ic),
+                    NC.min(n - jc),
+                    k,
+                )
+            };
+        },
+    );
+}
+
+// Matrix product of two buffers of shape (batch.., m, k) and (batch.., k, n), the batch dims
+// must already be broadcast to the same shape (stride 0 views are fine).
+#[pyfunction]
+pub fn matmul(py: Python<'_>, a: PyRef<Buffer>, b: PyRef<Buffer>) -> PyResult<Buffer> {
+    let nd = a.shape.len();
+    if nd < 2 || b.shape.len() != nd {
+        return Err(PyValueError::new_err(format!(
+            "matmul requires operands with the same number (>=2) of dims, got {:?} and {:?}",
+            a.shape, b.shape
+        )));
+    }
+    if a.shape[..nd - 2] != b.shape[..nd - 2] || a.shape[nd - 1] != b.shape[nd - 2] {
+        return Err(PyValueError::new_err(format!(
+            "matmul shapes {:?} and {:?} are not aligned",
+            a.shape, b.shape
+        )));
+    }
+    if a.dtype != b.dtype {
+        return Err(PyValueError::new_err("matmul requires identical dtypes"));
+    }
+    let (a, b) = (Buffer::clone(&a), Buffer::clone(&b));
+    py.detach(move || {
+        dispatch_dtype!(&a.dtype, T => {
+            let itemsize = std::mem::size_of::<T>();
+            let (m, k, n) = (a.shape[nd - 2] as usize, a.shape[nd - 1] as usize, b.shape[nd - 1] as usize);
+            let mut shape = a.shape[..nd - 2].to_vec();
+            shape.extend([m as isize, n as isize]);
+            let mut output = Storage::allocate(shape.iter().map(|d| *d as usize).product::<usize>() * itemsize);
+            let (a_strides, a_offset) = a.element_layout(itemsize);
+            let (b_strides, b_offset) = b.element_layout(itemsize);
+            unsafe {
+                batched_matmul::<T>(
+                    &a.shape[..nd - 2],
+                    (m, k, n),
+                    (a.data.as_ptr() as *const T).offset(a_offset),
+                    &a_strides,
+                    (b.data.as_ptr() as *const T).offset(b_offset),
+                    &b_strides,
+                    output.as_mut_ptr() as *mut T,
+                )
+            };
+            Ok(Buffer {
+                data: Arc::new(output),
+                strides: calc_strides(&shape, itemsize as isize),
+                shape,
+                dtype: a.dtype.clone(),
+                offset: 0,
+            })
+        }, Err(PyNotImplementedError::new_err(format!("matmul is not implemented for {} buffers", a.dtype))))
+    })
+}
@@ -1,3 +1,8 @@
 pub use ops::add_tensors;
 
+pub mod copy;
+pub mod fused;
+pub mod matmul;
 pub mod ops;
+pub mod optim;
+pub mod reduce;
@@ -0,0 +1,162 @@
+// Fused in-place optimizer updates.
+//
+// Every step walks a parameter, its gradient and its optimizer state (momentum, Adam moments)
+// once: the new values are computed per element in f64 and written back into the existing
+// storages, an optimizer step allocates nothing. Strided parameters and broadcast gradients
+// are walked in place like the operands of the other elementwise kernels.
+
+use crate::buffer::Buffer;
+use crate::dtype::{Element, dispatch_dtype};
+use crate::parallel::{SendPtr, parallel_for};
+use crate::strided::StridedLoop;
+use pyo3::exceptions::{PyNotImplementedError, PyValueError};
+use pyo3::prelude::*;
+
+// A buffer in element units.
+struct Operand<T> {
+    ptr: *mut T,
+    strides: Vec<isize>,
+    offset: isize,
+}
+
+impl<T> Operand<T> {
+    fn of(buffer: &Buffer) -> Operand<T> {
+        let (strides, offset) = buffer.element_layout(std::mem::size_of::<T>());
+        Operand { ptr: buffer.data.as_ptr() as *mut T, strides, offset }
+    }
+}
+
+// Calls `update(grad, values)` for every element, `values` holds the N state operands (the
+// parameter first) and is written back in place.
+unsafe fn update_inplace<T: Element, const N: usize, F>(shape: &[isize], grad: Operand<T>, state: [Operand<T>; N], update: F)
+where
+    F: Fn(f64, &mut [f64; N]) + Sync,
+{
+    let mut strides: Vec<&[isize]> = vec![&grad.strides];
+    strides.extend(state.iter().map(|op| op.strides.as_slice()));
+    let mut offsets = vec![grad.offset];
+    offsets.extend(state.iter().map(|op| op.offset));
+    let lp = StridedLoop::new(shape, &strides, &offsets);
+    let inner = lp.inner_strides().to_vec();
+    let g = SendPtr(grad.ptr);
+    let ptrs: [SendPtr<T>; N] = std::array::from_fn(|i| SendPtr(state[i].ptr));
+    parallel_for(lp.numel(), |start, end| {
+        lp.for_each_run_in(start, end, |offs, len| {
+            for k in 0..len as isize {
+                unsafe {
+                    let grad = (*g.get().offset(offs[0] + k * inner[0])).to_f64();
+                    let at: [*mut T; N] = std::array::from_fn(|i| ptrs[i].get().offset(offs[i + 1] + k * inner[i + 1]));
+                    let mut values: [f64; N] = std::array::from_fn(|i| (*at[i]).to_f64());
+                    update(grad, &mut values);
+                    for i in 0..N {
+                        *at[i] = T::from_f64(values[i]);
+                    }
+                }
+            }
+        })
+    });
+}
+
+// Parameters and state are written in place: they must be writable, have the shape of the
+// parameter without broadcast dims and share its dtype. The gradient may be a broadcast view.
+fn check_operands(param: &Buffer, grad: &Buffer, state: &[&Buffer]) -> PyResult<()> {
+    if !param.dtype.is_float() {
+        return Err(PyNotImplementedError::new_err(format!("optimizers update float parameters, got {}", param.dtype)));
+    }
+    if grad.shape != param.shape || grad.dtype != param.dtype {
+        return Err(PyValueError::new_err(format!(
+            "gradient {} {:?} does not match parameter {} {:?}",
+            grad.dtype, grad.shape, param.dtype, param.shape
+        )));
+    }
+    for b in std::iter::once(&param).chain(state) {
+        if b.shape != param.shape || b.dtype != param.dtype {
+            return Err(PyValueError::new_err(format!(
+                "optimizer state {} {:?} does not match parameter {} {:?}",
+                b.dtype, b.shape, param.dtype, param.shape
+            )));
+        }
+        if b.data.is_readonly() {
+            return Err(PyValueError::new_err("cannot update a read-only buffer in place"));
+        }
+        if b.shape.iter().zip(&b.strides).any(|(d, s)| *d > 1 && *s == 0) {
+            return Err(PyValueError::new_err("cannot update a broadcast buffer in place"));
+        }
+    }
+    Ok(())
+}
+
+// p -= lr * d, d = g + weight_decay * p followed by momentum: buf = momentum * buf + (1 - dampening) * d
+// and d = buf, or d + momentum * buf with nesterov. Without a momentum buffer d is applied directly.
+#[pyfunction]
+#[pyo3(signature = (param, grad, momentum_buffer, lr, momentum=0.0, dampening=0.0, weight_decay=0.0, nesterov=false))]
+#[allow(clippy::too_many_arguments)]
+pub fn sgd_step(
+    py: Python<'_>,
+    param: PyRef<Buffer>,
+    grad: PyRef<Buffer>,
+    momentum_buffer: Option<PyRef<Buffer>>,
+    lr: f64,
+    momentum: f64,
+    dampening: f64,
+    weight_decay: f64,
+    nesterov: bool,
+) -> PyResult<()> {
+    let state: Vec<&Buffer> = momentum_buffer.iter().map(|b| &**b).collect();
+    check_operands(&param, &grad, &state)?;
+    let (param, grad) = (Buffer::clone(&param), Buffer::clone(&grad));
+    let buf = momentum_buffer.map(|b| Buffer::clone(&b));
+    py.detach(move || {
+        dispatch_dtype!(&param.dtype, T => unsafe {
+            match &buf {
+                None => update_inplace::<T, 1, _>(&param.shape, Operand::of(&grad), [Operand::of(&param)], |g, [p]| {
+                    *p -= lr * (g + weight_decay * *p);
+                }),
+                Some(buf) => update_inplace::<T, 2, _>(&param.shape, Operand::of(&grad), [Operand::of(&param), Operand::of(buf)], |g, [p, b]| {
+                    let d = g + weight_decay * *p;
+                    *b = momentum * *b + (1.0 - dampening) * d;
+                    *p -= lr * if nesterov { d + momentum * *b } else { *b };
+                }),
+            }
+        }, unreachable!());
+    });
+    Ok(())
+}
+
+// Adam with bias correction, `step` counts from 1. weight_decay adds an L2 term to the gradient.
+#[pyfunction]
+#[pyo3(signature = (param, grad, exp_avg, exp_avg_sq, step, lr, beta1=0.9, beta2=0.999, eps=1e-8, weight_decay=0.0))]
+#[allow(clippy::too_many_arguments)]
+pub fn adam_step(
+    py: Python<'_>,
+    param: PyRef<Buffer>,
+    grad: PyRef<Buffer>,
+    exp_avg: PyRef<Buffer>,
+    exp_avg_sq: PyRef<Buffer>,
+    step: i32,
+    lr: f64,
+    beta1: f64,
+    beta2: f64,
+    eps: f64,
+    weight_decay: f64,
+) -> PyResult<()> {
+    if step < 1 {
+        return Err(PyValueError::new_err(format!("adam steps count from 1, got {step}")));
+    }
+    check_operands(&param, &grad, &[&exp_avg, &exp_avg_sq])?;
+    let step_size = lr / (1.0 - beta1.powi(step));
+    let bias2_sqrt = (1.0 - beta2.powi(step)).sqrt();
+    let (param, grad) = (Buffer::clone(&param), Buffer::clone(&grad));
+    let (m, v) = (Buffer::clone(&exp_avg), Buffer::clone(&exp_avg_sq));
+    py.detach(move || {
+        dispatch_dtype!(&param.dtype, T => unsafe {
+            update_inplace::<T, 3, _>(&param.shape, Operand::of(&grad), [Operand::of(&param), Operand::of(&m), Operand::of(&v)], |g, [p, m, v]| {
+                let g = g + weight_decay * *p;
+                *m = beta1 * *m + (1.0 - beta1) * g;
+                *v = beta2 * *v + (1.0 - beta2) * g * g;
+                *p -= step_size * *m / (v.sqrt() / bias2_sqrt + eps);
+            })
+        }, unreachable!());
+    });
+    Ok(())
+}
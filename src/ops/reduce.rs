@@ -0,0 +1,254 @@
+// Reductions (sum, max, argmax) along arbitrary axes of strided buffers.
+//
+// The input dims are split into the kept dims, one output element per position, and the
+// reduced dims, both are walked with a StridedLoop over the input strides. The loop order
+// follows the memory layout:
+// - inner order, the reduced dims are innermost in memory: every output element reduces its
+//   own run(s) of input, sums of a run are computed pairwise.
+// - outer order, a kept dim is innermost in memory (e.g. summing a row-major matrix over
+//   axis 0): the reduced positions are walked in the outer loop and every step streams over
+//   a contiguous row of inputs into a row of accumulators, float sums carry a Kahan
+//   compensation per output element.
+// Output elements are split over the worker threads in both orders.
+
+use std::sync::Arc;
+
+use crate::buffer::Buffer;
+use crate::dtype::{DType, Element, dispatch_dtype};
+use crate::helpers::calc_strides;
+use crate::parallel::{SendPtr, parallel_for_work};
+use crate::storage::Storage;
+use crate::strided::{StridedLoop, dense_strides};
+use pyo3::exceptions::{PyNotImplementedError, PyValueError};
+use pyo3::prelude::*;
+
+// runs up to this length are summed with 8 independent accumulators, longer runs are split in half
+const PAIRWISE_BLOCK: usize = 128;
+
+#[derive(Clone, Copy, PartialEq, Debug)]
+pub enum ReduceOp {
+    Sum,
+    Max,
+    Argmax,
+}
+
+impl ReduceOp {
+    pub fn parse(name: &str) -> Option<ReduceOp> {
+        match name {
+            "sum" => Some(ReduceOp::Sum),
+            "max" => Some(ReduceOp::Max),
+            "argmax" => Some(ReduceOp::Argmax),
+            _ => None,
+        }
+    }
+}
+
+// Sum of the `n` elements `s` apart starting at `p`, accumulated in `T::Acc`. The rounding
+// error grows with log(n) instead of n as for a running sum.
+pub unsafe fn pairwise_sum<T: Element>(p: *const T, n: usize, s: isize) -> T::Acc {
+    if n > PAIRWISE_BLOCK {
+        let half = (n / 2).next_multiple_of(8);
+        return unsafe { pairwise_sum(p, half, s).add(pairwise_sum(p.offset(half as isize * s), n - half, s)) };
+    }
+    let mut acc = [T::Acc::default(); 8];
+    let mut i = 0;
+    while i + 8 <= n {
+        for (j, a) in acc.iter_mut().enumerate() {
+            *a = a.add(unsafe { *p.offset((i + j) as isize * s) }.to_acc());
+        }
+        i += 8;
+    }
+    let mut sum = (acc[0].add(acc[1]).add(acc[2].add(acc[3]))).add(acc[4].add(acc[5]).add(acc[6].add(acc[7])));
+    for i in i..n {
+        sum = sum.add(unsafe { *p.offset(i as isize * s) }.to_acc());
+    }
+    sum
+}
+
+// sum += v with Kahan compensation, `c` carries the low order bits lost so far
+#[inline(always)]
+fn kahan_add<T: Element>(sum: &mut T, c: &mut T, v: T) {
+    let y = v.sub(*c);
+    let t = sum.add(y);
+    *c = t.sub(*sum).sub(y);
+    *sum = t;
+}
+
+// true when `v` replaces the running maximum `m`: NaN propagates like in numpy and ties keep
+// the first element
+#[inline(always)]
+fn takes_over<T: PartialOrd>(v: T, m: T) -> bool {
+    v > m || (v.partial_cmp(&v).is_none() && m.partial_cmp(&m).is_some())
+}
+
+// Loops over the kept dims with operands (out, input) and over the reduced dims with operand
+// (input), all strides in elements. The reduced loop is relative to an input element of the
+// kept loop.
+pub fn split_loops(shape: &[isize], strides: &[isize], offset: isize, axes: &[usize]) -> (StridedLoop, StridedLoop) {
+    let (mut kept_shape, mut kept_strides, mut red_shape, mut red_strides) = (vec![], vec![], vec![], vec![]);
+    for d in 0..shape.len() {
+        if axes.contains(&d) {
+            red_shape.push(shape[d]);
+            red_strides.push(strides[d]);
+        } else {
+            kept_shape.push(shape[d]);
+            kept_strides.push(strides[d]);
+        }
+    }
+    let out_strides = dense_strides(&kept_shape);
+    (
+        StridedLoop::new(&kept_shape, &[&out_strides, &kept_strides], &[0, offset]),
+        StridedLoop::new(&red_shape, &[&red_strides], &[0]),
+    )
+}
+
+// Reduces `input` with `op` into the dense output `out`, which holds T for Sum/Max and i64 for
+// Argmax. The argmax index is the row-major position within the reduced dims. Values are
+// compared and summed as `T::Acc`, widening is exact so only the stored result is rounded.
+pub unsafe fn reduce_strided<T: Element>(
+    op: ReduceOp,
+    kept: &StridedLoop,
+    reduced: &StridedLoop,
+    input: *const T,
+    out: *mut u8,
+) {
+    let (nout, nred) = (kept.numel(), reduced.numel());
+    if nout == 0 {
+        return;
+    }
+    let (input, out) = (SendPtr(input as *mut T), SendPtr(out));
+    let store = |i: usize, v: T::Acc, arg: i64| unsafe {
+        match op {
+            ReduceOp::Argmax => *(out.get() as *mut i64).add(i) = arg,
+            _ => *(out.get() as *mut T).add(i) = T::from_acc(v),
+        }
+    };
+    if nred == 0 {
+        // only reachable for sums, max of an empty set is rejected by the caller
+        parallel_for_work(nout, nout, |start, end| (start..end).for_each(|i| store(i, T::Acc::default(), 0)));
+        return;
+    }
+    let (os, ks) = (kept.inner_strides()[0], kept.inner_strides()[1]);
+    let rs = reduced.inner_strides()[0];
+
+    if ks != 0 && ks.abs() < rs.abs() {
+        parallel_for_work(nout, nout * nred, |start, end| {
+            let n = end - start;
+            let (mut acc, mut comp, mut arg) = (vec![T::Acc::default(); n], vec![T::Acc::default(); n], vec![0i64; n]);
+            let mut pos = 0i64;
+            reduced.for_each_run(|roffs, rlen| {
+                for t in 0..rlen {
+                    let r = roffs[0] + t as isize * rs;
+                    kept.for_each_run_in(start, end, |offs, len| unsafe {
+                        let o = offs[0] as usize - start;
+                        let src = input.get().offset(offs[1] + r) as *const T;
+                        match op {
+                            ReduceOp::Sum if T::IS_FLOAT => {
+                                for u in 0..len {
+                                    let i = o + u * os as usize;
+                                    kahan_add(&mut acc[i], &mut comp[i], (*src.offset(u as isize * ks)).to_acc());
+                                }
+                            }
+                            ReduceOp::Sum => {
+                                for u in 0..len {
+                                    let i = o + u * os as usize;
+                                    acc[i] = acc[i].add((*src.offset(u as isize * ks)).to_acc());
+                                }
+                            }
+                            _ => {
+                                for u in 0..len {
+                                    let (i, v) = (o + u * os as usize, (*src.offset(u as isize * ks)).to_acc());
+                                    if pos == 0 || takes_over(v, acc[i]) {
+                                        acc[i] = v;
+                                        arg[i] = pos;
+                                    }
+                                }
+                            }
+                        }
+                    });
+                    pos += 1;
+                }
+            });
+            for i in 0..n {
+                store(start + i, acc[i], arg[i]);
+            }
+        });
+        return;
+    }
+
+    parallel_for_work(nout, nout * nred, |start, end| {
+        kept.for_each_run_in(start, end, |offs, len| {
+            for u in 0..len {
+                let base = unsafe { input.get().offset(offs[1] + u as isize * ks) as *const T };
+                let (mut acc, mut comp, mut arg, mut pos) = (T::Acc::default(), T::Acc::default(), 0i64, 0i64);
+                reduced.for_each_run(|roffs, rlen| unsafe {
+                    let run = base.offset(roffs[0]);
+                    match op {
+                        ReduceOp::Sum if T::IS_FLOAT => kahan_add(&mut acc, &mut comp, pairwise_sum::<T>(run, rlen, rs)),
+                        ReduceOp::Sum => acc = acc.add(pairwise_sum::<T>(run, rlen, rs)),
+                        _ => {
+                            for t in 0..rlen {
+                                let v = (*run.offset(t as isize * rs)).to_acc();
+                                if pos == 0 || takes_over(v, acc) {
+                                    acc = v;
+                                    arg = pos;
+                                }
+                                pos += 1;
+                            }
+                        }
+                    }
+                });
+                store((offs[0] + u as isize * os) as usize, acc, arg);
+            }
+        });
+    });
+}
+
+// Reduces `a` over `axes` with op "sum", "max" or "argmax". Reduced dims are kept with size 1
+// when `keepdim` is set, argmax returns int64 indices.
+#[pyfunction]
+pub fn reduce(py: Python<'_>, a: PyRef<Buffer>, op: &str, axes: Vec<usize>, keepdim: bool) -> PyResult<Buffer> {
+    let Some(op) = ReduceOp::parse(op) else {
+        return Err(PyValueError::new_err(format!("unknown reduce op {op}")));
+    };
+    let ndim = a.shape.len();
+    if let Some(axis) = axes.iter().find(|d| **d >= ndim) {
+        return Err(PyValueError::new_err(format!(
+            "axis {axis} is out of bounds for a buffer of dimension {ndim}"
+        )));
+    }
+    if (1..axes.len()).any(|i| axes[..i].contains(&axes[i])) {
+        return Err(PyValueError::new_err(format!("repeated axis in {axes:?}")));
+    }
+    if op != ReduceOp::Sum && axes.iter().any(|d| a.shape[*d] == 0) {
+        return Err(PyValueError::new_err(format!("{op:?} of an empty dimension is undefined")));
+    }
+    let shape: Vec<isize> = (0..ndim)
+        .filter_map(|d| match axes.contains(&d) {
+            true if keepdim => Some(1),
+            true => None,
+            false => Some(a.shape[d]),
+        })
+        .collect();
+    let numel = shape.iter().map(|d| *d as usize).product::<usize>();
+    let a = Buffer::clone(&a);
+    py.detach(move || {
+        dispatch_dtype!(&a.dtype, T => {
+            let (strides, offset) = a.element_layout(std::mem::size_of::<T>());
+            let (kept, reduced) = split_loops(&a.shape, &strides, offset, &axes);
+            let (dtype, itemsize) = match op {
+                ReduceOp::Argmax => (DType::Int64, std::mem::size_of::<i64>()),
+                _ => (a.dtype.clone(), std::mem::size_of::<T>()),
+            };
+            let mut output = Storage::allocate(numel * itemsize);
+            unsafe { reduce_strided::<T>(op, &kept, &reduced, a.data.as_ptr() as *const T, output.as_mut_ptr()) };
+            Ok(Buffer {
+                data: Arc::new(output),
+                strides: calc_strides(&shape, itemsize as isize),
+                shape,
+                dtype,
+                offset: 0,
+            })
+        }, Err(PyNotImplementedError::new_err(format!("reduce is not implemented for {} buffers", a.dtype))))
+    })
+}
@@ -0,0 +1,262 @@
+// Worker threads for the CPU kernels.
+//
+// Kernels describe their work as a range of output elements, `parallel_for` cuts that range
+// into one contiguous chunk per worker and hands the chunks to a pool of persistent worker
+// threads, the calling thread takes the first chunk. Workers are started on first use and
+// sleep on a condition variable between kernels, so a kernel call costs a wake-up and not a
+// thread spawn. Loops below the size threshold stay on the calling thread. The worker count
+// defaults to AUTOGRAD_THREADS or the number of available cores and can be changed at
+// runtime. A Device "CPU:8" sets a count of 8 for the calling thread only, kernels that
+// other threads run at the same time keep their own count.
+
+use std::cell::Cell;
+use std::collections::VecDeque;
+use std::panic::{AssertUnwindSafe, catch_unwind, resume_unwind};
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::sync::{Arc, Condvar, Mutex, OnceLock};
+
+use pyo3::prelude::*;
+
+// elements below which a kernel runs serially, overridable with AUTOGRAD_PARALLEL_THRESHOLD
+const DEFAULT_THRESHOLD: usize = 1 << 16;
+// chunk boundaries are aligned to this many elements so workers never share a cache line of the output
+const CHUNK_ALIGN: usize = 64;
+
+static NUM_THREADS: AtomicUsize = AtomicUsize::new(0);
+static THRESHOLD: AtomicUsize = AtomicUsize::new(0);
+
+thread_local! {
+    // count for the kernels called from this thread, 0 uses the process wide NUM_THREADS
+    static LOCAL_THREADS: Cell<usize> = const { Cell::new(0) };
+}
+
+fn env_usize(name: &str) -> Option<usize> {
+    std::env::var(name).ok().and_then(|v| v.parse().ok()).filter(|n| *n > 0)
+}
+
+pub fn num_threads() -> usize {
+    if let n @ 1.. = LOCAL_THREADS.get() {
+        return n;
+    }
+    match NUM_THREADS.load(Ordering::Relaxed) {
+        0 => {
+            let n = env_usize("AUTOGRAD_THREADS").unwrap_or_else(|| {
+                std::thread::available_parallelism().map(|n| n.get()).unwrap_or(1)
+            });
+            NUM_THREADS.store(n, Ordering::Relaxed);
+            n
+        }
+        n => n,
+    }
+}
+
+pub fn threshold() -> usize {
+    match THRESHOLD.load(Ordering::Relaxed) {
+        0 => {
+            let n = env_usize("AUTOGRAD_PARALLEL_THRESHOLD").unwrap_or(DEFAULT_THRESHOLD);
+            THRESHOLD.store(n, Ordering::Relaxed);
+            n
+        }
+        n => n,
+    }
+}
+
+// Calls `f(start, end)` on disjoint chunks that cover [0, numel).
+pub fn parallel_for<F>(numel: usize, f: F)
+where
+    F: Fn(usize, usize) + Sync,
+{
+    parallel_for_work(numel, numel, f)
+}
+
+// Same as `parallel_for` for loops that do `work` elements of work in total, e.g. reductions
+// that read many input elements per output element.
+pub fn parallel_for_work<F>(numel: usize, work: usize, f: F)
+where
+    F: Fn(usize, usize) + Sync,
+{
+    let workers = num_threads().min(numel / CHUNK_ALIGN).max(1);
+    if workers == 1 || work < threshold() {
+        f(0, numel);
+        return;
+    }
+    let chunk = numel.div_ceil(workers).next_multiple_of(CHUNK_ALIGN);
+    run_section(numel.div_ceil(chunk), &|i| f(i * chunk, ((i + 1) * chunk).min(numel)));
+}
+
+// Runs `f(state, task)` for every task in 0..ntasks, tasks are handed out dynamically to the
+// workers and every worker creates its scratch `state` once with `init`. `work` is the size of
+// the whole job in elements, small jobs run serially.
+pub fn parallel_tasks<S, I, F>(ntasks: usize, work: usize, init: I, f: F)
+where
+    I: Fn() -> S + Sync,
+    F: Fn(&mut S, usize) + Sync,
+{
+    let workers = num_threads().min(ntasks).max(1);
+    if workers == 1 || work < threshold() {
+        let mut state = init();
+        for task in 0..ntasks {
+            f(&mut state, task);
+        }
+        return;
+    }
+    let next = AtomicUsize::new(0);
+    let run = || {
+        let mut state = init();
+        loop {
+            let task = next.fetch_add(1, Ordering::Relaxed);
+            if task >= ntasks {
+                break;
+            }
+            f(&mut state, task);
+        }
+    };
+    run_section(workers, &|_| run());
+}
+
+// A parallel section: `ntasks` calls of a closure that lives on the stack of the calling thread.
+// `run_section` returns only once `remaining` is 0, so no task outlives the closure.
+struct Section {
+    f: *const (dyn Fn(usize) + Sync),
+    remaining: Mutex<usize>,
+    done: Condvar,
+    panic: Mutex<Option<Box<dyn std::any::Any + Send>>>,
+}
+
+unsafe impl Send for Section {}
+unsafe impl Sync for Section {}
+
+impl Section {
+    fn run(&self, task: usize) {
+        // a panicking kernel must not take the worker down with it, the caller re-raises it
+        if let Err(payload) = catch_unwind(AssertUnwindSafe(|| unsafe { (*self.f)(task) })) {
+            self.panic.lock().unwrap().get_or_insert(payload);
+        }
+        let mut remaining = self.remaining.lock().unwrap();
+        *remaining -= 1;
+        if *remaining == 0 {
+            self.done.notify_all();
+        }
+    }
+}
+
+struct Pool {
+    queue: Mutex<VecDeque<(Arc<Section>, usize)>>,
+    ready: Condvar,
+    workers: AtomicUsize,
+}
+
+fn pool() -> &'static Pool {
+    static POOL: OnceLock<Pool> = OnceLock::new();
+    POOL.get_or_init(|| Pool { queue: Mutex::new(VecDeque::new()), ready: Condvar::new(), workers: AtomicUsize::new(0) })
+}
+
+impl Pool {
+    // starts workers until there are at least `n`, they are never stopped
+    fn reserve(&'static self, n: usize) {
+        let _guard = self.queue.lock().unwrap();
+        while self.workers.load(Ordering::Relaxed) < n {
+            std::thread::Builder::new()
+                .name("autograd-worker".into())
+                .spawn(move || self.work())
+                .expect("failed to start a worker thread");
+            self.workers.fetch_add(1, Ordering::Relaxed);
+        }
+    }
+
+    fn work(&self) {
+        let mut queue = self.queue.lock().unwrap();
+        loop {
+            match queue.pop_front() {
+                Some((section, task)) => {
+                    drop(queue);
+                    section.run(task);
+                    queue = self.queue.lock().unwrap();
+                }
+                None => queue = self.ready.wait(queue).unwrap(),
+            }
+        }
+    }
+
+    fn pop(&self) -> Option<(Arc<Section>, usize)> {
+        self.queue.lock().unwrap().pop_front()
+    }
+}
+
+// Runs `f(task)` for every task in 0..ntasks on the pool and the calling thread, which takes
+// task 0 and then helps with queued tasks until its own are done. Helping keeps nested sections
+// and concurrent callers from waiting on workers that are all blocked.
+fn run_section(ntasks: usize, f: &(dyn Fn(usize) + Sync)) {
+    if ntasks <= 1 {
+        (0..ntasks).for_each(f);
+        return;
+    }
+    let pool = pool();
+    pool.reserve(num_threads().saturating_sub(1).min(ntasks - 1).max(1));
+    // the lifetime of `f` is erased, it stays valid because this function waits for every task
+    let f: *const (dyn Fn(usize) + Sync + 'static) = unsafe { std::mem::transmute(f) };
+    let section = Arc::new(Section { f, remaining: Mutex::new(ntasks - 1), done: Condvar::new(), panic: Mutex::new(None) });
+    {
+        let mut queue = pool.queue.lock().unwrap();
+        queue.extend((1..ntasks).map(|task| (section.clone(), task)));
+    }
+    pool.ready.notify_all();
+    let first = catch_unwind(AssertUnwindSafe(|| unsafe { (*section.f)(0) }));
+    loop {
+        if *section.remaining.lock().unwrap() == 0 {
+            break;
+        }
+        match pool.pop() {
+            Some((other, task)) => other.run(task),
+            None => {
+                let mut remaining = section.remaining.lock().unwrap();
+                while *remaining != 0 {
+                    remaining = section.done.wait(remaining).unwrap();
+                }
+            }
+        }
+    }
+    if let Err(payload) = first {
+        resume_unwind(payload);
+    }
+    if let Some(payload) = section.panic.lock().unwrap().take() {
+        resume_unwind(payload);
+    }
+}
+
+// Raw pointer that may cross into the worker threads. Kernels only hand out pointers
+// to buffers that outlive the parallel section and write disjoint output ranges.
+#[derive(Clone, Copy)]
+pub struct SendPtr<T>(pub *mut T);
+
+unsafe impl<T> Send for SendPtr<T> {}
+unsafe impl<T> Sync for SendPtr<T> {}
+
+impl<T> SendPtr<T> {
+    // accessed through a method so closures capture the wrapper and not the bare pointer
+    #[inline(always)]
+    pub fn get(&self) -> *mut T {
+        self.0
+    }
+}
+
+// Sets the number of worker threads used by the CPU kernels.
+#[pyfunction]
+pub fn set_num_threads(n: usize) {
+    NUM_THREADS.store(n.max(1), Ordering::Relaxed);
+}
+
+// Number of worker threads the kernels called from this thread use.
+#[pyfunction]
+pub fn get_num_threads() -> usize {
+    num_threads()
+}
+
+// Sets the number of worker threads for kernels called from this thread only, None goes back
+// to the process wide count. Returns the previous setting so that it can be restored.
+#[pyfunction]
+#[pyo3(signature = (n=None))]
+pub fn set_local_num_threads(n: Option<usize>) -> Option<usize> {
+    let prev = LOCAL_THREADS.replace(n.map_or(0, |n| n.max(1)));
+    (prev != 0).then_some(prev)
+}
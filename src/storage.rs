@@ -1,27 +1,179 @@
-#[derive(Debug, Clone)]
+use std::fmt;
+use std::fs::File;
+use std::io;
+
+use crate::arena;
+use pyo3::ffi;
+use pyo3::prelude::*;
+
+// Where the bytes of a storage live.
+enum Backing {
+    // an arena bucket, the vector is truncated to the requested size and goes back to the arena on drop
+    Pooled(Vec<u8>),
+    Owned(Vec<u8>),
+    // memory exported by a Python object through the buffer protocol, the view keeps the
+    // exporter alive and its memory pinned until it is released
+    Foreign(Box<ffi::Py_buffer>),
+    // pages of a memory mapped file, `len` bytes mapped at `addr` are unmapped on drop
+    Mapped { addr: *mut u8, len: usize },
+}
+
+// file offsets of mappings are aligned to this, a multiple of every page size in use (4K, 16K, 64K)
+#[cfg(unix)]
+const MAP_ALIGN: u64 = 1 << 16;
+
 pub struct Storage {
-    pub(crate) data: Vec<u8>, // single memory address stores 8bits of data
+    ptr: *mut u8,
+    len: usize,
+    readonly: bool,
+    backing: Backing,
+}
+
+// The pointer is owned by the backing and never reallocated, concurrent kernels only write
+// disjoint parts of freshly allocated outputs.
+unsafe impl Send for Storage {}
+unsafe impl Sync for Storage {}
+
+impl fmt::Debug for Storage {
+    fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
+        let kind = match self.backing {
+            Backing::Pooled(_) => "pooled",
+            Backing::Owned(_) => "owned",
+            Backing::Foreign(_) => "foreign",
+            Backing::Mapped { .. } => "mapped",
+        };
+        f.debug_struct("Storage").field("len", &self.len).field("kind", &kind).finish()
+    }
 }
 
 impl Storage {
+    fn from_backing(mut data: Vec<u8>, pooled: bool) -> Storage {
+        let (ptr, len) = (data.as_mut_ptr(), data.len());
+        let backing = if pooled { Backing::Pooled(data) } else { Backing::Owned(data) };
+        Storage { ptr, len, readonly: false, backing }
+    }
     pub fn len(&self) -> usize {
-        self.data.len()
+        self.len
     }
     pub fn as_ptr(&self) -> *const u8 {
-        self.data.as_ptr()
+        self.ptr
     }
     pub fn as_mut_ptr(&mut self) -> *mut u8 {
-        self.data.as_mut_ptr()
+        self.ptr
+    }
+    pub fn as_slice(&self) -> &[u8] {
+        match self.len {
+            0 => &[],
+            len => unsafe { std::slice::from_raw_parts(self.ptr, len) },
+        }
+    }
+    // false for read-only exports such as `bytes` or non-writeable ndarrays
+    pub fn is_readonly(&self) -> bool {
+        self.readonly
     }
     pub fn from_slice(s: &[u8]) -> Storage {
-        Storage { data: s.to_owned() }
+        let mut storage = Storage::allocate(s.len());
+        if !s.is_empty() {
+            unsafe { std::ptr::copy_nonoverlapping(s.as_ptr(), storage.as_mut_ptr(), s.len()) };
+        }
+        storage
     }
     pub fn from_vec(v: Vec<u8>) -> Storage {
-        Storage { data: v }
+        arena::track_alloc(v.len());
+        Storage::from_backing(v, false)
     }
+    // Allocates `nbytes` from the arena, the bytes may hold data of a previous buffer.
+    // Use `zeroed` when the kernel does not overwrite every byte.
     pub fn allocate(nbytes: usize) -> Storage {
-        Self {
-            data: vec![0u8; nbytes],
+        let mut data = arena::take(nbytes);
+        data.truncate(nbytes);
+        arena::track_alloc(nbytes);
+        Storage::from_backing(data, true)
+    }
+    pub fn zeroed(nbytes: usize) -> Storage {
+        let mut storage = Storage::allocate(nbytes);
+        if nbytes > 0 {
+            unsafe { std::ptr::write_bytes(storage.as_mut_ptr(), 0, nbytes) };
+        }
+        storage
+    }
+    // Takes ownership of an exported buffer `view`, the storage covers the `len` bytes at
+    // `base`, which must lie inside the export.
+    pub unsafe fn from_py_buffer(view: Box<ffi::Py_buffer>, base: *mut u8, len: usize) -> Storage {
+        Storage {
+            ptr: base,
+            len,
+            readonly: view.readonly != 0,
+            backing: Backing::Foreign(view),
+        }
+    }
+    // Maps `len` bytes of `file` starting at byte `offset`. Pages are read lazily on first access.
+    // Read-only maps share the page cache, copy-on-write maps are writable and private to this
+    // storage, writes never reach the file.
+    #[cfg(unix)]
+    pub fn map_file(file: &File, offset: u64, len: usize, copy_on_write: bool) -> io::Result<Storage> {
+        use std::os::fd::AsRawFd;
+        if len == 0 {
+            return Ok(Storage::from_vec(Vec::new()));
+        }
+        let start = offset - offset % MAP_ALIGN;
+        let map_len = len + (offset - start) as usize;
+        let (prot, flags) = match copy_on_write {
+            true => (libc::PROT_READ | libc::PROT_WRITE, libc::MAP_PRIVATE),
+            false => (libc::PROT_READ, libc::MAP_SHARED),
+        };
+        let addr = unsafe {
+            libc::mmap(std::ptr::null_mut(), map_len, prot, flags, file.as_raw_fd(), start as libc::off_t)
+        };
+        if addr == libc::MAP_FAILED {
+            return Err(io::Error::last_os_error());
+        }
+        let addr = addr as *mut u8;
+        Ok(Storage {
+            ptr: unsafe { addr.add((offset - start) as usize) },
+            len,
+            readonly: !copy_on_write,
+            backing: Backing::Mapped { addr, len: map_len },
+        })
+    }
+
+    // without mmap the bytes are read eagerly
+    #[cfg(not(unix))]
+    pub fn map_file(file: &File, offset: u64, len: usize, _copy_on_write: bool) -> io::Result<Storage> {
+        use std::io::{Read, Seek, SeekFrom};
+        let mut file = file;
+        let mut data = vec![0u8; len];
+        file.seek(SeekFrom::Start(offset))?;
+        file.read_exact(&mut data)?;
+        Ok(Storage::from_vec(data))
+    }
+}
+
+impl Clone for Storage {
+    fn clone(&self) -> Self {
+        Storage::from_slice(self.as_slice())
+    }
+}
+
+impl Drop for Storage {
+    fn drop(&mut self) {
+        match &mut self.backing {
+            Backing::Pooled(data) => {
+                arena::track_free(self.len);
+                let mut data = std::mem::take(data);
+                // SAFETY: the arena handed out a fully initialized bucket, truncating kept the bytes initialized
+                unsafe { data.set_len(arena::bucket_size(data.len())) };
+                arena::give(data);
+            }
+            Backing::Owned(_) => arena::track_free(self.len),
+            // the last reference can go away on a worker thread, releasing needs the GIL
+            Backing::Foreign(view) => Python::attach(|_| unsafe { ffi::PyBuffer_Release(&mut **view) }),
+            #[cfg(unix)]
+            Backing::Mapped { addr, len } => unsafe {
+                libc::munmap(*addr as *mut libc::c_void, *len);
+            },
+            #[cfg(not(unix))]
+            Backing::Mapped { .. } => unreachable!("files are only mapped on unix"),
         }
     }
 }
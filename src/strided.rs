@@ -0,0 +1,417 @@
+// Shared N-d strided iteration for the elementwise kernels.
+//
+// Every operand (inputs and output) is described by a shape common to all of them
+// and its own element strides. `StridedLoop` drops size-1 dimensions, merges
+// neighbouring dimensions that are contiguous with each other for *every* operand and
+// then walks the remaining outer dimensions odometer style, handing the kernel one
+// inner run at a time. When all operands collapse into a single dense run the kernel
+// gets plain slices and the compiler is free to vectorize.
+
+use crate::parallel::{SendPtr, parallel_for};
+
+#[derive(Debug, Clone)]
+pub struct StridedLoop {
+    nops: usize,
+    numel: usize,
+    // coalesced shape, outermost dimension first
+    shape: Vec<usize>,
+    // coalesced element strides, laid out as strides[dim * nops + op]
+    strides: Vec<isize>,
+    // element offset of the first element of every operand
+    offsets: Vec<isize>,
+}
+
+impl StridedLoop {
+    pub fn new(shape: &[isize], strides: &[&[isize]], offsets: &[isize]) -> StridedLoop {
+        let nops = strides.len();
+        assert_eq!(nops, offsets.len(), "every operand needs an offset");
+        for s in strides {
+            assert_eq!(s.len(), shape.len(), "operand strides do not match the shape");
+        }
+        let numel = shape.iter().map(|n| *n as usize).product::<usize>();
+
+        // walk from the innermost dimension outwards and merge whenever
+        // stride[outer] == stride[inner] * size[inner] holds for all operands
+        let mut rev_shape: Vec<usize> = Vec::with_capacity(shape.len());
+        let mut rev_strides: Vec<isize> = Vec::with_capacity(shape.len() * nops);
+        if numel > 0 {
+            for d in (0..shape.len()).rev() {
+                let size = shape[d] as usize;
+                if size == 1 {
+                    continue;
+                }
+                if let Some(&inner_size) = rev_shape.last() {
+                    let base = rev_strides.len() - nops;
+                    let mergeable = (0..nops)
+                        .all(|op| strides[op][d] == rev_strides[base + op] * inner_size as isize);
+                    if mergeable {
+                        *rev_shape.last_mut().unwrap() *= size;
+                        continue;
+                    }
+                }
+                rev_shape.push(size);
+                rev_strides.extend((0..nops).map(|op| strides[op][d]));
+            }
+            if rev_shape.is_empty() {
+                // 0-d or all dims of size 1: a single element
+                rev_shape.push(1);
+                rev_strides.extend(std::iter::repeat_n(0, nops));
+            }
+        }
+
+        let ndim = rev_shape.len();
+        let mut out_strides = vec![0isize; ndim * nops];
+        for (i, d) in (0..ndim).rev().enumerate() {
+            out_strides[i * nops..(i + 1) * nops]
+                .copy_from_slice(&rev_strides[d * nops..(d + 1) * nops]);
+        }
+        rev_shape.reverse();
+
+        StridedLoop {
+            nops,
+            numel,
+            shape: rev_shape,
+            strides: out_strides,
+            offsets: offsets.to_vec(),
+        }
+    }
+
+    pub fn numel(&self) -> usize {
+        self.numel
+    }
+
+    pub fn ndim(&self) -> usize {
+        self.shape.len()
+    }
+
+    pub fn offsets(&self) -> &[isize] {
+        &self.offsets
+    }
+
+    // strides of the innermost (coalesced) dimension, one per operand
+    pub fn inner_strides(&self) -> &[isize] {
+        match self.shape.len() {
+            0 => &[],
+            n => &self.strides[(n - 1) * self.nops..],
+        }
+    }
+
+    // true when every operand is a single dense run, the kernels can then
+    // treat all operands as flat slices of `numel` elements
+    pub fn is_contiguous(&self) -> bool {
+        self.shape.len() <= 1 && self.inner_strides().iter().all(|s| *s == 1)
+    }
+
+    // Calls `f(offsets, len)` for every inner run, `offsets` holds the element offset of
+    // the first element of the run for every operand. Consecutive elements of the run are
+    // `inner_strides()` apart.
+    pub fn for_each_run<F>(&self, f: F)
+    where
+        F: FnMut(&[isize], usize),
+    {
+        self.for_each_run_in(0, self.numel, f)
+    }
+
+    // Same as `for_each_run` restricted to the elements [start, end) in row-major order of
+    // the loop shape, the first and the last run may be partial. Disjoint ranges can be
+    // walked from different threads.
+    pub fn for_each_run_in<F>(&self, start: usize, end: usize, mut f: F)
+    where
+        F: FnMut(&[isize], usize),
+    {
+        let end = end.min(self.numel);
+        if start >= end {
+            return;
+        }
+        let nops = self.nops;
+        let ndim = self.shape.len();
+        let inner = self.shape[ndim - 1];
+        let inner_strides = self.inner_strides();
+
+        // position of `start`, this is the only div/mod of the walk
+        let mut counter = vec![0usize; ndim];
+        let mut rem = start;
+        for d in (0..ndim).rev() {
+            counter[d] = rem % self.shape[d];
+            rem /= self.shape[d];
+        }
+        let mut pos = self.offsets.clone();
+        for d in 0..ndim {
+            for op in 0..nops {
+                pos[op] += self.strides[d * nops + op] * counter[d] as isize;
+            }
+        }
+
+        let mut remaining = end - start;
+        loop {
+            let len = (inner - counter[ndim - 1]).min(remaining);
+            f(&pos, len);
+            remaining -= len;
+            if remaining == 0 {
+                return;
+            }
+            // back to the beginning of the run, then odometer increment over the outer dimensions
+            for op in 0..nops {
+                pos[op] -= inner_strides[op] * counter[ndim - 1] as isize;
+            }
+            counter[ndim - 1] = 0;
+            let mut d = ndim - 1;
+            loop {
+                // remaining > 0 guarantees that an outer dimension can still be incremented
+                d -= 1;
+                let s = &self.strides[d * nops..(d + 1) * nops];
+                counter[d] += 1;
+                if counter[d] < self.shape[d] {
+                    for op in 0..nops {
+                        pos[op] += s[op];
+                    }
+                    break;
+                }
+                counter[d] = 0;
+                let rewind = (self.shape[d] - 1) as isize;
+                for op in 0..nops {
+                    pos[op] -= s[op] * rewind;
+                }
+            }
+        }
+    }
+}
+
+// Converts byte strides/offset of a buffer to element units.
+pub fn to_elements(byte_strides: &[isize], byte_offset: usize, itemsize: usize) -> (Vec<isize>, isize) {
+    let itemsize = itemsize as isize;
+    let strides = byte_strides
+        .iter()
+        .map(|s| {
+            debug_assert!(s % itemsize == 0, "stride is not a multiple of the itemsize");
+            s / itemsize
+        })
+        .collect();
+    (strides, byte_offset as isize / itemsize)
+}
+
+// Contiguous element strides of `shape`.
+pub fn dense_strides(shape: &[isize]) -> Vec<isize> {
+    crate::helpers::calc_strides(shape, 1)
+}
+
+// out[i] = f(a[i]) over a loop with operands (out, a), large loops are split over the worker threads
+pub unsafe fn map1<T, U, F>(lp: &StridedLoop, out: *mut U, a: *const T, f: F)
+where
+    T: Copy,
+    U: Copy,
+    F: Fn(T) -> U + Sync,
+{
+    let (out, a) = (SendPtr(out), SendPtr(a as *mut T));
+    parallel_for(lp.numel(), |start, end| unsafe { map1_range(lp, out.get(), a.get(), &f, start, end) });
+}
+
+unsafe fn map1_range<T, U, F>(lp: &StridedLoop, out: *mut U, a: *const T, f: &F, start: usize, end: usize)
+where
+    T: Copy,
+    U: Copy,
+    F: Fn(T) -> U,
+{
+    unsafe {
+        if lp.is_contiguous() {
+            let o = lp.offsets();
+            let n = end - start;
+            let out = std::slice::from_raw_parts_mut(out.offset(o[0] + start as isize), n);
+            let a = std::slice::from_raw_parts(a.offset(o[1] + start as isize), n);
+            for (y, x) in out.iter_mut().zip(a) {
+                *y = f(*x);
+            }
+            return;
+        }
+        let s = lp.inner_strides();
+        let (so, sa) = (s[0], s[1]);
+        lp.for_each_run_in(start, end, |o, len| {
+            let (mut po, mut pa) = (out.offset(o[0]), a.offset(o[1]));
+            if so == 1 && sa == 1 {
+                let out = std::slice::from_raw_parts_mut(po, len);
+                let a = std::slice::from_raw_parts(pa, len);
+                for (y, x) in out.iter_mut().zip(a) {
+                    *y = f(*x);
+                }
+                return;
+            }
+            for _ in 0..len {
+                *po = f(*pa);
+                po = po.offset(so);
+                pa = pa.offset(sa);
+            }
+        });
+    }
+}
+
+// out[i] = f(a[i], b[i]) over a loop with operands (out, a, b), large loops are split over the worker threads
+pub unsafe fn map2<T, U, V, F>(lp: &StridedLoop, out: *mut V, a: *const T, b: *const U, f: F)
+where
+    T: Copy,
+    U: Copy,
+    V: Copy,
+    F: Fn(T, U) -> V + Sync,
+{
+    let (out, a, b) = (SendPtr(out), SendPtr(a as *mut T), SendPtr(b as *mut U));
+    parallel_for(lp.numel(), |start, end| unsafe {
+        map2_range(lp, out.get(), a.get(), b.get(), &f, start, end)
+    });
+}
+
+unsafe fn map2_range<T, U, V, F>(
+    lp: &StridedLoop,
+    out: *mut V,
+    a: *const T,
+    b: *const U,
+    f: &F,
+    start: usize,
+    end: usize,
+) where
+    T: Copy,
+    U: Copy,
+    V: Copy,
+    F: Fn(T, U) -> V,
+{
+    unsafe {
+        if lp.is_contiguous() {
+            let o = lp.offsets();
+            let n = end - start;
+            let s = start as isize;
+            let out = std::slice::from_raw_parts_mut(out.offset(o[0] + s), n);
+            let a = std::slice::from_raw_parts(a.offset(o[1] + s), n);
+            let b = std::slice::from_raw_parts(b.offset(o[2] + s), n);
+            for ((y, x0), x1) in out.iter_mut().zip(a).zip(b) {
+                *y = f(*x0, *x1);
+            }
+            return;
+        }
+        let s = lp.inner_strides();
+        let (so, sa, sb) = (s[0], s[1], s[2]);
+        lp.for_each_run_in(start, end, |o, len| {
+            let (mut po, mut pa, mut pb) = (out.offset(o[0]), a.offset(o[1]), b.offset(o[2]));
+            if so == 1 && sa == 1 && sb == 1 {
+                let out = std::slice::from_raw_parts_mut(po, len);
+                let a = std::slice::from_raw_parts(pa, len);
+                let b = std::slice::from_raw_parts(pb, len);
+                for ((y, x0), x1) in out.iter_mut().zip(a).zip(b) {
+                    *y = f(*x0, *x1);
+                }
+                return;
+            }
+            if so == 1 && sa == 1 && sb == 0 {
+                // broadcast of b along the inner dimension
+                let out = std::slice::from_raw_parts_mut(po, len);
+                let a = std::slice::from_raw_parts(pa, len);
+                let x1 = *pb;
+                for (y, x0) in out.iter_mut().zip(a) {
+                    *y = f(*x0, x1);
+                }
+                return;
+            }
+            for _ in 0..len {
+                *po = f(*pa, *pb);
+                po = po.offset(so);
+                pa = pa.offset(sa);
+                pb = pb.offset(sb);
+            }
+        });
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn collect(lp: &StridedLoop) -> Vec<Vec<isize>> {
+        let s = lp.inner_strides().to_vec();
+        let mut ret = vec![];
+        lp.for_each_run(|o, len| {
+            for i in 0..len as isize {
+                ret.push(o.iter().zip(&s).map(|(o, s)| o + s * i).collect());
+            }
+        });
+        ret
+    }
+
+    #[test]
+    fn contiguous_operands_collapse_to_one_run() {
+        let shape = [2, 3, 4];
+        let st = dense_strides(&shape);
+        let lp = StridedLoop::new(&shape, &[&st, &st], &[0, 5]);
+        assert!(lp.is_contiguous());
+        assert_eq!(lp.ndim(), 1);
+        assert_eq!(lp.numel(), 24);
+    }
+
+    #[test]
+    fn broadcast_and_transposed_operands_visit_every_element() {
+        // out is dense (2,3), a is a transposed (3,2) buffer, b is expanded along dim 0
+        let shape = [2, 3];
+        let out = dense_strides(&shape);
+        let lp = StridedLoop::new(&shape, &[&out, &[1, 2], &[0, 1]], &[0, 0, 7]);
+        assert!(!lp.is_contiguous());
+        let offs = collect(&lp);
+        assert_eq!(
+            offs,
+            vec![
+                vec![0, 0, 7],
+                vec![1, 2, 8],
+                vec![2, 4, 9],
+                vec![3, 1, 7],
+                vec![4, 3, 8],
+                vec![5, 5, 9],
+            ]
+        );
+    }
+
+    #[test]
+    fn scalar_and_empty_shapes() {
+        let lp = StridedLoop::new(&[], &[&[], &[]], &[0, 3]);
+        assert_eq!(collect(&lp), vec![vec![0, 3]]);
+        let lp = StridedLoop::new(&[4, 0], &[&[0, 1], &[0, 1]], &[0, 0]);
+        assert_eq!(lp.numel(), 0);
+        assert!(collect(&lp).is_empty());
+    }
+
+    #[test]
+    fn ranges_cover_the_loop_exactly_once() {
+        let shape = [3, 5, 7];
+        let out = dense_strides(&shape);
+        let lp = StridedLoop::new(&shape, &[&out, &[1, 0, 15]], &[0, 2]);
+        let full = collect(&lp);
+        let s = lp.inner_strides().to_vec();
+        for split in [1, 6, 7, 50, 104] {
+            let mut parts = vec![];
+            for (start, end) in [(0, split), (split, 105)] {
+                lp.for_each_run_in(start, end, |o, len| {
+                    for i in 0..len as isize {
+                        parts.push(o.iter().zip(&s).map(|(o, s)| o + s * i).collect::<Vec<_>>());
+                    }
+                });
+            }
+            assert_eq!(parts, full);
+        }
+    }
+
+    #[test]
+    fn map2_matches_naive_loop() {
+        let shape = [3, 4, 5];
+        let a: Vec<i32> = (0..60).collect();
+        let b: Vec<i32> = (0..5).collect();
+        let mut out = vec![0i32; 60];
+        let os = dense_strides(&shape);
+        // a is a dense (5, 4, 3) array read with dims 0 and 2 swapped: a_t[i][j][k] = a[k*12 + j*3 + i]
+        let a_strides = [1, 3, 12];
+        let b_strides = [0, 0, 1];
+        let lp = StridedLoop::new(&shape, &[&os, &a_strides, &b_strides], &[0, 0, 0]);
+        unsafe { map2(&lp, out.as_mut_ptr(), a.as_ptr(), b.as_ptr(), |x, y| x + y) };
+        for i in 0..3 {
+            for j in 0..4 {
+                for k in 0..5 {
+                    let expected = a[i + j * 3 + k * 12] + b[k];
+                    assert_eq!(out[i * 20 + j * 5 + k], expected);
+                }
+            }
+        }
+    }
+}
@@ -2,7 +2,7 @@ use pyo3::{Bound, PyAny, PyResult, Python, pyclass, pymethods, types::PyTuple};
 use pyo3_stub_gen::derive::{gen_stub_pyclass, gen_stub_pymethods};
 
 #[gen_stub_pyclass]
-#[pyclass(unsendable)]
+#[pyclass]
 #[derive(Debug, Clone)]
 #[repr(C)]
 pub struct View {